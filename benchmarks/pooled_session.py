@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Compares a boto3 session and client per function with a shared PooledSession, and
+the pooled session across worker counts, by calling ``lambda:GetFunction`` for
+missing functions against moto, the same call the layer commands make first.
+
+moto serves calls in-process, so the numbers measure client construction and
+connection pool contention rather than AWS latency: more workers can't overlap
+network waits here, so the worker counts only show that the pool doesn't become a
+bottleneck. Usage::
+
+    python benchmarks/pooled_session.py [--functions 200] [--memory]
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import botocore
+from moto import mock_aws
+
+from newrelic_lambda_cli.utils import DEFAULT_MAX_WORKERS, PooledSession
+
+
+def _get_function(session, name):
+    try:
+        session.client("lambda").get_function(FunctionName=name)
+    except botocore.exceptions.ClientError:
+        pass
+
+
+def per_function_sessions(region, names, workers):
+    def _call(name):
+        _get_function(boto3.Session(region_name=region), name)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_call, names))
+
+
+def pooled_session(region, names, workers):
+    session = PooledSession(
+        boto3.Session(region_name=region), max_pool_connections=workers
+    )
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda name: _get_function(session, name), names))
+
+
+def measure(func, *args, memory=False):
+    """
+    Returns the seconds taken, or the peak traced memory in MiB, as tracing slows
+    the run down too much to time it
+    """
+    if not memory:
+        started = time.perf_counter()
+        func(*args)
+        return time.perf_counter() - started
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--functions", type=int, default=200)
+    parser.add_argument("--region", default="us-east-1")
+    parser.add_argument(
+        "--memory", action="store_true", help="Measure peak memory instead of time"
+    )
+    args = parser.parse_args()
+
+    for key in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ.setdefault(key, "testing")
+    names = ["benchmark-%d" % i for i in range(args.functions)]
+
+    print("%d functions, %d workers by default" % (len(names), DEFAULT_MAX_WORKERS))
+    print(
+        "%-24s %8s %10s" % ("Mode", "Workers", "Peak MiB" if args.memory else "Seconds")
+    )
+    with mock_aws():
+        runs = [(per_function_sessions, DEFAULT_MAX_WORKERS)] + [
+            (pooled_session, workers)
+            for workers in sorted({1, 4, DEFAULT_MAX_WORKERS, 64})
+        ]
+        for func, workers in runs:
+            value = measure(func, args.region, names, workers, memory=args.memory)
+            print("%-24s %8d %10.2f" % (func.__name__, workers, value))
+
+
+if __name__ == "__main__":
+    main()
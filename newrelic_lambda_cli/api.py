@@ -16,6 +16,7 @@ from gql.transport.requests import RequestsHTTPTransport
 import click
 import requests
 
+from newrelic_lambda_cli import timings
 from newrelic_lambda_cli.cliutils import failure, success
 from newrelic_lambda_cli.types import (
     IntegrationInstall,
@@ -25,9 +26,42 @@ from newrelic_lambda_cli.types import (
     OtelIngestionUninstall,
     OtelIngestionUpdate,
 )
-from newrelic_lambda_cli.utils import parse_arn
+from newrelic_lambda_cli.utils import parse_arn, RunCache, TimedSession
 
-__cached_license_key = None
+GQL_URLS = {
+    "us": "https://api.newrelic.com/graphql",
+    "eu": "https://api.eu.newrelic.com/graphql",
+    "staging": "https://staging-api.newrelic.com/graphql",
+}
+
+# One HTTP session per endpoint, so every client reuses kept-alive connections
+http_sessions = RunCache()
+
+# Per run caches of validated clients and license keys, by account and API key
+gql_client_cache = RunCache()
+license_key_cache = RunCache()
+
+
+def gql_url(region):
+    """Returns the NerdGraph endpoint for a New Relic region"""
+    try:
+        return GQL_URLS[region]
+    except KeyError:
+        raise ValueError("Region must be one of 'us' or 'eu'")
+
+
+def gql_client(url, api_key):
+    """
+    Returns a GraphQL client for the endpoint that shares the endpoint's HTTP session.
+
+    The CLI only sends hand-written queries, so the client skips downloading
+    NerdGraph's introspection schema (several hundred KB) and lets the server
+    validate queries instead.
+    """
+    transport = RequestsHTTPTransport(url=url, use_json=True)
+    transport.headers = {"api-key": api_key}
+    transport.session = http_sessions.get(url, TimedSession, "nerdgraph")
+    return Client(transport=transport, fetch_schema_from_transport=False)
 
 
 class NewRelicGQL(object):
@@ -38,28 +72,15 @@ class NewRelicGQL(object):
             raise ValueError("Account ID must be an integer")
 
         self.api_key = api_key
-
-        if region == "us":
-            self.url = "https://api.newrelic.com/graphql"
-        elif region == "eu":
-            self.url = "https://api.eu.newrelic.com/graphql"
-        elif region == "staging":
-            self.url = "https://staging-api.newrelic.com/graphql"
-        else:
-            raise ValueError("Region must be one of 'us' or 'eu'")
-
-        transport = RequestsHTTPTransport(url=self.url, use_json=True)
-        transport.headers = {"api-key": self.api_key}
-
-        try:
-            self.client = Client(transport=transport, fetch_schema_from_transport=True)
-        except Exception:
-            self.client = Client(transport=transport, fetch_schema_from_transport=False)
-
-    def query(self, query, timeout=None, **variable_values):
-        return self.client.execute(
-            gql(query), timeout=timeout, variable_values=variable_values or None
-        )
+        self.url = gql_url(region)
+        self.client = gql_client(self.url, self.api_key)
+
+    def query(self, query, timeout=None, operation=None, **variable_values):
+        """Sends the query, timed under ``operation`` if call timings are enabled"""
+        with timings.operation(operation):
+            return self.client.execute(
+                gql(query), timeout=timeout, variable_values=variable_values or None
+            )
 
     def get_linked_accounts(self):
         """
@@ -84,6 +105,7 @@ class NewRelicGQL(object):
             }
             """,
             accountId=self.account_id,
+            operation="get_linked_accounts",
         )
         try:
             return res["actor"]["account"]["cloud"]["linkedAccounts"]
@@ -109,6 +131,7 @@ class NewRelicGQL(object):
                 }
             """,
             accountId=self.account_id,
+            operation="get_license_key",
         )
         try:
             return res["actor"]["apiAccess"]["keySearch"]["keys"][0]["key"]
@@ -158,6 +181,7 @@ class NewRelicGQL(object):
             """,
             accountId=self.account_id,
             accounts={"aws": {"arn": role_arn, "name": account_name}},
+            operation="link_account",
         )
         try:
             return res["cloudLinkAccount"]["linkedAccounts"][0]
@@ -196,6 +220,7 @@ class NewRelicGQL(object):
             """,
             accountId=self.account_id,
             accounts=[{"linkedAccountId": linked_account_id}],
+            operation="unlink_account",
         )
         if "errors" in res and res["errors"]:
             failure(
@@ -233,6 +258,7 @@ class NewRelicGQL(object):
             """,
             accountId=self.account_id,
             linkedAccountId=int(linked_account_id),
+            operation="get_integrations",
         )
         try:
             return res["actor"]["account"]["cloud"]["linkedAccount"]["integrations"]
@@ -287,6 +313,7 @@ class NewRelicGQL(object):
             integrations={
                 provider_slug: {service_slug: [{"linkedAccountId": linked_account_id}]}
             },
+            operation="enable_integration",
         )
         try:
             return res["cloudConfigureIntegration"]["integrations"][0]
@@ -325,6 +352,7 @@ class NewRelicGQL(object):
             integrations={
                 provider_slug: {service_slug: [{"linkedAccountId": linked_account_id}]}
             },
+            operation="disable_integration",
         )
         if "errors" in res:
             failure(
@@ -348,7 +376,13 @@ def validate_gql_credentials(input):
     )
 
     try:
-        return NewRelicGQL(input.nr_account_id, input.nr_api_key, input.nr_region)
+        return gql_client_cache.get(
+            (input.nr_account_id, input.nr_api_key, input.nr_region),
+            NewRelicGQL,
+            input.nr_account_id,
+            input.nr_api_key,
+            input.nr_region,
+        )
     except requests.exceptions.HTTPError:
         raise click.BadParameter(
             "Could not authenticate with New Relic. Check that your New Relic Account "
@@ -360,14 +394,11 @@ def validate_gql_credentials(input):
 
 
 def retrieve_license_key(gql):
-    global __cached_license_key
-
-    if __cached_license_key:
-        return __cached_license_key
     assert isinstance(gql, NewRelicGQL)
     try:
-        __cached_license_key = gql.get_license_key()
-        return __cached_license_key
+        return license_key_cache.get(
+            (gql.account_id, gql.api_key, gql.url), gql.get_license_key
+        )
     except Exception:
         raise click.BadParameter(
             f"For New Relic Account ID: {gql.account_id}. "
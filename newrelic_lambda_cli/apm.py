@@ -10,13 +10,14 @@ Example usage:
 
 """
 
-from gql import Client, gql
-from gql.transport.requests import RequestsHTTPTransport
+from gql import gql
 
 import click
 import requests
 import json
 
+from newrelic_lambda_cli import timings
+from newrelic_lambda_cli.api import gql_client, gql_url
 from newrelic_lambda_cli.cliutils import failure, success
 
 
@@ -28,28 +29,14 @@ class NRGQL_APM(object):
             raise ValueError("Account ID must be an integer")
 
         self.api_key = api_key
+        self.url = gql_url(region)
+        self.client = gql_client(self.url, self.api_key)
 
-        if region == "us":
-            self.url = "https://api.newrelic.com/graphql"
-        elif region == "eu":
-            self.url = "https://api.eu.newrelic.com/graphql"
-        elif region == "staging":
-            self.url = "https://staging-api.newrelic.com/graphql"
-        else:
-            raise ValueError("Region must be one of 'us' or 'eu'")
-
-        transport = RequestsHTTPTransport(url=self.url, use_json=True)
-        transport.headers = {"api-key": self.api_key}
-
-        try:
-            self.client = Client(transport=transport, fetch_schema_from_transport=True)
-        except Exception:
-            self.client = Client(transport=transport, fetch_schema_from_transport=False)
-
-    def query(self, query, timeout=None, **variable_values):
-        return self.client.execute(
-            gql(query), timeout=timeout, variable_values=variable_values or None
-        )
+    def query(self, query, timeout=None, operation=None, **variable_values):
+        with timings.operation(operation):
+            return self.client.execute(
+                gql(query), timeout=timeout, variable_values=variable_values or None
+            )
 
     def get_entity_guids_from_entity_name(self, entity_name) -> dict[str, str]:
         entity_dicts = {}
@@ -68,7 +55,8 @@ class NRGQL_APM(object):
             }}
         }}
         }}
-        """
+        """,
+            operation="get_entity_guids_from_entity_name",
         )
 
         try:
@@ -121,7 +109,8 @@ class NRGQL_APM(object):
                 }}
             }}
         }}
-        """
+        """,
+            operation="get_entity_alert_details",
         )
 
         print(f"Querying alert details for Lambda entity")
@@ -247,7 +236,7 @@ class NRGQL_APM(object):
             """
 
             try:
-                res = self.query(mutation)
+                res = self.query(mutation, operation="create_alert_for_new_entity")
                 # Check for GraphQL errors in the response
                 if "errors" in res:
                     print("Error in GraphQL response:")
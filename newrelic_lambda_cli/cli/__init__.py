@@ -1,35 +1,129 @@
 # -*- coding: utf-8 -*-
 
+import importlib
+
 import click
 
-from newrelic_lambda_cli.cli import (
-    apm,
-    functions,
-    integrations,
-    layers,
-    otel_ingestions,
-    subscriptions,
-)
+from newrelic_lambda_cli import timings as call_timings
+
+# Subcommand groups, the module that registers each one and its short help. The
+# modules are only imported when their group is invoked, so `--help` and commands
+# that don't need them skip loading boto3, gql, requests, etc.
+LAZY_GROUPS = {
+    "apm": (
+        "newrelic_lambda_cli.cli.apm",
+        "Manage New Relic APM Mode of AWS Lambda instrumentation",
+    ),
+    "functions": (
+        "newrelic_lambda_cli.cli.functions",
+        "Manage New Relic AWS Lambda Functions",
+    ),
+    "integrations": (
+        "newrelic_lambda_cli.cli.integrations",
+        "Manage New Relic AWS Lambda Integrations",
+    ),
+    "layers": (
+        "newrelic_lambda_cli.cli.layers",
+        "Manage New Relic AWS Lambda Layers",
+    ),
+    "otel-ingestions": (
+        "newrelic_lambda_cli.cli.otel_ingestions",
+        "Manage New Relic AWS Lambda Otel Log Ingestion lambda",
+    ),
+    "subscriptions": (
+        "newrelic_lambda_cli.cli.subscriptions",
+        "Manage New Relic AWS Lambda Log Subscriptions",
+    ),
+}
+
+
+class LazyGroup(click.Group):
+    """A click group that imports a subcommand's module only when it is invoked"""
+
+    def invoke(self, ctx):
+        # Started before the subcommand is resolved, rather than in the group's
+        # callback, so that importing its module is profiled too
+        path = ctx.params.get("profile")
+        if path:
+            from newrelic_lambda_cli import profiling
+
+            profiler = profiling.start(path)
+            ctx.call_on_close(lambda: profiler.stop(path))
+        return super(LazyGroup, self).invoke(ctx)
+
+    def list_commands(self, ctx):
+        return sorted(set(self.commands) | set(LAZY_GROUPS))
 
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in LAZY_GROUPS:
+            module_name, _ = LAZY_GROUPS[cmd_name]
+            importlib.import_module(module_name).register(self)
+        return self.commands.get(cmd_name)
 
-@click.group()
+    def format_commands(self, ctx, formatter):
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                command = self.commands[name]
+                if command.hidden:
+                    continue
+                help = command.get_short_help_str(formatter.width - 6 - len(name))
+            else:
+                help = LAZY_GROUPS[name][1]
+            rows.append((name, help))
+
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup)
 @click.version_option()
 @click.option("--verbose", "-v", help="Increase verbosity", is_flag=True)
+@click.option(
+    "--timings",
+    help="Print the count, latency, retries and throttles of each AWS, New Relic "
+    "layer index and NerdGraph operation when the command finishes",
+    is_flag=True,
+)
+@click.option(
+    "--timings-json",
+    help="Write the call timings to this file as JSON instead of printing them",
+    metavar="<file>",
+    type=click.Path(dir_okay=False, writable=True),
+)
+@click.option(
+    "--profile",
+    help="Profile the command, including its worker threads and the import of "
+    "its modules, and write the profile to this file. Files ending in .json are "
+    "sampled in speedscope's format, others are written as cProfile stats for "
+    "snakeviz or pstats",
+    metavar="<file>",
+    type=click.Path(dir_okay=False, writable=True),
+)
 @click.pass_context
-def cli(ctx, verbose):
+def cli(ctx, verbose, timings, timings_json, profile):
     ctx.ensure_object(dict)
     ctx.obj["VERBOSE"] = verbose
+    # --profile is started by LazyGroup.invoke
+    if timings or timings_json:
+        call_timings.enable()
+        ctx.call_on_close(lambda: _report_timings(timings_json))
+
+
+def _report_timings(path):
+    try:
+        call_timings.report(path)
+    finally:
+        call_timings.disable()
 
 
 def register_groups(group):
-    apm.register(group)
-    functions.register(group)
-    integrations.register(group)
-    otel_ingestions.register(group)
-    layers.register(group)
-    subscriptions.register(group)
+    for name in LAZY_GROUPS:
+        if name not in group.commands:
+            module_name, _ = LAZY_GROUPS[name]
+            importlib.import_module(module_name).register(group)
 
 
 def main():
-    register_groups(cli)
     cli()
@@ -4,6 +4,32 @@ import click
 
 from newrelic_lambda_cli import utils
 
+
+class RegionChoice(click.Choice):
+    """
+    A click Choice of the AWS Lambda regions, looked up from botocore's endpoint data
+    only when a value is validated rather than when the command is defined
+
+    :param extra: Additional values to accept besides region names
+    """
+
+    def __init__(self, extra=()):
+        super().__init__((), case_sensitive=True)
+        self.extra = tuple(extra)
+        # Looked up on first use instead of the empty choices set by click
+        self._choices = None
+
+    @property
+    def choices(self):
+        if self._choices is None:
+            self._choices = tuple(utils.all_lambda_regions()) + self.extra
+        return self._choices
+
+    @choices.setter
+    def choices(self, value):
+        self._choices = value
+
+
 AWS_OPTIONS = [
     click.option(
         "--aws-profile",
@@ -20,7 +46,7 @@ AWS_OPTIONS = [
         envvar="AWS_DEFAULT_REGION",
         help="AWS region",
         metavar="<region>",
-        type=click.Choice(utils.all_lambda_regions()),
+        type=RegionChoice(),
     ),
     click.option(
         "--aws-permissions-check/--no-aws-permissions-check",
@@ -30,6 +56,23 @@ AWS_OPTIONS = [
     ),
 ]
 
+# Same as AWS_OPTIONS, but --aws-region can be repeated (or set to "all") to run the
+# command in several regions concurrently
+MULTI_REGION_AWS_OPTIONS = [
+    AWS_OPTIONS[0],
+    click.option(
+        "--aws-region",
+        "-r",
+        envvar="AWS_DEFAULT_REGION",
+        help="AWS region (can be used multiple times, 'all' for every "
+        "enabled region)",
+        metavar="<region>",
+        multiple=True,
+        type=RegionChoice(extra=["all"]),
+    ),
+    AWS_OPTIONS[2],
+]
+
 NR_OPTIONS = [
     click.option(
         "--nr-account-id",
@@ -60,6 +103,139 @@ NR_OPTIONS = [
 ]
 
 
+CONCURRENCY_OPTIONS = [
+    click.option(
+        "--max-concurrency",
+        default=utils.DEFAULT_MAX_WORKERS,
+        help="Maximum number of functions to update concurrently",
+        metavar="<count>",
+        show_default=True,
+        type=click.IntRange(min=1),
+    ),
+    click.option(
+        "--rate-limit",
+        help="Maximum number of AWS Lambda API update calls per second "
+        "(default: unlimited)",
+        metavar="<calls/sec>",
+        type=click.FloatRange(min=0, min_open=True),
+    ),
+]
+
+
+def _parse_function_tags(ctx, param, value):
+    tags = []
+    for tag in value:
+        key, sep, tag_value = tag.partition("=")
+        if not sep or not key:
+            raise click.BadParameter("Expected key=value, got '%s'" % tag)
+        tags.append((key, tag_value))
+    return tuple(tags)
+
+
+FUNCTION_TAG_OPTIONS = [
+    click.option(
+        "function_tags",
+        "--function-tag",
+        callback=_parse_function_tags,
+        help="Select functions with this tag (can be used multiple times). Narrows "
+        "the 'all', 'installed' and 'not-installed' aliases if used with them",
+        metavar="<key=value>",
+        multiple=True,
+    ),
+    click.option(
+        "--function-tag-mode",
+        default="and",
+        help="Whether functions need every --function-tag or any of them",
+        show_default=True,
+        type=click.Choice(["and", "or"]),
+    ),
+]
+
+
+FUNCTION_FILTER_OPTIONS = [
+    click.option(
+        "function_patterns",
+        "--function-pattern",
+        callback=utils.validate_name_patterns,
+        help="Select functions whose name matches this glob, or regex if prefixed "
+        "with 're:' (can be used multiple times). Only narrows the given functions "
+        "and aliases if used with --function",
+        metavar="<pattern>",
+        multiple=True,
+    ),
+    click.option(
+        "exclude_patterns",
+        "--exclude-pattern",
+        callback=utils.validate_name_patterns,
+        help="Exclude functions whose name matches this glob, or regex if prefixed "
+        "with 're:' (can be used multiple times)",
+        metavar="<pattern>",
+        multiple=True,
+    ),
+    click.option(
+        "runtimes",
+        "--runtime",
+        help="Only select functions with this runtime (can be used multiple times)",
+        metavar="<runtime>",
+        multiple=True,
+    ),
+    click.option(
+        "architectures",
+        "--architecture",
+        help="Only select functions with this architecture (can be used multiple "
+        "times)",
+        multiple=True,
+        type=click.Choice(["x86_64", "arm64"]),
+    ),
+    click.option(
+        "--shard",
+        callback=utils.parse_shard,
+        help="Only select the functions in this shard, e.g. 2/8 for the second of "
+        "eight disjoint shards, to split a run across several jobs",
+        metavar="<index>/<count>",
+    ),
+]
+
+
+INVENTORY_OPTIONS = [
+    click.option(
+        "use_inventory",
+        "--inventory",
+        help="Resolve function aliases from the local function inventory, "
+        "refreshing it when it is out of date",
+        is_flag=True,
+    ),
+    click.option(
+        "--inventory-max-age",
+        default=300,
+        envvar="NEW_RELIC_INVENTORY_MAX_AGE",
+        help="Seconds before the local function inventory of a region is refreshed "
+        "(0 always refreshes)",
+        metavar="<seconds>",
+        show_default=True,
+        type=click.IntRange(min=0),
+    ),
+]
+
+JOURNAL_OPTIONS = [
+    click.option(
+        "journal_path",
+        "--journal",
+        help="Append each function's outcome to this file as it finishes, so that an "
+        "interrupted run can be resumed",
+        metavar="<file>",
+        type=click.Path(dir_okay=False, writable=True),
+    ),
+    click.option(
+        "--resume",
+        help="Skip the functions that finished in the run recorded in this journal, "
+        "and append to it unless --journal is given",
+        metavar="<file>",
+        type=click.Path(exists=True, dir_okay=False),
+    ),
+]
+
+
 def add_options(options):
     """
     A decorator to add a set of options to a click command. This allows options that
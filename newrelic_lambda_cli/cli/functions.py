@@ -1,14 +1,23 @@
 # -*- coding: utf-8 -*-
 
+import builtins
+import csv
+import io
 import itertools
+import json
 import shutil
 
 import boto3
 import click
-from tabulate import tabulate
 
 from newrelic_lambda_cli import functions, permissions
-from newrelic_lambda_cli.cli.decorators import add_options, AWS_OPTIONS
+from newrelic_lambda_cli.cli.decorators import (
+    add_options,
+    INVENTORY_OPTIONS,
+    MULTI_REGION_AWS_OPTIONS,
+)
+from newrelic_lambda_cli.inventory import FunctionInventory
+from newrelic_lambda_cli.utils import PooledSession, resolve_regions
 
 
 @click.group(name="functions")
@@ -23,7 +32,7 @@ def register(group):
 
 
 @click.command(name="list")
-@add_options(AWS_OPTIONS)
+@add_options(MULTI_REGION_AWS_OPTIONS)
 @click.option(
     "--filter",
     "-f",
@@ -36,61 +45,143 @@ def register(group):
     default="table",
     help="Format output",
     show_default=True,
-    type=click.Choice(["table", "text"]),
+    type=click.Choice(["table", "text", "jsonl", "csv"]),
 )
-def list(aws_profile, aws_region, aws_permissions_check, filter, output):
+@add_options(INVENTORY_OPTIONS)
+def list(
+    aws_profile,
+    aws_region,
+    aws_permissions_check,
+    filter,
+    output,
+    use_inventory,
+    inventory_max_age,
+):
     """List AWS Lambda Functions"""
     _, rows = shutil.get_terminal_size((80, 50))
-    session = boto3.Session(profile_name=aws_profile, region_name=aws_region)
+    sessions = [
+        PooledSession(boto3.Session(profile_name=aws_profile, region_name=region))
+        for region in resolve_regions(aws_region, aws_profile)
+    ]
 
     if aws_permissions_check:
-        permissions.ensure_lambda_list_permissions(session)
-
-    funcs = functions.list_functions(session, filter)
-
-    def format_table(funcs, header=False):
-        table = []
-        for func in funcs:
-            table.append(
-                [
-                    func.get("FunctionName"),
-                    func.get("Runtime"),
-                    "Yes" if func.get("x-new-relic-enabled", False) else "No",
-                ]
-            )
-        return tabulate(
-            table, headers=["Function Name", "Runtime", "Installed"] if header else []
-        ).rstrip()
-
-    def format_text(funcs, header=False):
-        text = []
-        if header:
-            text.append("\t".join(["Function Name", "Runtime", "Installed"]))
-        for func in funcs:
-            text.append(
-                "\t".join(
-                    [
-                        func.get("FunctionName"),
-                        func.get("Runtime"),
-                        "Yes" if func.get("x-new-relic-enabled", False) else "No",
-                    ]
-                )
-            )
-        return "\n".join(text)
-
-    _format = format_table
-
-    if output == "text":
-        _format = format_text
-
-    buffer = []
-    for i, func in enumerate(funcs):
-        buffer.append(func)
-        if i > 0 and i % rows == 0:
-            click.echo_via_pager(
-                itertools.chain(iter(_format(buffer, header=True)), _format(funcs))
-            )
-            buffer = []
-            return
-
-    click.echo(_format(buffer, header=True))
+        for session in sessions:
+            permissions.ensure_lambda_list_permissions(session)
+
+    failed = []
+    funcs = functions.list_functions_in_regions(
+        sessions,
+        filter,
+        FunctionInventory(max_age=inventory_max_age) if use_inventory else None,
+        failed=failed,
+    )
+
+    columns = COLUMNS if len(sessions) > 1 else COLUMNS[:-1]
+    if output == "table":
+        lines = format_table(funcs, columns, sample=rows)
+    else:
+        lines = FORMATTERS[output](funcs, columns)
+
+    # Rows are rendered as each page of functions arrives. Only the first screenful
+    # is held back, to decide whether the output needs a pager.
+    if output in ("table", "text"):
+        head = builtins.list(itertools.islice(lines, rows + 1))
+        if len(head) > rows:
+            click.echo_via_pager(line + "\n" for line in itertools.chain(head, lines))
+            lines = ()
+        else:
+            lines = head
+
+    for line in lines:
+        click.echo(line)
+
+    # The regions that failed were reported as they failed
+    if failed:
+        raise click.exceptions.Exit(1)
+
+
+# Column header and key in the function configuration
+COLUMNS = [
+    ("Function Name", "FunctionName"),
+    ("Runtime", "Runtime"),
+    ("Installed", "x-new-relic-enabled"),
+    ("Region", "x-aws-region"),
+]
+
+# Rows measured to size the table's columns, list uses the terminal's height
+DEFAULT_TABLE_SAMPLE = 50
+
+
+def _values(func, columns):
+    values = []
+    for _, key in columns:
+        value = func.get(key)
+        if key == "x-new-relic-enabled":
+            value = "Yes" if value else "No"
+        values.append("" if value is None else str(value))
+    return values
+
+
+def format_table(funcs, columns, sample=DEFAULT_TABLE_SAMPLE):
+    """
+    Renders a table with columns sized to the first ``sample`` rows, so the rest can
+    be written as they arrive instead of measuring every row first. Longer values
+    in later rows extend past their column.
+    """
+    funcs = iter(funcs)
+    head = [_values(func, columns) for func in itertools.islice(funcs, sample)]
+    headers = [header for header, _ in columns]
+    widths = [max(len(row[i]) for row in [headers] + head) for i in range(len(columns))]
+
+    def _line(values):
+        cells = [value.ljust(width) for value, width in zip(values, widths)]
+        return "  ".join(cells).rstrip()
+
+    yield _line(headers)
+    yield _line(["-" * width for width in widths])
+    for values in head:
+        yield _line(values)
+    for func in funcs:
+        yield _line(_values(func, columns))
+
+
+def format_text(funcs, columns):
+    yield "\t".join(header for header, _ in columns)
+    for func in funcs:
+        yield "\t".join(_values(func, columns))
+
+
+def format_csv(funcs, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="")
+
+    def _line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield _line([header for header, _ in columns])
+    for func in funcs:
+        yield _line(_values(func, columns))
+
+
+def format_jsonl(funcs, columns):
+    for func in funcs:
+        record = {
+            "FunctionName": func.get("FunctionName"),
+            "FunctionArn": func.get("FunctionArn"),
+            "Runtime": func.get("Runtime"),
+            "Installed": func.get("x-new-relic-enabled", False),
+        }
+        if len(columns) == len(COLUMNS):
+            record["Region"] = func.get("x-aws-region")
+        yield json.dumps(record)
+
+
+FORMATTERS = {
+    "csv": format_csv,
+    "jsonl": format_jsonl,
+    "table": format_table,
+    "text": format_text,
+}
@@ -11,6 +11,7 @@ from newrelic_lambda_cli.types import (
 )
 from newrelic_lambda_cli.cli.decorators import add_options, AWS_OPTIONS, NR_OPTIONS
 from newrelic_lambda_cli.cliutils import done, failure
+from newrelic_lambda_cli.utils import PooledSession
 
 
 @click.group(name="integrations")
@@ -114,8 +115,8 @@ def install(ctx, **kwargs):
     input = IntegrationInstall(session=None, verbose=ctx.obj["VERBOSE"], **kwargs)
 
     input = input._replace(
-        session=boto3.Session(
-            profile_name=input.aws_profile, region_name=input.aws_region
+        session=PooledSession(
+            boto3.Session(profile_name=input.aws_profile, region_name=input.aws_region)
         )
     )
 
@@ -217,8 +218,8 @@ def uninstall(**kwargs):
     input = IntegrationUninstall(session=None, **kwargs)
 
     input = input._replace(
-        session=boto3.Session(
-            profile_name=input.aws_profile, region_name=input.aws_region
+        session=PooledSession(
+            boto3.Session(profile_name=input.aws_profile, region_name=input.aws_region)
         )
     )
 
@@ -324,8 +325,8 @@ def update(**kwargs):
     input = IntegrationUpdate(session=None, **kwargs)
 
     input = input._replace(
-        session=boto3.Session(
-            profile_name=input.aws_profile, region_name=input.aws_region
+        session=PooledSession(
+            boto3.Session(profile_name=input.aws_profile, region_name=input.aws_region)
         )
     )
 
@@ -1,15 +1,48 @@
 # -*- coding: utf-8 -*-
 
-from concurrent.futures import as_completed, ThreadPoolExecutor
+import time
+from concurrent.futures import as_completed
 
 import boto3
 import click
 
 from newrelic_lambda_cli import layers, permissions
-from newrelic_lambda_cli.cli.decorators import add_options, AWS_OPTIONS
-from newrelic_lambda_cli.cliutils import done, failure
-from newrelic_lambda_cli.functions import get_aliased_functions
-from newrelic_lambda_cli.types import LayerInstall, LayerUninstall
+from newrelic_lambda_cli.cli.decorators import (
+    add_options,
+    AWS_OPTIONS,
+    CONCURRENCY_OPTIONS,
+    FUNCTION_FILTER_OPTIONS,
+    FUNCTION_TAG_OPTIONS,
+    INVENTORY_OPTIONS,
+    JOURNAL_OPTIONS,
+    MULTI_REGION_AWS_OPTIONS,
+)
+from newrelic_lambda_cli.cliutils import (
+    done,
+    echo,
+    failure,
+    report_regions,
+    UpdateSummary,
+)
+from newrelic_lambda_cli.functions import (
+    ensure_function_selection,
+    get_aliased_functions,
+)
+from newrelic_lambda_cli.inventory import FunctionInventory
+from newrelic_lambda_cli.journal import open_journal
+from newrelic_lambda_cli.scheduler import (
+    AdaptiveScheduler,
+    parse_waves,
+    split_waves,
+)
+from newrelic_lambda_cli.types import LayerApply, LayerInstall, LayerUninstall
+from newrelic_lambda_cli.utils import (
+    ContextThreadPoolExecutor,
+    PooledSession,
+    resolve_regions,
+    run_in_regions,
+    unique,
+)
 
 
 @click.group(name="layers")
@@ -18,10 +51,20 @@ def layers_group():
     pass
 
 
+def _parse_waves(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return parse_waves(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e), ctx=ctx, param=param)
+
+
 def register(group):
     group.add_command(layers_group)
     layers_group.add_command(install)
     layers_group.add_command(uninstall)
+    layers_group.add_command(apply)
 
 
 @click.command(name="install")
@@ -58,7 +101,7 @@ def register(group):
     show_default=True,
     type=click.Choice(["us", "eu", "staging"]),
 )
-@add_options(AWS_OPTIONS)
+@add_options(MULTI_REGION_AWS_OPTIONS)
 @click.option(
     "functions",
     "--function",
@@ -66,7 +109,6 @@ def register(group):
     help="AWS Lambda function name or ARN",
     metavar="<arn>",
     multiple=True,
-    required=True,
 )
 @click.option(
     "excludes",
@@ -76,6 +118,9 @@ def register(group):
     metavar="<name>",
     multiple=True,
 )
+@add_options(FUNCTION_TAG_OPTIONS)
+@add_options(FUNCTION_FILTER_OPTIONS)
+@add_options(INVENTORY_OPTIONS)
 @click.option(
     "--layer-arn",
     "-l",
@@ -199,36 +244,103 @@ def register(group):
     type=bool,
     help="Java runtimes only - Use New Relic Java Agent layer (sets AWS_LAMBDA_EXEC_WRAPPER, keeps original handler)",
 )
+@add_options(CONCURRENCY_OPTIONS)
+@click.option(
+    "--waves",
+    callback=_parse_waves,
+    help="Roll the layer out in waves, each updating up to this cumulative "
+    "percentage of the functions (e.g. 1%,10%,50%,100%)",
+    metavar="<percentages>",
+)
+@click.option(
+    "--wave-soak",
+    default=60,
+    help="Seconds to wait after each wave before starting the next one",
+    metavar="<seconds>",
+    show_default=True,
+    type=click.IntRange(min=0),
+)
+@click.option(
+    "--wave-max-failure-rate",
+    default=0.0,
+    help="Halt the rollout when more than this percentage of a wave's functions "
+    "fail to install, for any reason: not found, unsupported runtime, no layer "
+    "available or a failed update. The functions' invocations aren't checked "
+    "during the soak",
+    metavar="<percent>",
+    show_default=True,
+    type=click.FloatRange(min=0, max=100),
+)
+@click.option(
+    "--layer-cache-ttl",
+    default=layers.DEFAULT_LAYER_CACHE_TTL,
+    envvar="NEW_RELIC_LAYER_CACHE_TTL",
+    help="Seconds to reuse the locally cached New Relic layer index (0 disables "
+    "the on-disk cache)",
+    metavar="<seconds>",
+    show_default=True,
+    type=click.IntRange(min=0),
+)
+@click.option(
+    "--refresh-layer-cache",
+    help="Ignore the locally cached New Relic layer index and fetch it again",
+    is_flag=True,
+)
+@click.option(
+    "--plan-out",
+    help="Write the planned changes to this file instead of updating functions. "
+    "Apply them later with `newrelic-lambda layers apply`",
+    metavar="<file>",
+    type=click.Path(dir_okay=False, writable=True),
+)
+@add_options(JOURNAL_OPTIONS)
 @click.pass_context
 def install(ctx, **kwargs):
     """Install New Relic AWS Lambda Layers"""
-    input = LayerInstall(session=None, verbose=ctx.obj["VERBOSE"], **kwargs)
-    input = input._replace(
-        session=boto3.Session(
-            profile_name=input.aws_profile, region_name=input.aws_region
-        )
+    input = LayerInstall(
+        session=None,
+        inventory=(
+            FunctionInventory(max_age=kwargs["inventory_max_age"])
+            if kwargs["use_inventory"]
+            else None
+        ),
+        scheduler=None,
+        summary=None,
+        role_policies=None,
+        resource_tags=None,
+        plan=layers.ChangePlan() if kwargs["plan_out"] else None,
+        journal=open_journal(
+            "layers install", kwargs["journal_path"], kwargs["resume"]
+        ),
+        verbose=ctx.obj["VERBOSE"],
+        **kwargs,
     )
-    if input.aws_permissions_check:
-        permissions.ensure_layer_install_permissions(input)
+    ensure_function_selection(input)
 
-    functions = get_aliased_functions(input)
+    layers.layer_index_cache.configure(
+        path=layers.LAYER_CACHE_PATH if input.layer_cache_ttl else None,
+        ttl=input.layer_cache_ttl,
+        refresh=input.refresh_layer_cache,
+    )
 
-    with ThreadPoolExecutor() as executor:
-        futures = [
-            executor.submit(
-                layers.install,
-                input._replace(
-                    session=boto3.Session(
-                        profile_name=input.aws_profile, region_name=input.aws_region
-                    )
-                ),
-                function,
-            )
-            for function in functions
-        ]
-        install_success = all(future.result() for future in as_completed(futures))
+    regions = resolve_regions(input.aws_region, input.aws_profile)
+    results = run_in_regions(
+        regions, lambda region: _install(_for_region(input, region))
+    )
+    if input.journal is not None:
+        input.journal.close()
+
+    if ctx.obj["VERBOSE"]:
+        click.echo(
+            "Layer index cache: %d hits, %d misses"
+            % (layers.layer_index_cache.hits, layers.layer_index_cache.misses)
+        )
+
+    report_regions(regions, results, "Install")
 
-    if install_success:
+    if input.plan is not None:
+        _write_plan(input, results)
+    elif all(results):
         done("Install Complete")
         if ctx.obj["VERBOSE"]:
             click.echo(
@@ -245,8 +357,8 @@ def install(ctx, **kwargs):
             ]
             if input.aws_profile:
                 command.append("--aws-profile %s" % input.aws_profile)
-            if input.aws_region:
-                command.append("--aws-region %s" % input.aws_region)
+            for region in input.aws_region:
+                command.append("--aws-region %s" % region)
             click.echo(" ".join(command))
             click.echo(
                 "\nIf you used `--enable-logs` for the `newrelic-lambda integrations "
@@ -258,8 +370,168 @@ def install(ctx, **kwargs):
         failure("Install Incomplete. See messages above for details.", exit=True)
 
 
+def _for_region(input, region):
+    """Returns a copy of the input with its own session, scheduler and summary"""
+    return input._replace(
+        aws_region=region,
+        session=PooledSession(
+            boto3.Session(profile_name=input.aws_profile, region_name=region),
+            max_pool_connections=input.max_concurrency,
+        ),
+        scheduler=AdaptiveScheduler(input.max_concurrency, input.rate_limit),
+        summary=UpdateSummary(),
+    )
+
+
+def _update_role_policies(input, regions):
+    """
+    Updates the execution roles once every region is done. IAM roles are global, so
+    whether a role is still used by instrumented functions can only be decided once
+    no region is uninstalling anymore.
+    """
+    session_input = input._replace(
+        session=PooledSession(
+            boto3.Session(profile_name=input.aws_profile, region_name=regions[0]),
+            max_pool_connections=input.max_concurrency,
+        )
+    )
+    updated_roles = layers.update_role_policies(session_input)
+    journal = getattr(input, "journal", None)
+    if journal is not None:
+        journal.complete_all(updated_roles)
+    return updated_roles
+
+
+def _install(input):
+    if input.aws_permissions_check:
+        permissions.ensure_layer_install_permissions(input)
+
+    configs = {}
+    functions = get_aliased_functions(input, configs)
+    if input.journal is not None:
+        functions = input.journal.pending(input.session.region_name, functions)
+
+    # A plan doesn't change anything, so there is nothing to roll out gradually
+    if input.waves and input.plan is None:
+        waves = split_waves(functions, input.waves)
+    else:
+        waves = [functions]
+
+    results = []
+    for number, wave in enumerate(waves, 1):
+        updated = input.summary.counts["updated"]
+        healthy = _install_wave(input, wave, configs, results)
+        if number == len(waves):
+            break
+        if not healthy:
+            failure(
+                "Halting rollout after wave %d of %d, %d function(s) not updated"
+                % (number, len(waves), sum(len(w) for w in waves[number:]))
+            )
+            break
+        # Nothing to soak if every function in the wave was already up to date
+        if input.wave_soak and input.summary.counts["updated"] > updated:
+            echo(
+                "Wave %d of %d complete, waiting %d seconds before the next wave"
+                % (number, len(waves), input.wave_soak)
+            )
+            time.sleep(input.wave_soak)
+
+    _report(input)
+    return all(results)
+
+
+def _install_wave(input, functions, configs, results):
+    """
+    Installs the layer on the functions at full concurrency, then updates their
+    execution roles and tags so that they are fully set up before the next wave.
+    Returns whether the wave is healthy enough to continue the rollout.
+    """
+    input = input._replace(
+        role_policies=layers.RolePolicyChanges(), resource_tags=layers.ResourceTags()
+    )
+    failed = 0
+
+    with ContextThreadPoolExecutor(max_workers=input.max_concurrency) as executor:
+        futures = {
+            executor.submit(
+                layers.install,
+                input,
+                function,
+                configs.get(function),
+            ): function
+            for function in functions
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            if not result:
+                _record_failure(input, futures[future])
+                failed += 1
+            results.append(result)
+
+    finished = _finish_updates(input, update_roles=True)
+    results.append(finished)
+    if input.journal is not None:
+        input.journal.complete(input.session.region_name, finished)
+
+    failure_rate = 100.0 * failed / len(functions) if functions else 0.0
+    if failure_rate > input.wave_max_failure_rate:
+        failure(
+            "%d of %d function(s) failed (%.1f%%), above the %.1f%% threshold"
+            % (failed, len(functions), failure_rate, input.wave_max_failure_rate)
+        )
+        return False
+    return finished
+
+
+def _finish_updates(input, update_roles=False):
+    """
+    Makes the changes collected while updating the region's functions, returning
+    whether they all succeeded. Execution roles are shared by many functions, so
+    each one is updated once, unless the run updates them after every region is
+    done. Tags are written in batches rather than one call per function, and the
+    updated functions' inventory entries are dropped as they are out of date.
+    """
+    results = []
+    if update_roles:
+        results.append(layers.update_role_policies(input))
+    if getattr(input, "resource_tags", None) is not None:
+        results.append(layers.update_resource_tags(input))
+    inventory = getattr(input, "inventory", None)
+    if inventory is not None and input.summary.counts["updated"]:
+        inventory.invalidate(input.session)
+    return all(results)
+
+
+def _record_failure(input, function):
+    input.summary.record("failed")
+    if input.journal is not None:
+        input.journal.record(input.session.region_name, function, "failed")
+
+
+def _write_plan(input, results):
+    if not all(results):
+        failure("Plan Incomplete. See messages above for details.", exit=True)
+    input.plan.write(input.plan_out)
+    done("Plan Complete")
+    click.echo(
+        "Wrote %d change(s) to %s. Apply them with:\n\n"
+        "$ newrelic-lambda layers apply %s"
+        % (len(input.plan.changes), input.plan_out, input.plan_out)
+    )
+
+
+def _report(input):
+    """Prints the function outcomes and API call statistics for the region"""
+    if input.summary.total:
+        # Alongside the failure messages when anything failed
+        echo(str(input.summary), err=bool(input.summary.counts["failed"]))
+    if input.scheduler.calls:
+        echo(input.scheduler.summary())
+
+
 @click.command(name="uninstall")
-@add_options(AWS_OPTIONS)
+@add_options(MULTI_REGION_AWS_OPTIONS)
 @click.option(
     "functions",
     "--function",
@@ -267,7 +539,6 @@ def install(ctx, **kwargs):
     help="Lambda function name or ARN",
     metavar="<arn>",
     multiple=True,
-    required=True,
 )
 @click.option(
     "excludes",
@@ -277,36 +548,145 @@ def install(ctx, **kwargs):
     metavar="<name>",
     multiple=True,
 )
+@add_options(FUNCTION_TAG_OPTIONS)
+@add_options(FUNCTION_FILTER_OPTIONS)
+@add_options(INVENTORY_OPTIONS)
+@add_options(CONCURRENCY_OPTIONS)
+@click.option(
+    "--plan-out",
+    help="Write the planned changes to this file instead of updating functions. "
+    "Apply them later with `newrelic-lambda layers apply`",
+    metavar="<file>",
+    type=click.Path(dir_okay=False, writable=True),
+)
+@add_options(JOURNAL_OPTIONS)
 @click.pass_context
 def uninstall(ctx, **kwargs):
     """Uninstall New Relic AWS Lambda Layers"""
-    input = LayerUninstall(session=None, verbose=ctx.obj["VERBOSE"], **kwargs)
-    input = input._replace(
-        session=boto3.Session(
-            profile_name=input.aws_profile, region_name=input.aws_region
-        )
+    input = LayerUninstall(
+        session=None,
+        inventory=(
+            FunctionInventory(max_age=kwargs["inventory_max_age"])
+            if kwargs["use_inventory"]
+            else None
+        ),
+        scheduler=None,
+        summary=None,
+        role_policies=layers.RolePolicyChanges(),
+        plan=layers.ChangePlan() if kwargs["plan_out"] else None,
+        journal=open_journal(
+            "layers uninstall", kwargs["journal_path"], kwargs["resume"]
+        ),
+        verbose=ctx.obj["VERBOSE"],
+        **kwargs,
+    )
+    ensure_function_selection(input)
+
+    regions = resolve_regions(input.aws_region, input.aws_profile)
+    results = run_in_regions(
+        regions, lambda region: _uninstall(_for_region(input, region))
     )
+    updated_roles = _update_role_policies(input, regions)
+    if input.journal is not None:
+        input.journal.close()
+
+    report_regions(regions, results, "Uninstall")
+    results.append(updated_roles)
+
+    if input.plan is not None:
+        _write_plan(input, results)
+    elif all(results):
+        done("Uninstall Complete")
+    else:
+        failure("Uninstall Incomplete. See messages above for details.", exit=True)
+
+
+def _uninstall(input):
     if input.aws_permissions_check:
         permissions.ensure_layer_uninstall_permissions(input)
 
-    functions = get_aliased_functions(input)
+    configs = {}
+    functions = get_aliased_functions(input, configs)
+    if input.journal is not None:
+        functions = input.journal.pending(input.session.region_name, functions)
 
-    with ThreadPoolExecutor() as executor:
-        futures = [
+    with ContextThreadPoolExecutor(max_workers=input.max_concurrency) as executor:
+        futures = {
             executor.submit(
                 layers.uninstall,
-                input._replace(
-                    session=boto3.Session(
-                        profile_name=input.aws_profile, region_name=input.aws_region
-                    )
-                ),
+                input,
                 function,
-            )
+                configs.get(function),
+            ): function
             for function in functions
-        ]
-        uninstall_success = all(future.result() for future in as_completed(futures))
+        }
+        results = []
+        for future in as_completed(futures):
+            result = future.result()
+            if not result:
+                _record_failure(input, futures[future])
+            results.append(result)
+    results.append(_finish_updates(input))
 
-    if uninstall_success:
-        done("Uninstall Complete")
+    _report(input)
+    return all(results)
+
+
+@click.command(name="apply")
+@click.argument(
+    "plan_file",
+    metavar="<plan>",
+    type=click.Path(exists=True, dir_okay=False),
+)
+@add_options(AWS_OPTIONS[:1])
+@add_options(CONCURRENCY_OPTIONS)
+@click.pass_context
+def apply(ctx, **kwargs):
+    """Apply a plan written by install or uninstall with --plan-out"""
+    input = LayerApply(
+        session=None,
+        aws_region=None,
+        scheduler=None,
+        summary=None,
+        role_policies=layers.RolePolicyChanges(),
+        resource_tags=None,
+        verbose=ctx.obj["VERBOSE"],
+        **kwargs,
+    )
+
+    changes = layers.ChangePlan.read(input.plan_file).changes
+    if not changes:
+        done("Nothing to apply")
+        return
+
+    regions = unique(change["Region"] for change in changes)
+    results = run_in_regions(
+        regions,
+        lambda region: _apply(
+            _for_region(input, region),
+            [change for change in changes if change["Region"] == region],
+        ),
+    )
+
+    report_regions(regions, results, "Apply")
+    results.append(_update_role_policies(input, regions))
+
+    if all(results):
+        done("Apply Complete")
     else:
-        failure("Uninstall Incomplete. See messages above for details.", exit=True)
+        failure("Apply Incomplete. See messages above for details.", exit=True)
+
+
+def _apply(input, changes):
+    input = input._replace(resource_tags=layers.ResourceTags())
+    with ContextThreadPoolExecutor(max_workers=input.max_concurrency) as executor:
+        futures = [executor.submit(layers.apply, input, change) for change in changes]
+        results = [future.result() for future in as_completed(futures)]
+
+    for result in results:
+        if not result:
+            input.summary.record("failed")
+    results.append(_finish_updates(input))
+
+    _report(input)
+    return all(results)
@@ -1,15 +1,35 @@
 # -*- coding: utf-8 -*-
 
-from concurrent.futures import as_completed, ThreadPoolExecutor
+from concurrent.futures import as_completed
 
 import boto3
 import click
 
 from newrelic_lambda_cli import permissions, subscriptions
-from newrelic_lambda_cli.cliutils import done, failure
-from newrelic_lambda_cli.cli.decorators import add_options, AWS_OPTIONS
-from newrelic_lambda_cli.functions import get_aliased_functions
+from newrelic_lambda_cli.cliutils import done, failure, report_regions
+from newrelic_lambda_cli.cli.decorators import (
+    add_options,
+    FUNCTION_FILTER_OPTIONS,
+    FUNCTION_TAG_OPTIONS,
+    INVENTORY_OPTIONS,
+    JOURNAL_OPTIONS,
+    MULTI_REGION_AWS_OPTIONS,
+)
+from newrelic_lambda_cli.functions import (
+    ensure_function_selection,
+    get_aliased_functions,
+)
+from newrelic_lambda_cli.inventory import FunctionInventory
+from newrelic_lambda_cli.journal import open_journal
 from newrelic_lambda_cli.types import SubscriptionInstall, SubscriptionUninstall
+from newrelic_lambda_cli.utils import (
+    ContextThreadPoolExecutor,
+    DEFAULT_MAX_WORKERS,
+    function_name,
+    PooledSession,
+    resolve_regions,
+    run_in_regions,
+)
 
 DEFAULT_FILTER_PATTERN = '?REPORT ?NR_LAMBDA_MONITORING ?"Task timed out" ?RequestId'
 
@@ -27,7 +47,7 @@ def register(group):
 
 
 @click.command(name="install")
-@add_options(AWS_OPTIONS)
+@add_options(MULTI_REGION_AWS_OPTIONS)
 @click.option(
     "functions",
     "--function",
@@ -35,7 +55,6 @@ def register(group):
     help="AWS Lambda function name or ARN",
     metavar="<arn>",
     multiple=True,
-    required=True,
 )
 @click.option(
     "--stackname",
@@ -53,6 +72,9 @@ def register(group):
     metavar="<name>",
     multiple=True,
 )
+@add_options(FUNCTION_TAG_OPTIONS)
+@add_options(FUNCTION_FILTER_OPTIONS)
+@add_options(INVENTORY_OPTIONS)
 @click.option(
     "filter_pattern",
     "--filter-pattern",
@@ -67,9 +89,36 @@ def register(group):
     help="Subscribe to OTEL log ingestion function",
     is_flag=True,
 )
+@click.option(
+    "--account-policy",
+    help="Stream every log group in the region with a single account subscription "
+    "filter policy, then remove the per-function New Relic filters",
+    is_flag=True,
+)
+@click.option(
+    "--all-log-groups",
+    help="Confirm that --account-policy subscribes every log group in the region, "
+    "including those of other services, not only Lambda functions'",
+    is_flag=True,
+)
+@add_options(JOURNAL_OPTIONS)
 def install(**kwargs):
     """Install New Relic AWS Lambda Log Subscriptions"""
-    input = SubscriptionInstall(session=None, **kwargs)
+    input = SubscriptionInstall(
+        session=None,
+        destination_arn=None,
+        log_groups=None,
+        inventory=(
+            FunctionInventory(max_age=kwargs["inventory_max_age"])
+            if kwargs["use_inventory"]
+            else None
+        ),
+        journal=open_journal(
+            "subscriptions install", kwargs["journal_path"], kwargs["resume"]
+        ),
+        **kwargs,
+    )
+    ensure_function_selection(input)
     if input.otel and input.filter_pattern == DEFAULT_FILTER_PATTERN:
         input = input._replace(
             filter_pattern="",
@@ -78,53 +127,149 @@ def install(**kwargs):
         input = input._replace(
             stackname="NewRelicOtelLogIngestion",
         )
-    input = input._replace(
-        session=boto3.Session(
-            profile_name=input.aws_profile, region_name=input.aws_region
+    if input.account_policy:
+        _ensure_account_policy_scope(input)
+
+    regions = resolve_regions(input.aws_region, input.aws_profile)
+    results = run_in_regions(
+        regions, lambda region: _install(_for_region(input, region))
+    )
+    if input.journal is not None:
+        input.journal.close()
+    report_regions(regions, results, "Install")
+
+    if all(results):
+        done("Install Complete")
+    else:
+        failure("Install Incomplete. See messages above for details.", exit=True)
+
+
+def _ensure_account_policy_scope(input):
+    """
+    The account policy can only exclude log groups by name, so it streams every log
+    group in the region rather than only Lambda functions', and only ``--exclude``
+    can leave functions out of it
+    """
+    if not input.filter_pattern:
+        raise click.UsageError(
+            "--account-policy subscribes every log group in the region, so it can't "
+            "be used with an empty filter pattern (the default with --otel), which "
+            "would forward all of their log events. Provide a --filter-pattern."
+        )
+    if not input.all_log_groups:
+        raise click.UsageError(
+            "--account-policy subscribes every log group in the region, including "
+            "those of other services, to New Relic log ingestion. Add "
+            "--all-log-groups to confirm."
         )
+    narrowing = [
+        option
+        for option, value in (
+            ("--function-tag", input.function_tags),
+            ("--function-pattern", input.function_patterns),
+            ("--exclude-pattern", input.exclude_patterns),
+            ("--runtime", input.runtimes),
+            ("--architecture", input.architectures),
+            ("--shard", input.shard),
+        )
+        if value
+    ]
+    if any(function.lower() != "all" for function in input.functions):
+        narrowing.insert(0, "--function other than 'all'")
+    if narrowing:
+        raise click.UsageError(
+            "--account-policy subscribes every log group in the region except the "
+            "--exclude functions, so it can't be used with %s. Use --function all "
+            "and --exclude instead." % ", ".join(narrowing)
+        )
+
+
+def _for_region(input, region):
+    """Returns a copy of the input with its own session for the region"""
+    return input._replace(
+        aws_region=region,
+        session=PooledSession(
+            boto3.Session(profile_name=input.aws_profile, region_name=region)
+        ),
     )
+
+
+def _with_log_group_index(input, functions):
+    """
+    Returns a copy of the input with the region's Lambda log groups prefetched, so
+    functions that have never logged can be handled without a call each. Listing
+    only pays off if it takes fewer calls than there are functions to check, so it
+    stops once it doesn't.
+    """
+    if len(functions) < 2:
+        return input
+    return input._replace(
+        log_groups=subscriptions.get_log_group_index(
+            input.session, max_calls=len(functions) - 1
+        )
+    )
+
+
+def _pending(input, functions):
+    """Drops the functions that finished in the run being resumed"""
+    if input.journal is None:
+        return functions
+    return input.journal.pending(input.session.region_name, functions)
+
+
+def _run(input, worker, functions):
+    """Calls the worker for each function, journaling each outcome as it finishes"""
+    with ContextThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(worker, input, function): function for function in functions
+        }
+        results = []
+        for future in as_completed(futures):
+            result = future.result()
+            if input.journal is not None:
+                input.journal.record(
+                    input.session.region_name,
+                    futures[future],
+                    "updated" if result else "failed",
+                )
+            results.append(result)
+    return all(results)
+
+
+def _install(input):
     if input.aws_permissions_check:
         permissions.ensure_subscription_install_permissions(input)
 
-    functions = get_aliased_functions(input)
-
-    with ThreadPoolExecutor() as executor:
-        if input.otel:
-            futures = [
-                executor.submit(
-                    subscriptions.create_otel_log_subscription,
-                    input._replace(
-                        session=boto3.Session(
-                            profile_name=input.aws_profile, region_name=input.aws_region
-                        )
-                    ),
-                    function,
-                )
-                for function in functions
-            ]
-        else:
-            futures = [
-                executor.submit(
-                    subscriptions.create_log_subscription,
-                    input._replace(
-                        session=boto3.Session(
-                            profile_name=input.aws_profile, region_name=input.aws_region
-                        )
-                    ),
-                    function,
-                )
-                for function in functions
-            ]
-        install_success = all(future.result() for future in as_completed(futures))
+    # Every function in the region streams to the same destination
+    destination_arn = subscriptions.get_log_destination_arn(input)
+    if destination_arn is None:
+        return False
+    input = input._replace(destination_arn=destination_arn)
 
-    if install_success:
-        done("Install Complete")
-    else:
-        failure("Install Incomplete. See messages above for details.", exit=True)
+    if input.account_policy:
+        if not subscriptions.create_account_policy(input):
+            return False
+        if not subscriptions.verify_account_policy(input):
+            return False
+        # The account policy now covers these functions, so their own filters would
+        # only deliver duplicate log events
+        return _remove_log_subscriptions(
+            input,
+            subscriptions.get_account_policy_excluded_log_groups(
+                destination_arn, input.excludes
+            ),
+        )
+
+    functions = _pending(input, get_aliased_functions(input))
+    input = _with_log_group_index(input, functions)
+
+    if input.otel:
+        return _run(input, subscriptions.create_otel_log_subscription, functions)
+    return _run(input, subscriptions.create_log_subscription, functions)
 
 
 @click.command(name="uninstall")
-@add_options(AWS_OPTIONS)
+@add_options(MULTI_REGION_AWS_OPTIONS)
 @click.option(
     "functions",
     "--function",
@@ -132,7 +277,6 @@ def install(**kwargs):
     help="Lambda function name or ARN",
     metavar="<arn>",
     multiple=True,
-    required=True,
 )
 @click.option(
     "excludes",
@@ -142,55 +286,76 @@ def install(**kwargs):
     metavar="<name>",
     multiple=True,
 )
+@add_options(FUNCTION_TAG_OPTIONS)
+@add_options(FUNCTION_FILTER_OPTIONS)
+@add_options(INVENTORY_OPTIONS)
 @click.option(
     "--otel",
     "-o",
     help="Subscribe to OTEL log ingestion function",
     is_flag=True,
 )
+@click.option(
+    "--account-policy",
+    help="Also remove the account subscription filter policy",
+    is_flag=True,
+)
+@add_options(JOURNAL_OPTIONS)
 def uninstall(**kwargs):
     """Uninstall New Relic AWS Lambda Log Subscriptions"""
-    input = SubscriptionUninstall(session=None, **kwargs)
-    input = input._replace(
-        session=boto3.Session(
-            profile_name=input.aws_profile, region_name=input.aws_region
-        )
+    input = SubscriptionUninstall(
+        session=None,
+        log_groups=None,
+        inventory=(
+            FunctionInventory(max_age=kwargs["inventory_max_age"])
+            if kwargs["use_inventory"]
+            else None
+        ),
+        journal=open_journal(
+            "subscriptions uninstall", kwargs["journal_path"], kwargs["resume"]
+        ),
+        **kwargs,
     )
-    if input.aws_permissions_check:
-        permissions.ensure_subscription_uninstall_permissions(input)
+    ensure_function_selection(input)
 
-    functions = get_aliased_functions(input)
-
-    with ThreadPoolExecutor() as executor:
-        if input.otel:
-            futures = [
-                executor.submit(
-                    subscriptions.remove_otel_log_subscription,
-                    input._replace(
-                        session=boto3.Session(
-                            profile_name=input.aws_profile, region_name=input.aws_region
-                        )
-                    ),
-                    function,
-                )
-                for function in functions
-            ]
-        else:
-            futures = [
-                executor.submit(
-                    subscriptions.remove_log_subscription,
-                    input._replace(
-                        session=boto3.Session(
-                            profile_name=input.aws_profile, region_name=input.aws_region
-                        )
-                    ),
-                    function,
-                )
-                for function in functions
-            ]
-        uninstall_success = all(future.result() for future in as_completed(futures))
+    regions = resolve_regions(input.aws_region, input.aws_profile)
+    results = run_in_regions(
+        regions, lambda region: _uninstall(_for_region(input, region))
+    )
+    if input.journal is not None:
+        input.journal.close()
+    report_regions(regions, results, "Uninstall")
 
-    if uninstall_success:
+    if all(results):
         done("Uninstall Complete")
     else:
         failure("Uninstall Incomplete. See messages above for details.", exit=True)
+
+
+def _uninstall(input):
+    if input.aws_permissions_check:
+        permissions.ensure_subscription_uninstall_permissions(input)
+
+    if input.account_policy and not subscriptions.remove_account_policy(input):
+        return False
+
+    return _remove_log_subscriptions(input)
+
+
+def _remove_log_subscriptions(input, keep_log_groups=()):
+    """
+    Removes the New Relic log subscription filter from each function's log group,
+    except the given log groups
+    """
+    functions = [
+        function
+        for function in get_aliased_functions(input)
+        if subscriptions.LAMBDA_LOG_GROUP_PREFIX + function_name(function)
+        not in keep_log_groups
+    ]
+    functions = _pending(input, functions)
+    input = _with_log_group_index(input, functions)
+
+    if input.otel:
+        return _run(input, subscriptions.remove_otel_log_subscription, functions)
+    return _run(input, subscriptions.remove_log_subscription, functions)
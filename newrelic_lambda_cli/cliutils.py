@@ -1,19 +1,30 @@
 # -*- coding: utf-8 -*-
 
+import contextvars
+import threading
+
 import click
 
 from click.exceptions import Exit
 
+# The region a multi-region command is working on, which messages are prefixed with
+current_region = contextvars.ContextVar("current_region", default=None)
+
+
+def _prefixed(message):
+    region = current_region.get()
+    return f"{region}: {message}" if region else message
+
 
 def done(message):
     """Prints a done message to the terminal"""
-    click.echo(f"✔️ {message} ✔️")
+    click.echo(f"✔️ {_prefixed(message)} ✔️")
 
 
 def failure(message, exit=False):
     """Prints a failure message to the terminal"""
     click.secho(
-        f"✘ {message}",
+        f"✘ {_prefixed(message)}",
         fg="red",
         err=True,
     )
@@ -24,7 +35,7 @@ def failure(message, exit=False):
 def success(message):
     """Prints a success message to the terminal"""
     click.secho(
-        f"✔️ {message}",
+        f"✔️ {_prefixed(message)}",
         fg="green",
     )
 
@@ -32,6 +43,53 @@ def success(message):
 def warning(message):
     """Prints a warning message to the terminal"""
     click.secho(
-        f"⚠️ {message}",
+        f"⚠️ {_prefixed(message)}",
         fg="blue",
     )
+
+
+def echo(message, err=False):
+    """Prints a plain message to the terminal"""
+    click.echo(_prefixed(message), err=err)
+
+
+def report_regions(regions, results, action):
+    """Prints the outcome per region for commands that ran in several regions"""
+    if len(regions) < 2:
+        return
+    for region, result in zip(regions, results):
+        if result:
+            success("%s: %s Complete" % (region, action))
+        else:
+            failure("%s: %s Incomplete" % (region, action))
+
+
+class UpdateSummary(object):
+    """Thread-safe tally of per-function outcomes for the end of run summary"""
+
+    OUTCOMES = ("planned", "updated", "skipped", "failed")
+
+    def __init__(self):
+        self.counts = dict.fromkeys(self.OUTCOMES, 0)
+        self._lock = threading.Lock()
+
+    def record(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def __str__(self):
+        if self.counts["planned"]:
+            return "%d planned, %d up to date, %d failed" % (
+                self.counts["planned"],
+                self.counts["skipped"],
+                self.counts["failed"],
+            )
+        return "%d updated, %d up to date, %d failed" % (
+            self.counts["updated"],
+            self.counts["skipped"],
+            self.counts["failed"],
+        )
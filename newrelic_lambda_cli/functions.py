@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import queue
+
 import botocore
 import click
 
@@ -14,19 +16,25 @@ from newrelic_lambda_cli import utils
 
 @utils.catch_boto_errors
 def list_functions(session, filter=None):
+    """
+    Lists the functions in the session's region, marking those with a New Relic layer
+    in ``x-new-relic-enabled``
+    """
     client = session.client("lambda")
 
     all = filter == "all" or not filter
 
+    is_new_relic_layer = utils.new_relic_layer_matcher(
+        session.region_name, session.profile_name
+    )
+
     pager = client.get_paginator("list_functions")
     for res in pager.paginate():
         funcs = res.get("Functions", [])
         for func in funcs:
             func.setdefault("x-new-relic-enabled", False)
             for layer in func.get("Layers", []):
-                if layer.get("Arn", "").startswith(
-                    utils.get_arn_prefix(session.region_name)
-                ):
+                if is_new_relic_layer(layer.get("Arn", "")):
                     func["x-new-relic-enabled"] = True
             if all:
                 yield func
@@ -36,6 +44,51 @@ def list_functions(session, filter=None):
                 yield func
 
 
+def list_functions_in_regions(sessions, filter=None, inventory=None, failed=None):
+    """
+    Lists functions in several regions concurrently, yielding each function as soon
+    as its page arrives. Functions are tagged with their region in ``x-aws-region``.
+    If an ``inventory`` is given, functions are read from it instead.
+
+    With several regions, an error in one region is reported as its failure while
+    the others keep streaming, and the region is appended to ``failed`` if given.
+    """
+    source = list_functions if inventory is None else inventory.list_functions
+
+    if len(sessions) == 1:
+        for func in source(sessions[0], filter):
+            func["x-aws-region"] = sessions[0].region_name
+            yield func
+        return
+
+    results = queue.Queue()
+
+    def _list(session):
+        def _stream(region):
+            for func in source(session, filter):
+                func["x-aws-region"] = region
+                results.put(func)
+            return True
+
+        try:
+            if not utils._run_in_region(_stream, session.region_name):
+                if failed is not None:
+                    failed.append(session.region_name)
+        finally:
+            results.put(None)
+
+    with utils.ContextThreadPoolExecutor(max_workers=len(sessions)) as executor:
+        for session in sessions:
+            executor.submit(_list, session)
+        remaining = len(sessions)
+        while remaining:
+            item = results.get()
+            if item is None:
+                remaining -= 1
+            else:
+                yield item
+
+
 def get_function(session, function_name):
     """Returns details about an AWS lambda function"""
     try:
@@ -51,10 +104,124 @@ def get_function(session, function_name):
         raise click.UsageError(str(e))
 
 
-def get_aliased_functions(input):
+@utils.catch_boto_errors
+def get_tagged_functions(session, tags, mode="and"):
+    """
+    Returns the names of the functions with the given tags, queried server side with
+    the Resource Groups Tagging API rather than by listing every function.
+
+    :param tags: A sequence of ``(key, value)`` pairs
+    :param mode: ``and`` to match functions with every tag, ``or`` for any of them
+    """
+    values = {}
+    for key, value in tags:
+        values.setdefault(key, []).append(value)
+
+    if mode == "and":
+        # A function has one value per tag key, so conflicting values can't match
+        if any(len(set(key_values)) > 1 for key_values in values.values()):
+            return []
+        queries = [[{"Key": key, "Values": vals[:1]} for key, vals in values.items()]]
+    else:
+        # Tag filters for different keys are ANDed, so each key needs its own query
+        queries = [[{"Key": key, "Values": vals}] for key, vals in values.items()]
+
+    pager = session.client("resourcegroupstaggingapi").get_paginator("get_resources")
+    functions = []
+    for tag_filters in queries:
+        for res in pager.paginate(
+            ResourceTypeFilters=["lambda:function"], TagFilters=tag_filters
+        ):
+            for resource in res.get("ResourceTagMappingList", []):
+                functions.append(utils.parse_arn(resource["ResourceARN"])["resource"])
+    return utils.unique(functions)
+
+
+def ensure_function_selection(input):
+    """Raises a usage error if the input doesn't select any functions"""
+    if not input.functions and not input.function_tags and not input.function_patterns:
+        raise click.UsageError(
+            "Provide at least one --function, --function-tag or --function-pattern "
+            "to select functions"
+        )
+
+
+def _configuration_matcher(input):
+    """
+    Returns a predicate that tells whether a function configuration has one of the
+    selected runtimes and architectures
+    """
+    runtimes = set(input.runtimes or ())
+    architectures = set(input.architectures or ())
+
+    def _matches(function):
+        return (not runtimes or function.get("Runtime") in runtimes) and (
+            not architectures
+            or not architectures.isdisjoint(function.get("Architectures", ["x86_64"]))
+        )
+
+    return _matches
+
+
+def _function_matcher(input, excludes, tagged, match_configuration=True):
+    """
+    Returns a predicate that tells whether a listed function is selected, with the
+    name patterns compiled once rather than per function. Runtimes and
+    architectures are only checked if ``match_configuration`` is set.
+    """
+    include = utils.compile_name_patterns(input.function_patterns)
+    exclude = utils.compile_name_patterns(input.exclude_patterns)
+    matches_configuration = (
+        _configuration_matcher(input) if match_configuration else lambda _: True
+    )
+
+    def _matches(function):
+        name = function.get("FunctionName")
+        return bool(
+            name
+            and "newrelic-log-ingestion" not in name
+            and name not in excludes
+            and (tagged is None or name in tagged)
+            and (include is None or include.match(name))
+            and (exclude is None or not exclude.match(name))
+            and (input.shard is None or utils.in_shard(name, input.shard))
+            and matches_configuration(function)
+        )
+
+    return _matches
+
+
+def _narrow_by_configuration(input, functions, configs):
+    """
+    Keeps the given functions with a selected runtime and architecture, fetching
+    each one's configuration. Functions that can't be found are kept, so that the
+    command reports them.
+    """
+    matches_configuration = _configuration_matcher(input)
+    narrowed = []
+    for function in functions:
+        config = get_function(input.session, function)
+        if config is None:
+            narrowed.append(function)
+        elif matches_configuration(config["Configuration"]):
+            narrowed.append(function)
+            if configs is not None:
+                configs[function] = {"Configuration": config["Configuration"]}
+    return narrowed
+
+
+def get_aliased_functions(input, configs=None):
     """
     Retrieves functions for 'all, 'installed' and 'not-installed' aliases and appends
-    them to existing list of functions.
+    them to existing list of functions. Tags, name patterns, runtimes and
+    architectures narrow down the aliased functions as each page of them is listed,
+    or all functions if no function was given at all. Name patterns, runtimes,
+    architectures and a shard also narrow down the given functions, they never add
+    functions that weren't given.
+
+    If a ``configs`` dict is provided it is populated with the configuration of each
+    aliased function, keyed by function name and shaped like a ``get_function``
+    response, so that callers can skip fetching it again.
     """
     assert isinstance(
         input,
@@ -67,24 +234,64 @@ def get_aliased_functions(input):
         if function.lower() in ("all", "installed", "not-installed")
     ]
 
+    excludes = set(input.excludes or ())
+    include = utils.compile_name_patterns(input.function_patterns)
+    exclude = utils.compile_name_patterns(input.exclude_patterns)
+
     functions = [
         function
         for function in input.functions
         if function.lower() not in ("all", "installed", "not-installed")
         and "newrelic-log-ingestion" not in function.lower()
-        and function not in input.excludes
+        and function not in excludes
+        and (include is None or include.match(utils.function_name(function)))
+        and (exclude is None or not exclude.match(utils.function_name(function)))
+        and (input.shard is None or utils.in_shard(function, input.shard))
     ]
+    if functions and (input.runtimes or input.architectures):
+        functions = _narrow_by_configuration(input, functions, configs)
+
+    tagged = None
+    if input.function_tags:
+        tagged = set(
+            get_tagged_functions(
+                input.session, input.function_tags, input.function_tag_mode
+            )
+        )
+
+    # Patterns, runtimes and architectures only narrow down the given functions and
+    # aliases, they select from every function only when no function was given
+    if not input.functions and (
+        input.function_patterns or input.runtimes or input.architectures
+    ):
+        aliases = ["all"]
 
     if not aliases:
+        if tagged is not None:
+            # Only names are known for tagged functions, their configurations are
+            # fetched to check runtimes and architectures like the given functions
+            matches = _function_matcher(
+                input, excludes, tagged, match_configuration=False
+            )
+            tagged = [
+                function
+                for function in sorted(tagged)
+                if matches({"FunctionName": function})
+            ]
+            if tagged and (input.runtimes or input.architectures):
+                tagged = _narrow_by_configuration(input, tagged, configs)
+            functions.extend(tagged)
         return utils.unique(functions)
 
+    source = (
+        list_functions if input.inventory is None else input.inventory.list_functions
+    )
+    matches = _function_matcher(input, excludes, tagged)
     for alias in set(aliases):
-        for function in list_functions(input.session, alias):
-            if (
-                "FunctionName" in function
-                and "newrelic-log-ingestion" not in function["FunctionName"]
-                and function["FunctionName"] not in input.excludes
-            ):
+        for function in source(input.session, alias):
+            if matches(function):
                 functions.append(function["FunctionName"])
+                if configs is not None:
+                    configs[function["FunctionName"]] = {"Configuration": function}
 
     return utils.unique(functions)
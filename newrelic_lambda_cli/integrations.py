@@ -16,14 +16,17 @@ from newrelic_lambda_cli.types import (
     IntegrationUpdate,
     OtelIngestionUninstall,
 )
-from newrelic_lambda_cli.utils import catch_boto_errors, NR_DOCS_ACT_LINKING_URL
+from newrelic_lambda_cli.utils import (
+    catch_boto_errors,
+    NR_DOCS_ACT_LINKING_URL,
+    RunCache,
+)
 
 INGEST_STACK_NAME = "NewRelicLogIngestion"
 LICENSE_KEY_STACK_NAME = "NewRelicLicenseKeySecret"
 
-__cached_license_key_arn = None
-__cached_license_key_policy_arn = None
-__cached_license_key_nr_account_id = None
+# Stack outputs of the license key secret, per AWS profile and region
+license_key_outputs_cache = RunCache()
 
 
 def _get_role(session, role_name):
@@ -782,6 +785,7 @@ def install_license_key(input, nr_license_key, policy_name=None):
         failure("Failed to create %s stack: %s" % (LICENSE_KEY_STACK_NAME, e))
         return False
     else:
+        license_key_outputs_cache.invalidate(_license_key_outputs_key(input.session))
         return True
 
 
@@ -798,6 +802,7 @@ def remove_license_key(input):
         return
     click.echo("Deleting stack '%s'" % LICENSE_KEY_STACK_NAME)
     client.delete_stack(StackName=LICENSE_KEY_STACK_NAME)
+    license_key_outputs_cache.invalidate(_license_key_outputs_key(input.session))
     click.echo(
         "Waiting for stack deletion to complete, this may take a minute... ", nl=False
     )
@@ -814,29 +819,23 @@ def remove_license_key(input):
 
 def _get_license_key_outputs(session):
     """Returns the account id, secret arn and policy ARN for the license key secret if they exist"""
-    global __cached_license_key_arn
-    global __cached_license_key_nr_account_id
-    global __cached_license_key_policy_arn
-    if (
-        __cached_license_key_arn
-        and __cached_license_key_nr_account_id
-        and __cached_license_key_policy_arn
-    ):
-        return (
-            __cached_license_key_arn,
-            __cached_license_key_nr_account_id,
-            __cached_license_key_policy_arn,
-        )
+    return license_key_outputs_cache.get(
+        _license_key_outputs_key(session), _fetch_license_key_outputs, session
+    )
+
+
+def _license_key_outputs_key(session):
+    return (getattr(session, "profile_name", None), session.region_name)
+
+
+def _fetch_license_key_outputs(session):
     output_values = _get_stack_output_value(
         session, ["LicenseKeySecretARN", "NrAccountId", "ViewPolicyARN"]
     )
-    __cached_license_key_arn = output_values.get("LicenseKeySecretARN")
-    __cached_license_key_nr_account_id = output_values.get("NrAccountId")
-    __cached_license_key_policy_arn = output_values.get("ViewPolicyARN")
     return (
-        __cached_license_key_arn,
-        __cached_license_key_nr_account_id,
-        __cached_license_key_policy_arn,
+        output_values.get("LicenseKeySecretARN"),
+        output_values.get("NrAccountId"),
+        output_values.get("ViewPolicyARN"),
     )
 
 
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from newrelic_lambda_cli import utils
+from newrelic_lambda_cli.functions import list_functions
+from newrelic_lambda_cli.utils import RunCache
+
+INVENTORY_PATH = os.path.join(
+    os.path.expanduser("~"), ".newrelic-lambda-cli", "inventory.sqlite"
+)
+DEFAULT_INVENTORY_MAX_AGE = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS functions (
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    function_name TEXT NOT NULL,
+    revision_id TEXT,
+    last_modified TEXT,
+    new_relic_enabled INTEGER NOT NULL,
+    new_relic_layer_arn TEXT,
+    configuration TEXT NOT NULL,
+    PRIMARY KEY (account, region, function_name)
+);
+CREATE TABLE IF NOT EXISTS regions (
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    PRIMARY KEY (account, region)
+);
+"""
+
+# The AWS account of each profile, looked up once per run
+account_id_cache = RunCache()
+
+
+def _get_account_id(session):
+    return account_id_cache.get(
+        getattr(session, "profile_name", None),
+        lambda: session.client("sts").get_caller_identity()["Account"],
+    )
+
+
+class FunctionInventory(object):
+    """
+    A local SQLite inventory of function configurations and New Relic enablement,
+    per account and region, so that aliases can be resolved without listing every
+    function on each run.
+
+    A region is refreshed when its entries are older than ``max_age`` seconds (0
+    always refreshes). A refresh still pages through the region's functions, but
+    only rewrites the entries whose RevisionId or LastModified changed. Function
+    configurations include environment variables, so the file is only readable by
+    its owner.
+    """
+
+    def __init__(self, path=INVENTORY_PATH, max_age=DEFAULT_INVENTORY_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            os.close(os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o600))
+            os.chmod(self.path, 0o600)
+            self._connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _refreshed_at(self, account, region):
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT refreshed_at FROM regions WHERE account = ? AND region = ?",
+                    (account, region),
+                )
+                .fetchone()
+            )
+        return row[0] if row else None
+
+    def refresh(self, session):
+        """
+        Updates the region's entries from a listing of its functions, returning the
+        number of entries that were changed and removed
+        """
+        account, region = _get_account_id(session), session.region_name
+        is_new_relic_layer = utils.new_relic_layer_matcher(
+            region, getattr(session, "profile_name", None)
+        )
+
+        with self._lock:
+            known = {
+                name: (revision_id, last_modified)
+                for name, revision_id, last_modified in self._connect().execute(
+                    "SELECT function_name, revision_id, last_modified FROM functions "
+                    "WHERE account = ? AND region = ?",
+                    (account, region),
+                )
+            }
+
+        changed = []
+        seen = set()
+        for func in list_functions(session):
+            name = func["FunctionName"]
+            seen.add(name)
+            if known.get(name) == (func.get("RevisionId"), func.get("LastModified")):
+                continue
+            layer_arns = [
+                layer["Arn"]
+                for layer in func.get("Layers", [])
+                if is_new_relic_layer(layer.get("Arn", ""))
+            ]
+            changed.append(
+                (
+                    account,
+                    region,
+                    name,
+                    func.get("RevisionId"),
+                    func.get("LastModified"),
+                    int(func["x-new-relic-enabled"]),
+                    layer_arns[0] if layer_arns else None,
+                    json.dumps(func),
+                )
+            )
+        removed = [(account, region, name) for name in known if name not in seen]
+
+        with self._lock, self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO functions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                changed,
+            )
+            connection.executemany(
+                "DELETE FROM functions "
+                "WHERE account = ? AND region = ? AND function_name = ?",
+                removed,
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO regions VALUES (?, ?, ?)",
+                (account, region, time.time()),
+            )
+        return len(changed), len(removed)
+
+    def invalidate(self, session):
+        """Marks the region as out of date, so that it is refreshed on next use"""
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "DELETE FROM regions WHERE account = ? AND region = ?",
+                (_get_account_id(session), session.region_name),
+            )
+
+    def list_functions(self, session, filter=None):
+        """
+        Yields the region's functions from the inventory, shaped and filtered like
+        ``functions.list_functions``, refreshing them first if they're out of date
+        """
+        account, region = _get_account_id(session), session.region_name
+        refreshed_at = self._refreshed_at(account, region)
+        if (
+            refreshed_at is None
+            or not self.max_age
+            or time.time() - refreshed_at >= self.max_age
+        ):
+            self.refresh(session)
+
+        query = (
+            "SELECT configuration, new_relic_enabled FROM functions "
+            "WHERE account = ? AND region = ?"
+        )
+        if filter == "installed":
+            query += " AND new_relic_enabled = 1"
+        elif filter == "not-installed":
+            query += " AND new_relic_enabled = 0"
+        with self._lock:
+            rows = (
+                self._connect()
+                .execute(query + " ORDER BY function_name", (account, region))
+                .fetchall()
+            )
+
+        for configuration, new_relic_enabled in rows:
+            func = json.loads(configuration)
+            func["x-new-relic-enabled"] = bool(new_relic_enabled)
+            yield func
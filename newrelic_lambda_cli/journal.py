@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import time
+
+import click
+
+from newrelic_lambda_cli.cliutils import echo
+
+# Outcomes that don't need to be retried when a run is resumed
+FINISHED_OUTCOMES = ("updated", "skipped")
+
+# Written for a function whose role policy and tag steps are still to be made, so
+# that a run interrupted before them retries the function
+PENDING_OUTCOME = "pending"
+
+
+class Journal(object):
+    """
+    An append-only JSON lines record of each function's outcome in a run, written as
+    functions finish so that an interrupted run can be resumed.
+
+    :param path: The journal file, appended to if it already exists
+    :param command: The command being run, e.g. "layers install". Only entries of the
+        same command count as finished.
+    :param finished: ``(region, function)`` pairs to skip
+    """
+
+    def __init__(self, path, command, finished=()):
+        self.path = path
+        self.command = command
+        self.finished = set(finished)
+        self._deferred = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    def record(self, region, function, outcome, revision_id=None):
+        entry = {
+            "Command": self.command,
+            "Region": region,
+            "Function": function,
+            "Outcome": outcome,
+            "Time": time.time(),
+        }
+        if revision_id:
+            entry["RevisionId"] = revision_id
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            if self._file is None:
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                self._file = os.fdopen(fd, "a")
+            # Flushed line by line, so only the entry being written when the run
+            # is killed can be lost
+            self._file.write(line)
+            self._file.flush()
+
+    def defer(self, region, function, outcome, revision_id=None):
+        """
+        Records the function as pending until ``complete`` is called for its region,
+        for outcomes that depend on steps run after all of the region's functions
+        """
+        self.record(region, function, PENDING_OUTCOME)
+        with self._lock:
+            self._deferred.setdefault(region, []).append(
+                (function, outcome, revision_id)
+            )
+
+    def complete(self, region, succeeded):
+        """
+        Records the outcomes deferred in the region, or failed for every function if
+        the steps they depend on didn't succeed
+        """
+        with self._lock:
+            deferred = self._deferred.pop(region, [])
+        for function, outcome, revision_id in deferred:
+            if succeeded:
+                self.record(region, function, outcome, revision_id)
+            else:
+                self.record(region, function, "failed")
+
+    def complete_all(self, succeeded):
+        """Records the outcomes deferred in every region, as ``complete`` does"""
+        with self._lock:
+            regions = list(self._deferred)
+        for region in regions:
+            self.complete(region, succeeded)
+
+    def pending(self, region, functions):
+        """Returns the functions that didn't finish in the run being resumed"""
+        pending = [
+            function
+            for function in functions
+            if (region, function) not in self.finished
+        ]
+        if len(pending) < len(functions):
+            echo(
+                "Skipping %d function(s) that finished in %s"
+                % (len(functions) - len(pending), self.path)
+            )
+        return pending
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @classmethod
+    def read_finished(cls, path, command):
+        """
+        Returns the ``(region, function)`` pairs whose latest outcome for the command
+        is finished
+        """
+        latest = {}
+        try:
+            with open(path) as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A partial line from an interrupted run
+                        continue
+                    if isinstance(entry, dict) and entry.get("Command") == command:
+                        latest[(entry.get("Region"), entry.get("Function"))] = (
+                            entry.get("Outcome")
+                        )
+        except OSError as e:
+            raise click.UsageError("Could not read journal %s: %s" % (path, e))
+        return {key for key, outcome in latest.items() if outcome in FINISHED_OUTCOMES}
+
+
+def open_journal(command, path=None, resume=None):
+    """
+    Returns the run's journal, or None if neither ``--journal`` nor ``--resume`` was
+    given. A resumed run skips the functions that finished and appends to the same
+    journal unless another one is given.
+    """
+    if not path and not resume:
+        return None
+    finished = Journal.read_finished(resume, command) if resume else ()
+    return Journal(path or resume, command, finished)
@@ -2,18 +2,22 @@
 #
 import sys  #
 
+import boto3
 import botocore
 import click
 import json
+import os
 import requests
+import tempfile
+import threading
+import time
 
-
-from newrelic_lambda_cli import api, subscriptions, utils
+from newrelic_lambda_cli import api, subscriptions, timings, utils
 from newrelic_lambda_cli.cliutils import failure, success, warning
-from newrelic_lambda_cli.functions import get_function
+from newrelic_lambda_cli.functions import get_function, list_functions
 from newrelic_lambda_cli.integrations import _get_license_key_outputs
-from newrelic_lambda_cli.types import LayerInstall, LayerUninstall
-from newrelic_lambda_cli.utils import catch_boto_errors
+from newrelic_lambda_cli.types import LayerApply, LayerInstall, LayerUninstall
+from newrelic_lambda_cli.utils import catch_boto_errors, RunCache
 
 
 NEW_RELIC_ENV_VARS = (
@@ -35,15 +39,226 @@ NEW_RELIC_ENV_VARS = (
 )
 
 
-def index(region, runtime, architecture):
-    req = requests.get(
-        "https://%s.layers.newrelic-external.com/get-layers"
-        "?CompatibleRuntime=%s" % (region, runtime)
+LAYER_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".newrelic-lambda-cli", "layer-cache.json"
+)
+# The on-disk cache is opt-in, so that new layer versions are picked up by default
+DEFAULT_LAYER_CACHE_TTL = 0
+
+
+class LayerIndexCache(object):
+    """
+    A process-wide cache of the New Relic layer catalog, keyed by region and runtime.
+
+    Lookups go through a RunCache, so concurrent lookups for the same key share a
+    single in-flight request and each key is fetched once per run. When a path is
+    configured, non-empty entries are also persisted to disk so that subsequent runs
+    can skip the network until the TTL expires. A falsy TTL never expires entries.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_LAYER_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._memo = RunCache()
+        self._stored = None
+        self._stored_hits = 0
+        self._lock = threading.Lock()
+        # Serializes writes to the file, which merge with its current entries
+        self._file_lock = threading.Lock()
+
+    @property
+    def hits(self):
+        return self._memo.hits + self._stored_hits
+
+    @property
+    def misses(self):
+        return self._memo.misses - self._stored_hits
+
+    def configure(self, path=None, ttl=DEFAULT_LAYER_CACHE_TTL, refresh=False):
+        """Sets the on-disk location and TTL, optionally discarding cached entries"""
+        with self._lock:
+            self.path = path
+            self.ttl = ttl
+            self._stored = {} if refresh else None
+        self._memo.clear()
+
+    def clear(self):
+        with self._lock:
+            self._stored = {}
+            self._stored_hits = 0
+        self._memo.clear()
+
+    def get(self, region, runtime, fetch):
+        """
+        Returns the cached layers for the region and runtime, calling
+        ``fetch(region, runtime)`` on a miss.
+        """
+        key = "%s/%s" % (region, runtime)
+        return self._memo.get(key, self._lookup, key, region, runtime, fetch)
+
+    def _lookup(self, key, region, runtime, fetch):
+        entry = self._stored_entries().get(key)
+        if entry and (not self.ttl or time.time() - entry["fetched_at"] < self.ttl):
+            with self._lock:
+                self._stored_hits += 1
+            return entry["layers"]
+
+        layers = fetch(region, runtime)
+        # An empty catalog is more likely an outage than a region without layers,
+        # so it is only reused for the rest of this run
+        if layers:
+            self._save(key, {"fetched_at": time.time(), "layers": layers})
+        return layers
+
+    def _stored_entries(self):
+        with self._lock:
+            if self._stored is not None:
+                return self._stored
+            path = self.path
+        entries = self._load(path)
+        with self._lock:
+            if self._stored is None:
+                self._stored = entries
+            return self._stored
+
+    def _load(self, path):
+        if not path or not os.path.isfile(path):
+            return {}
+        try:
+            with open(path) as cache_file:
+                entries = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self, key, entry):
+        path = self.path
+        if not path:
+            return
+        with self._file_lock:
+            # Entries written by other runs since this one loaded the file are kept
+            entries = self._load(path)
+            entries[key] = entry
+            try:
+                cache_dir = os.path.dirname(path)
+                os.makedirs(cache_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+                with os.fdopen(fd, "w") as cache_file:
+                    json.dump(entries, cache_file)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                warning("Unable to write layer cache %s: %s" % (path, e))
+
+
+layer_index_cache = LayerIndexCache()
+
+# Shared by every lookup so that they reuse kept-alive connections
+layer_index_session = utils.TimedSession("layers-index")
+
+PLAN_VERSION = 1
+
+# The most resource ARNs the Resource Groups Tagging API accepts per request
+TAG_RESOURCES_BATCH_SIZE = 20
+
+# The managed policies attached to each execution role, keyed by profile and role.
+# IAM is global, so regions that share a role share the lookup.
+attached_role_policies_cache = RunCache()
+# Guards the cached sets, which regions update as they attach and detach policies
+attached_role_policies_lock = threading.Lock()
+
+
+class ChangePlan(object):
+    """
+    The function updates computed by a planning run of layers install or uninstall,
+    to be executed later by layers apply.
+
+    Each change holds the full update_function_configuration arguments, including
+    environment variables such as license keys, so plan files are only readable by
+    their owner.
+    """
+
+    def __init__(self, changes=None):
+        self.changes = list(changes or [])
+        self._lock = threading.Lock()
+
+    def add(self, change):
+        with self._lock:
+            self.changes.append(change)
+
+    def write(self, path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        # O_CREAT's mode only applies to new files
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, "w") as plan_file:
+            json.dump(
+                {"version": PLAN_VERSION, "changes": self.changes}, plan_file, indent=2
+            )
+
+    @classmethod
+    def read(cls, path):
+        try:
+            with open(path) as plan_file:
+                plan = json.load(plan_file)
+        except (OSError, ValueError) as e:
+            raise click.UsageError("Could not read plan %s: %s" % (path, e))
+        if not isinstance(plan, dict) or plan.get("version") != PLAN_VERSION:
+            raise click.UsageError(
+                "Unsupported plan %s, create it again with --plan-out" % path
+            )
+        return cls(plan.get("changes", []))
+
+
+class RolePolicyChanges(object):
+    """
+    The license key policy attachments needed by a region's functions, collected
+    while they are updated so that each execution role is changed once afterwards,
+    however many functions share it.
+    """
+
+    def __init__(self):
+        self.attach = set()
+        self.detach = {}
+        self._lock = threading.Lock()
+
+    def add_attach(self, role_arn, policy_arn):
+        with self._lock:
+            self.attach.add((role_arn, policy_arn))
+
+    def add_detach(self, role_arn, policy_arn, function_arn):
+        with self._lock:
+            self.detach.setdefault((role_arn, policy_arn), set()).add(function_arn)
+
+
+class ResourceTags(object):
+    """
+    The tags to add to a region's functions, collected while they are updated so
+    that they can be written in bulk afterwards
+    """
+
+    def __init__(self):
+        self.tags = {}
+        self._lock = threading.Lock()
+
+    def add(self, function_arn, tags):
+        with self._lock:
+            self.tags.setdefault(function_arn, {}).update(tags)
+
+
+def _fetch_layers(region, runtime):
+    url = "https://%s.layers.newrelic-external.com/get-layers?CompatibleRuntime=%s" % (
+        region,
+        runtime,
     )
-    layers_response = req.json()
+    with timings.operation("get-layers"):
+        req = layer_index_session.get(url)
+    req.raise_for_status()
+    return req.json().get("Layers", [])
+
+
+def index(region, runtime, architecture):
     return [
         layer
-        for layer in layers_response.get("Layers", [])
+        for layer in layer_index_cache.get(region, runtime, _fetch_layers)
         if architecture
         in layer.get("LatestMatchingVersion", {}).get(
             "CompatibleArchitectures", ["x86_64"]
@@ -115,6 +330,7 @@ def _add_new_relic(input, config, nr_license_key):
     assert isinstance(input, LayerInstall)
 
     aws_region = input.session.region_name
+    is_new_relic_layer = utils.new_relic_layer_matcher(aws_region, input.aws_profile)
 
     runtime = config["Configuration"]["Runtime"]
     if runtime not in utils.RUNTIME_CONFIG:
@@ -149,7 +365,7 @@ def _add_new_relic(input, config, nr_license_key):
     existing_newrelic_layer = [
         layer["Arn"]
         for layer in config["Configuration"].get("Layers", [])
-        if layer["Arn"].startswith(utils.get_arn_prefix(aws_region))
+        if is_new_relic_layer(layer["Arn"])
     ]
 
     has_log_flags = any(
@@ -177,7 +393,7 @@ def _add_new_relic(input, config, nr_license_key):
     existing_layers = [
         layer["Arn"]
         for layer in config["Configuration"].get("Layers", [])
-        if not layer["Arn"].startswith(utils.get_arn_prefix(aws_region))
+        if not is_new_relic_layer(layer["Arn"])
     ]
 
     new_relic_layer = []
@@ -186,7 +402,14 @@ def _add_new_relic(input, config, nr_license_key):
         new_relic_layer = input.layer_arn
     else:
         # discover compatible layers...
-        available_layers = index(aws_region, runtime, architecture)
+        try:
+            available_layers = index(aws_region, runtime, architecture)
+        except requests.exceptions.RequestException as e:
+            failure(
+                "Failed to fetch the New Relic layers for %s (%s): %s"
+                % (config["Configuration"]["FunctionArn"], runtime, e)
+            )
+            return False
 
         if "java" in runtime:
             if use_java_agent:
@@ -417,8 +640,91 @@ def _add_new_relic(input, config, nr_license_key):
     return update_kwargs
 
 
+def _call(input, func, **kwargs):
+    """Routes an AWS API call through the run's scheduler, if there is one"""
+    if input.scheduler is not None:
+        return input.scheduler.call(func, **kwargs)
+    return func(**kwargs)
+
+
+def _update_function_configuration(input, client, update_kwargs, revision_id=None):
+    """
+    Applies the update, optionally guarded by the RevisionId of the configuration it
+    was computed from so that changes made since then are not overwritten
+    """
+    if revision_id:
+        return _call(
+            input,
+            client.update_function_configuration,
+            RevisionId=revision_id,
+            **update_kwargs,
+        )
+    return _call(input, client.update_function_configuration, **update_kwargs)
+
+
+def _record(input, outcome, function_arn=None, revision_id=None):
+    if input.summary is not None:
+        input.summary.record(outcome)
+    journal = getattr(input, "journal", None)
+    if journal is None or function_arn is None:
+        return
+    if (
+        input.role_policies is not None
+        or getattr(input, "resource_tags", None) is not None
+    ):
+        # The function isn't finished until its role and tags are updated
+        journal.defer(input.session.region_name, function_arn, outcome, revision_id)
+    else:
+        journal.record(input.session.region_name, function_arn, outcome, revision_id)
+
+
+def _snapshot(configuration):
+    """Captures the parts of a function configuration that an update may change"""
+    return {
+        "Layers": [layer["Arn"] for layer in configuration.get("Layers", [])],
+        "Handler": configuration.get("Handler"),
+        "Environment": dict(configuration.get("Environment", {}).get("Variables", {})),
+    }
+
+
+def _changed_fields(snapshot, update_kwargs):
+    """Returns the fields of ``update_kwargs`` that differ from the snapshot"""
+    changed = []
+    if update_kwargs.get("Layers", snapshot["Layers"]) != snapshot["Layers"]:
+        changed.append("Layers")
+    if update_kwargs.get("Handler", snapshot["Handler"]) != snapshot["Handler"]:
+        changed.append("Handler")
+    variables = update_kwargs.get("Environment", {}).get(
+        "Variables", snapshot["Environment"]
+    )
+    if variables != snapshot["Environment"]:
+        changed.append("Environment")
+    return changed
+
+
+def _is_revision_conflict(e):
+    return e.response.get("Error", {}).get("Code") == "PreconditionFailedException"
+
+
+def _is_stale(input, function_arn, revision_id):
+    """
+    Whether a function configuration served from the inventory is out of date.
+    Inventory entries can be up to --inventory-max-age old, so they can't tell on
+    their own that a function is already up to date.
+    """
+    if input.inventory is None:
+        return False
+    current = get_function(input.session, function_arn)
+    return current is None or current["Configuration"].get("RevisionId") != revision_id
+
+
 @catch_boto_errors
-def install(input, function_arn):
+def install(input, function_arn, config=None):
+    """
+    Installs the New Relic layer on a function. If ``config`` is provided (e.g. from
+    ``list_functions``) it is used instead of calling ``get_function``, falling back
+    to a fresh ``get_function`` if the function changed since it was listed.
+    """
     if input.nr_api_key and input.nr_ingest_key:
         raise click.UsageError(
             "Please provide either the --nr-api-key or the --nr-ingest-key flag, but not both."
@@ -427,11 +733,17 @@ def install(input, function_arn):
 
     client = input.session.client("lambda")
 
-    config = get_function(input.session, function_arn)
+    prefetched = config is not None
+    if not prefetched:
+        config = get_function(input.session, function_arn)
     if not config:
         failure("Could not find function: %s" % function_arn)
         return False
 
+    # _add_new_relic modifies the configuration in place
+    snapshot = _snapshot(config["Configuration"])
+    revision_id = config["Configuration"].get("RevisionId")
+
     _, nr_account_id, policy_arn = _get_license_key_outputs(input.session)
 
     # If a managed secret exists but it was created with a different NR account
@@ -485,19 +797,56 @@ def install(input, function_arn):
 
     update_kwargs = _add_new_relic(input, config, nr_license_key)
     if isinstance(update_kwargs, bool):
+        if update_kwargs:
+            if prefetched and _is_stale(input, function_arn, revision_id):
+                return install(input, function_arn)
+            _record(input, "skipped", function_arn)
         return update_kwargs
 
+    # An unchanged configuration only skips the update call, the role policy, tag
+    # and log subscription steps are still made sure of
+    changed = _changed_fields(snapshot, update_kwargs)
+    if not changed and prefetched and _is_stale(input, function_arn, revision_id):
+        return install(input, function_arn)
+    follow_ups = dict(
+        AttachPolicy=policy_arn if input.enable_extension else None,
+        Tags={"NR.Apm.Lambda.Mode": "true"} if input.apm else None,
+        RemoveLogSubscription=bool(input.enable_extension_function_logs),
+    )
+
+    if input.plan is not None:
+        if not changed and not any(follow_ups.values()):
+            success("Function '%s' is already up to date" % function_arn)
+            _record(input, "skipped", function_arn)
+            return True
+        return _plan(
+            input,
+            config,
+            changed,
+            update_kwargs if changed else None,
+            Action="install",
+            **follow_ups,
+        )
+
     try:
-        res = client.update_function_configuration(**update_kwargs)
+        res = {}
+        if changed:
+            res = _update_function_configuration(
+                input,
+                client,
+                update_kwargs,
+                config["Configuration"].get("RevisionId") if prefetched else None,
+            )
         if input.apm:
-            client.tag_resource(
-                Resource=config["Configuration"]["FunctionArn"],
-                Tags={
-                    "NR.Apm.Lambda.Mode": "true",
-                },
+            _tag_function(
+                input,
+                client,
+                config["Configuration"]["FunctionArn"],
+                {"NR.Apm.Lambda.Mode": "true"},
             )
-            success("Successfully added APM tag to the function")
     except botocore.exceptions.ClientError as e:
+        if prefetched and _is_revision_conflict(e):
+            return install(input, function_arn)
         failure(
             "Failed to update configuration for '%s': %s"
             % (config["Configuration"]["FunctionArn"], e)
@@ -505,13 +854,16 @@ def install(input, function_arn):
         return False
     else:
         if input.enable_extension and policy_arn:
-            _attach_license_key_policy(
-                input.session, config["Configuration"]["Role"], policy_arn
-            )
+            _attach_role_policy(input, config["Configuration"]["Role"], policy_arn)
 
         if input.enable_extension_function_logs:
             subscriptions.remove_log_subscription(input, function_arn)
 
+        if not changed:
+            success("Function '%s' is already up to date" % function_arn)
+            _record(input, "skipped", function_arn)
+            return True
+
         if input.verbose:
             click.echo(json.dumps(res, indent=2))
 
@@ -534,13 +886,16 @@ def install(input, function_arn):
                 "Successfully upgraded Layer ARN %s from version: %s to version: %s for the function: %s"
                 % (new_layer_arn, old_layer_version, new_layer_version, function_arn)
             )
+        _record(input, "updated", function_arn, res.get("RevisionId"))
         return True
 
 
 def _remove_new_relic(input, config):
     assert isinstance(input, LayerUninstall)
 
-    aws_region = input.session.region_name
+    is_new_relic_layer = utils.new_relic_layer_matcher(
+        input.session.region_name, input.aws_profile
+    )
 
     runtime = config["Configuration"]["Runtime"]
     if runtime not in utils.RUNTIME_CONFIG:
@@ -597,7 +952,7 @@ def _remove_new_relic(input, config):
     layers = [
         layer["Arn"]
         for layer in config["Configuration"].get("Layers")
-        if not layer["Arn"].startswith(utils.get_arn_prefix(aws_region))
+        if not is_new_relic_layer(layer["Arn"])
     ]
 
     return {
@@ -609,24 +964,67 @@ def _remove_new_relic(input, config):
 
 
 @catch_boto_errors
-def uninstall(input, function_arn):
+def uninstall(input, function_arn, config=None):
+    """
+    Removes the New Relic layer from a function. As with ``install``, a listed
+    ``config`` may be passed to avoid calling ``get_function``.
+    """
     assert isinstance(input, LayerUninstall)
 
     client = input.session.client("lambda")
 
-    config = get_function(input.session, function_arn)
+    prefetched = config is not None
+    if not prefetched:
+        config = get_function(input.session, function_arn)
     if not config:
         failure("Could not find function: %s" % function_arn)
         return False
 
+    # _remove_new_relic modifies the configuration in place
+    snapshot = _snapshot(config["Configuration"])
+    revision_id = config["Configuration"].get("RevisionId")
+
     update_kwargs = _remove_new_relic(input, config)
 
     if isinstance(update_kwargs, bool):
+        if update_kwargs:
+            if prefetched and _is_stale(input, function_arn, revision_id):
+                return uninstall(input, function_arn)
+            _record(input, "skipped", function_arn)
         return update_kwargs
 
+    # As with install, an unchanged configuration still has the policy detached
+    changed = _changed_fields(snapshot, update_kwargs)
+    if not changed and prefetched and _is_stale(input, function_arn, revision_id):
+        return uninstall(input, function_arn)
+
+    if input.plan is not None:
+        _, _, policy_arn = _get_license_key_outputs(input.session)
+        if not changed and not policy_arn:
+            success("Function '%s' is already up to date" % function_arn)
+            _record(input, "skipped", function_arn)
+            return True
+        return _plan(
+            input,
+            config,
+            changed,
+            update_kwargs if changed else None,
+            Action="uninstall",
+            DetachPolicy=policy_arn,
+        )
+
     try:
-        res = client.update_function_configuration(**update_kwargs)
+        res = {}
+        if changed:
+            res = _update_function_configuration(
+                input,
+                client,
+                update_kwargs,
+                config["Configuration"].get("RevisionId") if prefetched else None,
+            )
     except botocore.exceptions.ClientError as e:
+        if prefetched and _is_revision_conflict(e):
+            return uninstall(input, function_arn)
         failure(
             "Failed to update configuration for '%s': %s"
             % (config["Configuration"]["FunctionArn"], e)
@@ -635,10 +1033,18 @@ def uninstall(input, function_arn):
     else:
         _, _, policy_arn = _get_license_key_outputs(input.session)
         if policy_arn:
-            _detach_license_key_policy(
-                input.session, config["Configuration"]["Role"], policy_arn
+            _detach_role_policy(
+                input,
+                config["Configuration"]["Role"],
+                policy_arn,
+                config["Configuration"]["FunctionArn"],
             )
 
+        if not changed:
+            success("Function '%s' is already up to date" % function_arn)
+            _record(input, "skipped", function_arn)
+            return True
+
         if input.verbose:
             click.echo(json.dumps(res, indent=2))
 
@@ -647,9 +1053,273 @@ def uninstall(input, function_arn):
         success(
             "Successfully uninstalled Layer %s from %s" % (old_layer_arn, function_arn)
         )
+        _record(input, "updated", function_arn, res.get("RevisionId"))
         return True
 
 
+def _plan(input, config, changed, update_kwargs, **change):
+    """Records the update in the run's plan instead of applying it"""
+    function_arn = config["Configuration"]["FunctionArn"]
+    change.update(
+        FunctionArn=function_arn,
+        Region=input.session.region_name,
+        RevisionId=config["Configuration"].get("RevisionId"),
+        Role=config["Configuration"].get("Role"),
+        Changes=changed,
+        Update=update_kwargs,
+    )
+    input.plan.add(change)
+    success(
+        "Planned %s on '%s' (%s)"
+        % (
+            change["Action"],
+            function_arn,
+            ", ".join(changed) or "role policy, tags and log subscription only",
+        )
+    )
+    _record(input, "planned")
+    return True
+
+
+@catch_boto_errors
+def apply(input, change):
+    """
+    Applies a change recorded by a planning run. The update is made conditional on
+    the RevisionId the plan was computed from, so a function that changed since then
+    is left alone.
+    """
+    assert isinstance(input, LayerApply)
+
+    function_arn = change["FunctionArn"]
+    # Changes without an update only carry the role policy, tag and log
+    # subscription steps of a function whose configuration was already up to date
+    if change.get("Update") and not change.get("RevisionId"):
+        failure("No RevisionId planned for '%s', not applying" % function_arn)
+        return False
+
+    client = input.session.client("lambda")
+
+    try:
+        res = {}
+        if change.get("Update"):
+            res = _update_function_configuration(
+                input, client, change["Update"], change["RevisionId"]
+            )
+        if change.get("Tags"):
+            _tag_function(input, client, function_arn, change["Tags"])
+    except botocore.exceptions.ClientError as e:
+        if _is_revision_conflict(e):
+            failure(
+                "Function '%s' changed after the plan was made, not applying. "
+                "Create a new plan to update it." % function_arn
+            )
+        else:
+            failure("Failed to update configuration for '%s': %s" % (function_arn, e))
+        return False
+
+    if change.get("AttachPolicy"):
+        _attach_role_policy(input, change["Role"], change["AttachPolicy"])
+    if change.get("DetachPolicy"):
+        _detach_role_policy(input, change["Role"], change["DetachPolicy"], function_arn)
+    if change.get("RemoveLogSubscription"):
+        subscriptions.remove_log_subscription(input, function_arn)
+
+    if input.verbose:
+        click.echo(json.dumps(res, indent=2))
+
+    success("Applied planned %s on '%s'" % (change["Action"], function_arn))
+    _record(input, "updated")
+    return True
+
+
+def _tag_function(input, client, function_arn, tags):
+    """Tags the function now, or in bulk if the run collects resource tags"""
+    if input.resource_tags is None:
+        _call(input, client.tag_resource, Resource=function_arn, Tags=tags)
+        success("Successfully added APM tag to the function")
+    else:
+        input.resource_tags.add(function_arn, tags)
+
+
+def _tag_resources(input, client, function_arns, tags):
+    """Tags a batch of functions, returning whether each one was tagged"""
+    try:
+        res = _call(
+            input, client.tag_resources, ResourceARNList=function_arns, Tags=tags
+        )
+    except botocore.exceptions.ClientError as e:
+        for function_arn in function_arns:
+            failure("Failed to add APM tag to '%s': %s" % (function_arn, e))
+        return [False] * len(function_arns)
+
+    failed = res.get("FailedResourcesMap", {})
+    results = []
+    for function_arn in function_arns:
+        if function_arn in failed:
+            failure(
+                "Failed to add APM tag to '%s': %s"
+                % (
+                    function_arn,
+                    failed[function_arn].get("ErrorMessage")
+                    or failed[function_arn].get("ErrorCode"),
+                )
+            )
+            results.append(False)
+        else:
+            success("Successfully added APM tag to '%s'" % function_arn)
+            results.append(True)
+    return results
+
+
+@catch_boto_errors
+def update_resource_tags(input):
+    """
+    Writes the tags collected in ``input.resource_tags`` with the Resource Groups
+    Tagging API, which takes up to 20 ARNs per request instead of one
+    """
+    batches = {}
+    for function_arn, tags in sorted(input.resource_tags.tags.items()):
+        batches.setdefault(tuple(sorted(tags.items())), []).append(function_arn)
+
+    client = input.session.client("resourcegroupstaggingapi")
+    with utils.ContextThreadPoolExecutor(max_workers=input.max_concurrency) as executor:
+        futures = [
+            executor.submit(
+                _tag_resources,
+                input,
+                client,
+                function_arns[i : i + TAG_RESOURCES_BATCH_SIZE],
+                dict(tags),
+            )
+            for tags, function_arns in batches.items()
+            for i in range(0, len(function_arns), TAG_RESOURCES_BATCH_SIZE)
+        ]
+        return all(all(future.result()) for future in futures)
+
+
+def _attach_role_policy(input, role_arn, policy_arn):
+    """Attaches the policy now, or once per role if the run collects role changes"""
+    if input.role_policies is None:
+        return _attach_license_key_policy(input.session, role_arn, policy_arn)
+    input.role_policies.add_attach(role_arn, policy_arn)
+    return True
+
+
+def _detach_role_policy(input, role_arn, policy_arn, function_arn):
+    """Detaches the policy now, or once per role if the run collects role changes"""
+    if input.role_policies is None:
+        return _detach_license_key_policy(input.session, role_arn, policy_arn)
+    input.role_policies.add_detach(role_arn, policy_arn, function_arn)
+    return True
+
+
+def _get_attached_role_policies(session, role_arn):
+    """Returns the ARNs of the managed policies attached to the role"""
+
+    def _fetch():
+        _, role_name = role_arn.rsplit("/", 1)
+        pager = session.client("iam").get_paginator("list_attached_role_policies")
+        return {
+            policy["PolicyArn"]
+            for page in pager.paginate(RoleName=role_name)
+            for policy in page.get("AttachedPolicies", [])
+        }
+
+    return attached_role_policies_cache.get(
+        (getattr(session, "profile_name", None), role_arn), _fetch
+    )
+
+
+def _get_instrumented_roles(input, uninstalled):
+    """
+    Returns the execution roles of the functions that still have a New Relic layer,
+    ignoring the functions just uninstalled in case the listing lags behind. IAM roles
+    are global, so the functions of every enabled region are listed, once per run.
+    """
+
+    def _list(region):
+        if region == input.session.region_name:
+            session = input.session
+        else:
+            session = utils.PooledSession(
+                boto3.Session(profile_name=input.aws_profile, region_name=region)
+            )
+        return {
+            function["Role"]
+            for function in list_functions(session, "installed")
+            if function["FunctionArn"] not in uninstalled
+        }
+
+    regions = utils.enabled_regions(input.session)
+    with utils.ContextThreadPoolExecutor(max_workers=input.max_concurrency) as executor:
+        return set().union(*executor.map(_list, regions))
+
+
+@catch_boto_errors
+def update_role_policies(input):
+    """
+    Attaches and detaches the license key policy collected in ``input.role_policies``,
+    once per execution role. Roles that already have (or don't have) the policy are
+    left alone, and a policy is only detached from a role once no instrumented
+    function in any enabled region uses it, so detaches are collected for the whole
+    run and made after every region is done.
+    """
+    changes = input.role_policies
+    results = []
+
+    for role_arn, policy_arn in sorted(changes.attach):
+        try:
+            attached = _get_attached_role_policies(input.session, role_arn)
+        except botocore.exceptions.ClientError as e:
+            failure("Failed to list policies of %s: %s" % (role_arn, e))
+            results.append(False)
+            continue
+        with attached_role_policies_lock:
+            if policy_arn in attached:
+                continue
+        if _attach_license_key_policy(input.session, role_arn, policy_arn):
+            with attached_role_policies_lock:
+                attached.add(policy_arn)
+            results.append(True)
+        else:
+            results.append(False)
+
+    if changes.detach:
+        uninstalled = set().union(*changes.detach.values())
+        try:
+            in_use = _get_instrumented_roles(input, uninstalled)
+        except botocore.exceptions.ClientError as e:
+            failure(
+                "Keeping the license key policy on every execution role, could not "
+                "list the instrumented functions: %s" % e
+            )
+            return False
+        for role_arn, policy_arn in sorted(changes.detach):
+            if role_arn in in_use:
+                click.echo(
+                    "Keeping %s policy on %s, it is used by other instrumented "
+                    "functions" % (policy_arn, role_arn)
+                )
+                continue
+            try:
+                attached = _get_attached_role_policies(input.session, role_arn)
+            except botocore.exceptions.ClientError as e:
+                failure("Failed to list policies of %s: %s" % (role_arn, e))
+                results.append(False)
+                continue
+            with attached_role_policies_lock:
+                if policy_arn not in attached:
+                    continue
+            if _detach_license_key_policy(input.session, role_arn, policy_arn):
+                with attached_role_policies_lock:
+                    attached.discard(policy_arn)
+                results.append(True)
+            else:
+                results.append(False)
+
+    return all(results)
+
+
 def _attach_license_key_policy(session, role_arn, policy_arn):
     """Attaches the license key secret policy to the specified role"""
     _, role_name = role_arn.rsplit("/", 1)
@@ -157,10 +157,15 @@ def ensure_layer_install_permissions(input):
     :param input: A LayerInstall instance
     """
     assert isinstance(input, LayerInstall)
-    needed_permissions = check_permissions(
-        input.session,
-        actions=["lambda:GetFunction", "lambda:UpdateFunctionConfiguration"],
-    )
+    actions = ["lambda:GetFunction", "lambda:UpdateFunctionConfiguration"]
+    if input.enable_extension:
+        actions.append("iam:ListAttachedRolePolicies")
+    if input.apm:
+        # The Tagging API also needs the permission of the service it tags through
+        actions.extend(["lambda:TagResource", "tag:TagResources"])
+    if input.function_tags:
+        actions.append("tag:GetResources")
+    needed_permissions = check_permissions(input.session, actions=actions)
 
     if needed_permissions:
         message = [
@@ -183,11 +188,23 @@ def ensure_layer_uninstall_permissions(input):
 
     :param input: A LayerUninstall instance
     """
+    from newrelic_lambda_cli.integrations import _get_license_key_outputs
+
     assert isinstance(input, LayerUninstall)
-    needed_permissions = check_permissions(
-        input.session,
-        actions=["lambda:GetFunction", "lambda:UpdateFunctionConfiguration"],
-    )
+    actions = ["lambda:GetFunction", "lambda:UpdateFunctionConfiguration"]
+    _, _, policy_arn = _get_license_key_outputs(input.session)
+    if policy_arn:
+        # To detach the license key policy from roles no instrumented function uses
+        actions.extend(
+            [
+                "ec2:DescribeRegions",
+                "iam:ListAttachedRolePolicies",
+                "lambda:ListFunctions",
+            ]
+        )
+    if input.function_tags:
+        actions.append("tag:GetResources")
+    needed_permissions = check_permissions(input.session, actions=actions)
 
     if needed_permissions:
         message = [
@@ -224,15 +241,18 @@ def ensure_subscription_install_permissions(input):
     :param input: A SubscriptionInstall instance
     """
     assert isinstance(input, SubscriptionInstall)
-    needed_permissions = check_permissions(
-        input.session,
-        actions=[
-            "lambda:GetFunction",
-            "logs:DeleteSubscriptionFilter",
-            "logs:DescribeSubscriptionFilters",
-            "logs:PutSubscriptionFilter",
-        ],
-    )
+    actions = [
+        "lambda:GetFunction",
+        "logs:DeleteSubscriptionFilter",
+        "logs:DescribeLogGroups",
+        "logs:DescribeSubscriptionFilters",
+        "logs:PutSubscriptionFilter",
+    ]
+    if input.account_policy:
+        actions.extend(["logs:DescribeAccountPolicies", "logs:PutAccountPolicy"])
+    if input.function_tags:
+        actions.append("tag:GetResources")
+    needed_permissions = check_permissions(input.session, actions=actions)
     if needed_permissions:
         message = [
             "The following AWS permissions are needed to install the New Relic log "
@@ -252,10 +272,16 @@ def ensure_subscription_uninstall_permissions(input):
     :param input: A SubscriptionUninstall instance
     """
     assert isinstance(input, SubscriptionUninstall)
-    needed_permissions = check_permissions(
-        input.session,
-        actions=["logs:DeleteSubscriptionFilter", "logs:DescribeSubscriptionFilters"],
-    )
+    actions = [
+        "logs:DeleteSubscriptionFilter",
+        "logs:DescribeLogGroups",
+        "logs:DescribeSubscriptionFilters",
+    ]
+    if input.account_policy:
+        actions.append("logs:DeleteAccountPolicy")
+    if input.function_tags:
+        actions.append("tag:GetResources")
+    needed_permissions = check_permissions(input.session, actions=actions)
     if needed_permissions:
         message = [
             "The following AWS permissions are needed to uninstall the New Relic log "
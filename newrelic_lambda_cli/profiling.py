@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+class DeterministicProfiler(object):
+    """
+    Profiles every thread with cProfile and writes the merged stats in the pstats
+    format read by snakeviz, ``python -m pstats`` and gprof2dot.
+
+    Before Python 3.12 cProfile only sees the thread that enabled it, so each thread
+    started while profiling (e.g. ThreadPoolExecutor workers) enables a profiler of
+    its own on its first profiling event. From 3.12 cProfile uses sys.monitoring,
+    which already covers every thread.
+    """
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def _new_profile(self):
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def _start_thread(self, frame, event, arg):
+        # Replaces itself with the thread's own profiler
+        self._new_profile().enable()
+
+    def start(self):
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._start_thread)
+        self._new_profile().enable()
+
+    def stop(self, path):
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        main, workers = self._profiles[0], self._profiles[1:]
+        main.disable()
+        stats = pstats.Stats(main)
+        for profile in workers:
+            # Worker threads have exited by now, leaving their stats behind
+            stats.add(profile)
+        stats.dump_stats(path)
+
+
+class SamplingProfiler(object):
+    """
+    Samples the stacks of every thread from a background thread with
+    ``sys._current_frames`` and writes them in speedscope's file format, as one
+    profile per thread.
+
+    Unlike cProfile it doesn't hook every call, and it shows where the threads wait
+    on AWS and New Relic APIs as well as where they use the CPU. It isn't free
+    though: every interval (5ms by default) the sampler thread takes the GIL and
+    walks every thread's stack, which slows CPU-bound work down a little.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._frames = {}
+        self._threads = {}
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started = None
+
+    def _frame_index(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frames)
+        return index
+
+    def _sample(self, elapsed):
+        sampler = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == sampler:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            thread = self._threads.get(ident)
+            if thread is None:
+                thread = self._threads[ident] = {
+                    "name": names.get(ident, "Thread %d" % ident),
+                    "start": max(elapsed - self.interval, 0.0),
+                    "samples": [],
+                    "weights": [],
+                    "last": elapsed,
+                }
+            thread["samples"].append(stack)
+            thread["weights"].append(max(elapsed - thread["last"], self.interval))
+            thread["last"] = elapsed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample(time.perf_counter() - self._started)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(
+            target=self._run, name="newrelic-lambda-profiler", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self, path):
+        self._stop.set()
+        self._sampler.join()
+        with open(path, "w") as profile_file:
+            json.dump(self.to_speedscope(), profile_file)
+
+    def to_speedscope(self):
+        frames = [None] * len(self._frames)
+        for (name, filename, line), index in self._frames.items():
+            frames[index] = {"name": name, "file": filename, "line": line}
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "exporter": "newrelic-lambda-cli",
+            "name": "newrelic-lambda",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread["name"],
+                    "unit": "seconds",
+                    "startValue": thread["start"],
+                    "endValue": thread["last"],
+                    "samples": thread["samples"],
+                    "weights": thread["weights"],
+                }
+                for thread in self._threads.values()
+            ],
+        }
+
+
+def start(path):
+    """
+    Starts profiling the rest of the run, returning the profiler to stop. Files
+    ending in ``.json`` are written in speedscope's format by a sampling profiler,
+    anything else as cProfile stats.
+    """
+    if path.endswith(".json"):
+        profiler = SamplingProfiler()
+    else:
+        profiler = DeterministicProfiler()
+    profiler.start()
+    return profiler
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+import math
+import random
+import threading
+import time
+
+import botocore
+
+from newrelic_lambda_cli.utils import DEFAULT_MAX_WORKERS
+
+THROTTLE_ERROR_CODES = (
+    "RequestLimitExceeded",
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequestsException",
+)
+# A function with an update in progress rejects further updates until it settles
+RETRYABLE_ERROR_CODES = THROTTLE_ERROR_CODES + ("ResourceConflictException",)
+
+
+class AdaptiveScheduler(object):
+    """
+    Gates AWS API calls made by worker threads, adapting the number of calls in
+    flight to the throttling AWS reports.
+
+    Concurrency grows additively by one call per ``limit`` successful calls and is
+    halved whenever a call fails with a throttling error code (AIMD). Throttled and
+    conflicting calls are retried with jittered exponential backoff. An optional
+    ``rate_limit`` caps the number of calls started per second.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=DEFAULT_MAX_WORKERS,
+        rate_limit=None,
+        max_attempts=8,
+        base_delay=0.5,
+        max_delay=20.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_limit = rate_limit
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limit = float(self.max_concurrency)
+        self.calls = 0
+        self.throttles = 0
+        self.retries = 0
+        self._in_flight = 0
+        self._next_start = 0.0
+        self._last_decrease = 0.0
+        self._started = None
+        self._finished = None
+        self._cond = threading.Condition()
+
+    def call(self, func, *args, **kwargs):
+        """Calls ``func`` once a slot is available, retrying throttled calls"""
+        attempt = 1
+        while True:
+            self._acquire()
+            try:
+                result = func(*args, **kwargs)
+            except botocore.exceptions.ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                self._release(throttled=code in THROTTLE_ERROR_CODES)
+                if code not in RETRYABLE_ERROR_CODES or attempt >= self.max_attempts:
+                    raise
+            else:
+                self._release()
+                return result
+
+            with self._cond:
+                self.retries += 1
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+            self.calls += 1
+            now = time.monotonic()
+            if self._started is None:
+                self._started = now
+            delay = 0.0
+            if self.rate_limit:
+                start = max(now, self._next_start)
+                self._next_start = start + 1.0 / self.rate_limit
+                delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def _release(self, throttled=False):
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            self._finished = now
+            if throttled:
+                self.throttles += 1
+                # Only back off once per second, a burst of throttles from calls
+                # that were already in flight shouldn't collapse concurrency to one
+                if now - self._last_decrease >= 1.0:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(
+                    float(self.max_concurrency), self.limit + 1.0 / self.limit
+                )
+            self._cond.notify_all()
+
+    @property
+    def calls_per_second(self):
+        if self._started is None or not self._finished:
+            return 0.0
+        elapsed = self._finished - self._started
+        return self.calls / elapsed if elapsed > 0 else float(self.calls)
+
+    def summary(self):
+        return "%d API calls (%.1f calls/sec), %d throttled, %d retried" % (
+            self.calls,
+            self.calls_per_second,
+            self.throttles,
+            self.retries,
+        )
+
+
+def parse_waves(value):
+    """
+    Parses a rollout like ``1%,10%,50%,100%`` into the cumulative fraction of
+    functions updated by the end of each wave. A final 100% wave is implied.
+    """
+    waves = []
+    for wave in value.split(","):
+        wave = wave.strip().rstrip("%")
+        try:
+            percent = float(wave)
+        except ValueError:
+            raise ValueError("Expected a percentage, got '%s'" % wave)
+        if not 0 < percent <= 100:
+            raise ValueError("Wave percentages must be above 0 and at most 100")
+        if waves and percent <= waves[-1] * 100:
+            raise ValueError("Wave percentages must increase")
+        waves.append(percent / 100)
+    if waves[-1] < 1:
+        waves.append(1.0)
+    return tuple(waves)
+
+
+def split_waves(items, waves):
+    """
+    Splits the items into batches, one per wave, in sorted order so that reruns
+    update the same functions first. Each wave gets at least one item while any
+    remain, so a small fleet still starts with a single canary.
+    """
+    items = sorted(items)
+    batches = []
+    start = 0
+    for fraction in waves:
+        end = min(len(items), max(start + 1, math.ceil(len(items) * fraction)))
+        if end > start:
+            batches.append(items[start:end])
+        start = end
+    return batches
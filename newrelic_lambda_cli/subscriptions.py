@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import json
+
 import botocore
 import click
 
@@ -9,11 +11,17 @@ from newrelic_lambda_cli.integrations import get_unique_newrelic_log_ingestion_n
 from newrelic_lambda_cli.integrations import get_newrelic_log_ingestion_function
 from newrelic_lambda_cli.otel_ingestions import get_newrelic_otel_log_ingestion_function
 from newrelic_lambda_cli.types import (
+    LayerApply,
     LayerInstall,
     SubscriptionInstall,
     SubscriptionUninstall,
 )
-from newrelic_lambda_cli.utils import catch_boto_errors
+from newrelic_lambda_cli.utils import catch_boto_errors, unique
+
+ACCOUNT_POLICY_TYPE = "SUBSCRIPTION_FILTER_POLICY"
+# The longest selection criteria CloudWatch Logs accepts, in UTF-8 bytes
+ACCOUNT_POLICY_SELECTION_CRITERIA_MAX_BYTES = 25000
+LAMBDA_LOG_GROUP_PREFIX = "/aws/lambda/"
 
 
 def _get_log_group_name(function_name):
@@ -25,6 +33,38 @@ def _get_log_group_name(function_name):
     return "/aws/lambda/%s" % function_name
 
 
+@catch_boto_errors
+def get_log_group_index(session, max_calls=None):
+    """
+    Returns the names of every Lambda log group in the session's region, or None if
+    they can't be listed. Functions that have never logged have no log group, so
+    checking this first saves a describe_subscription_filters call for each of them.
+
+    Listing takes a call per page of log groups, so once it takes more than
+    ``max_calls`` it gives up, returning None.
+    """
+    paginator = session.client("logs").get_paginator("describe_log_groups")
+    log_groups = set()
+    try:
+        for calls, page in enumerate(
+            paginator.paginate(logGroupNamePrefix=LAMBDA_LOG_GROUP_PREFIX), 1
+        ):
+            if max_calls is not None and calls > max_calls:
+                return None
+            log_groups.update(
+                log_group["logGroupName"] for log_group in page.get("logGroups", [])
+            )
+    except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError):
+        # Not fatal, fall back to looking up each function's log group
+        return None
+    return log_groups
+
+
+def _has_log_group(log_groups, function_name):
+    """Whether the function's log group exists, per the index if there is one"""
+    return log_groups is None or _get_log_group_name(function_name) in log_groups
+
+
 def _get_subscription_filters(session, function_name):
     """Returns all the log subscription filters for the function"""
     log_group_name = _get_log_group_name(function_name)
@@ -87,9 +127,60 @@ def _remove_subscription_filter(session, function_name, filter_name):
         return True
 
 
+def _get_account_policy_name(otel):
+    return "NewRelicOtelLogStreaming" if otel else "NewRelicLogStreaming"
+
+
+def get_account_policy_excluded_log_groups(destination_arn, excludes):
+    """
+    Returns the log groups the account subscription filter policy leaves out: the log
+    ingestion function's own (which would otherwise stream its logs back to itself)
+    and any excluded functions'.
+    """
+    return unique(
+        [_get_log_group_name(destination_arn)]
+        + [_get_log_group_name(exclude) for exclude in excludes or ()]
+    )
+
+
+def _get_account_policy_selection_criteria(destination_arn, excludes):
+    """
+    Builds the selection criteria for the account subscription filter policy.
+    CloudWatch Logs only supports an exclusion list here, so the policy covers every
+    log group in the region, not only Lambda functions', except the excluded ones.
+    """
+    return "LogGroupName NOT IN %s" % json.dumps(
+        get_account_policy_excluded_log_groups(destination_arn, excludes)
+    )
+
+
+def _missing_log_group_message(function_name):
+    return (
+        "Log group %s does not exist. It is created the first time '%s' is invoked."
+        % (_get_log_group_name(function_name), function_name)
+    )
+
+
 @catch_boto_errors
-def create_log_subscription(input, function_name):
+def get_log_destination_arn(input):
+    """
+    Returns the ARN of the log ingestion function that subscriptions should stream to,
+    or None if it isn't installed. The destination is the same for every function in
+    a region, so resolve it once and pass it to workers as ``input.destination_arn``.
+    """
     assert isinstance(input, SubscriptionInstall)
+    if input.otel:
+        destination = get_newrelic_otel_log_ingestion_function(
+            input.session, input.stackname
+        )
+        if destination is None:
+            failure(
+                "Could not find newrelic-otel-log-ingestion function. Is the New Relic "
+                "AWS integration installed?"
+            )
+            return None
+        return destination["Configuration"]["FunctionArn"]
+
     function = get_function(input.session, "newrelic-log-ingestion")
     if function:
         warning(
@@ -103,8 +194,21 @@ def create_log_subscription(input, function_name):
             "Could not find newrelic-log-ingestion function in stack: %s. Is the New Relic AWS "
             "integration installed?" % input.stackname
         )
+        return None
+    return destination["Configuration"]["FunctionArn"]
+
+
+@catch_boto_errors
+def create_log_subscription(input, function_name):
+    assert isinstance(input, SubscriptionInstall)
+    destination_arn = input.destination_arn or get_log_destination_arn(
+        input._replace(otel=False)
+    )
+    if destination_arn is None:
+        return False
+    if not _has_log_group(input.log_groups, function_name):
+        failure(_missing_log_group_message(function_name))
         return False
-    destination_arn = destination["Configuration"]["FunctionArn"]
     subscription_filters = _get_subscription_filters(input.session, function_name)
     if subscription_filters is None:
         return False
@@ -137,10 +241,13 @@ def create_log_subscription(input, function_name):
             newrelic_filter["filterPattern"] != input.filter_pattern
             or newrelic_filter["destinationArn"] != destination_arn
         ):
-            return _remove_subscription_filter(
-                input.session, function_name, newrelic_filter["filterName"]
-            ) and _create_subscription_filter(
-                input.session, function_name, destination_arn, input.filter_pattern
+            # Putting a filter with the same name replaces it in place
+            return _create_subscription_filter(
+                input.session,
+                function_name,
+                destination_arn,
+                input.filter_pattern,
+                newrelic_filter["filterName"],
             )
         return True
 
@@ -149,16 +256,14 @@ def create_log_subscription(input, function_name):
 def create_otel_log_subscription(input, function_name):
     assert isinstance(input, SubscriptionInstall)
 
-    destination = get_newrelic_otel_log_ingestion_function(
-        input.session, input.stackname
+    destination_arn = input.destination_arn or get_log_destination_arn(
+        input._replace(otel=True)
     )
-    if destination is None:
-        failure(
-            "Could not find newrelic-otel-log-ingestion function. Is the New Relic AWS "
-            "integration installed?"
-        )
+    if destination_arn is None:
+        return False
+    if not _has_log_group(input.log_groups, function_name):
+        failure(_missing_log_group_message(function_name))
         return False
-    destination_arn = destination["Configuration"]["FunctionArn"]
 
     subscription_filters = _get_subscription_filters(input.session, function_name)
     if subscription_filters is None:
@@ -196,22 +301,144 @@ def create_otel_log_subscription(input, function_name):
             newrelic_filter["filterPattern"] != input.filter_pattern
             or newrelic_filter["destinationArn"] != destination_arn
         ):
-            return _remove_subscription_filter(
-                input.session, function_name, newrelic_filter["filterName"]
-            ) and _create_subscription_filter(
+            # Putting a filter with the same name replaces it in place
+            return _create_subscription_filter(
                 input.session,
                 function_name,
                 destination_arn,
                 input.filter_pattern,
-                "NewRelicOtelLogStreaming",
+                newrelic_filter["filterName"],
             )
         return True
 
 
+@catch_boto_errors
+def create_account_policy(input):
+    """
+    Installs the account level subscription filter policy, which streams every log
+    group in the region, Lambda or not, to the log ingestion function with a single
+    API call.
+    """
+    assert isinstance(input, SubscriptionInstall)
+    destination_arn = input.destination_arn or get_log_destination_arn(input)
+    if destination_arn is None:
+        return False
+    policy_name = _get_account_policy_name(input.otel)
+    selection_criteria = _get_account_policy_selection_criteria(
+        destination_arn, input.excludes
+    )
+    if (
+        len(selection_criteria.encode("utf-8"))
+        > ACCOUNT_POLICY_SELECTION_CRITERIA_MAX_BYTES
+    ):
+        failure(
+            "Too many --exclude functions for account subscription filter policy "
+            "'%s', CloudWatch Logs accepts selection criteria of up to %d bytes"
+            % (policy_name, ACCOUNT_POLICY_SELECTION_CRITERIA_MAX_BYTES)
+        )
+        return False
+    click.echo("Adding New Relic account subscription filter policy '%s'" % policy_name)
+    try:
+        input.session.client("logs").put_account_policy(
+            policyName=policy_name,
+            policyDocument=json.dumps(
+                # Distribution only applies to Kinesis destinations
+                {
+                    "DestinationArn": destination_arn,
+                    "FilterPattern": input.filter_pattern,
+                }
+            ),
+            policyType=ACCOUNT_POLICY_TYPE,
+            scope="ALL",
+            selectionCriteria=selection_criteria,
+        )
+    except botocore.exceptions.ClientError as e:
+        failure(
+            "Error creating account subscription filter policy '%s': %s"
+            % (policy_name, e)
+        )
+        return False
+    else:
+        success(
+            "Successfully installed account subscription filter policy '%s'"
+            % policy_name
+        )
+        return True
+
+
+@catch_boto_errors
+def verify_account_policy(input):
+    """
+    Confirms that the account subscription filter policy is in place with the
+    expected destination and filter pattern, before the per-function filters it
+    replaces are removed
+    """
+    assert isinstance(input, SubscriptionInstall)
+    policy_name = _get_account_policy_name(input.otel)
+    policies = (
+        input.session.client("logs")
+        .describe_account_policies(
+            policyType=ACCOUNT_POLICY_TYPE, policyName=policy_name
+        )
+        .get("accountPolicies", [])
+    )
+    for policy in policies:
+        try:
+            document = json.loads(policy.get("policyDocument") or "{}")
+        except ValueError:
+            continue
+        if (
+            policy.get("policyName") == policy_name
+            and document.get("DestinationArn") == input.destination_arn
+            and document.get("FilterPattern") == input.filter_pattern
+        ):
+            return True
+    failure(
+        "Could not confirm the account subscription filter policy '%s', keeping the "
+        "per-function log subscriptions" % policy_name
+    )
+    return False
+
+
+@catch_boto_errors
+def remove_account_policy(input):
+    assert isinstance(input, SubscriptionUninstall)
+    policy_name = _get_account_policy_name(input.otel)
+    click.echo(
+        "Removing New Relic account subscription filter policy '%s'" % policy_name
+    )
+    try:
+        input.session.client("logs").delete_account_policy(
+            policyName=policy_name, policyType=ACCOUNT_POLICY_TYPE
+        )
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] == "ResourceNotFoundException":
+            click.echo(
+                "No New Relic account subscription filter policy found, skipping"
+            )
+            return True
+        failure(
+            "Error removing account subscription filter policy '%s': %s"
+            % (policy_name, e)
+        )
+        return False
+    else:
+        success(
+            "Successfully uninstalled account subscription filter policy '%s'"
+            % policy_name
+        )
+        return True
+
+
 @catch_boto_errors
 def remove_log_subscription(input, function_name):
-    assert isinstance(input, (LayerInstall, SubscriptionUninstall))
-    subscription_filters = _get_subscription_filters(input.session, function_name)
+    assert isinstance(
+        input, (LayerApply, LayerInstall, SubscriptionInstall, SubscriptionUninstall)
+    )
+    if _has_log_group(getattr(input, "log_groups", None), function_name):
+        subscription_filters = _get_subscription_filters(input.session, function_name)
+    else:
+        subscription_filters = []
     if subscription_filters is None:
         return False
     newrelic_filters = [
@@ -233,8 +460,11 @@ def remove_log_subscription(input, function_name):
 
 @catch_boto_errors
 def remove_otel_log_subscription(input, function_name):
-    assert isinstance(input, (SubscriptionUninstall))
-    subscription_filters = _get_subscription_filters(input.session, function_name)
+    assert isinstance(input, (SubscriptionInstall, SubscriptionUninstall))
+    if _has_log_group(input.log_groups, function_name):
+        subscription_filters = _get_subscription_filters(input.session, function_name)
+    else:
+        subscription_filters = []
     if subscription_filters is None:
         return False
     newrelic_filters = [
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import contextlib
+import contextvars
+import json
+import threading
+import time
+
+import click
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BOUNDS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+THROTTLE_STATUS_CODE = 429
+
+# The run's call timings, None unless enabled with --timings. Callers check it
+# before timing anything, so that disabled timings cost a single lookup per call.
+recorder = None
+
+# The name HTTP requests are timed under, set with ``operation``
+current_operation = contextvars.ContextVar("current_operation", default=None)
+
+
+class OperationTimings(object):
+    """The calls made to a single operation"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def add(self, seconds, retries=0, error=False):
+        self.calls += 1
+        self.retries += retries
+        self.errors += bool(error)
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.histogram[bisect.bisect_left(HISTOGRAM_BOUNDS, seconds * 1000)] += 1
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound in milliseconds of the histogram bucket holding the
+        percentile, or the maximum latency for the last bucket
+        """
+        rank = fraction * self.calls
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BOUNDS, self.histogram):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max * 1000)
+        return self.max * 1000
+
+    def to_dict(self):
+        buckets = ["<=%dms" % bound for bound in HISTOGRAM_BOUNDS]
+        buckets.append(">%dms" % HISTOGRAM_BOUNDS[-1])
+        return {
+            "Calls": self.calls,
+            "Errors": self.errors,
+            "Retries": self.retries,
+            "Throttles": self.throttles,
+            "TotalSeconds": round(self.total, 6),
+            "MaxSeconds": round(self.max, 6),
+            "Histogram": dict(zip(buckets, self.histogram)),
+        }
+
+
+class CallTimings(object):
+    """
+    Counts, latencies, retries and throttles of the remote calls made in a run, by
+    service and operation.
+
+    AWS calls are timed through botocore's event system, from ``before-call`` to
+    ``after-call``, which includes botocore's own retries. The handlers are
+    registered on each PooledSession. The New Relic layer index and NerdGraph
+    requests are timed by their ``utils.TimedSession``.
+    """
+
+    def __init__(self):
+        from newrelic_lambda_cli.scheduler import THROTTLE_ERROR_CODES
+
+        self.throttle_error_codes = THROTTLE_ERROR_CODES
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def _operation(self, service, operation):
+        key = (service, operation)
+        timings = self.operations.get(key)
+        if timings is None:
+            timings = self.operations.setdefault(key, OperationTimings())
+        return timings
+
+    def record(self, service, operation, seconds, retries=0, error=False):
+        with self._lock:
+            self._operation(service, operation).add(seconds, retries, error)
+
+    def record_throttle(self, service, operation):
+        with self._lock:
+            self._operation(service, operation).throttles += 1
+
+    def time(self, service, operation, func, *args, **kwargs):
+        """Calls ``func``, recording its latency under the service and operation"""
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if getattr(e, "code", None) == THROTTLE_STATUS_CODE:
+                self.record_throttle(service, operation)
+            self.record(service, operation, time.perf_counter() - started, error=True)
+            raise
+        status_code = getattr(result, "status_code", None)
+        if status_code == THROTTLE_STATUS_CODE:
+            self.record_throttle(service, operation)
+        self.record(
+            service,
+            operation,
+            time.perf_counter() - started,
+            error=status_code is not None and status_code >= 400,
+        )
+        return result
+
+    # botocore event handlers
+
+    def _before_call(self, model, context, **kwargs):
+        context["x-new-relic-started"] = time.perf_counter()
+        context["x-new-relic-model"] = model
+
+    def _after_call(self, parsed, model, context, **kwargs):
+        started = context.get("x-new-relic-started")
+        if started is None:
+            return
+        self.record(
+            model.service_model.service_id.hyphenize(),
+            model.name,
+            time.perf_counter() - started,
+            retries=parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+            error="Error" in parsed,
+        )
+
+    def _after_call_error(self, context, **kwargs):
+        started = context.get("x-new-relic-started")
+        model = context.get("x-new-relic-model")
+        if started is None or model is None:
+            return
+        self.record(
+            model.service_model.service_id.hyphenize(),
+            model.name,
+            time.perf_counter() - started,
+            error=True,
+        )
+
+    def _needs_retry(self, response=None, operation=None, **kwargs):
+        # Called for every attempt, so throttled attempts that botocore retried
+        # are counted too
+        if response is None or operation is None:
+            return
+        code = response[1].get("Error", {}).get("Code")
+        if code in self.throttle_error_codes:
+            self.record_throttle(
+                operation.service_model.service_id.hyphenize(), operation.name
+            )
+
+    def handlers(self):
+        return [
+            ("before-call", self._before_call),
+            ("after-call", self._after_call),
+            ("after-call-error", self._after_call_error),
+            ("needs-retry", self._needs_retry),
+        ]
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "Operations": [
+                    dict(Service=service, Operation=operation, **timings.to_dict())
+                    for (service, operation), timings in sorted(self.operations.items())
+                ]
+            }
+
+    def table(self):
+        """Formats the timings as a table, slowest operations in total first"""
+        rows = [
+            (
+                "%s.%s" % (service, operation),
+                str(timings.calls),
+                str(timings.errors),
+                str(timings.retries),
+                str(timings.throttles),
+                "%.2f" % timings.total,
+                "%.0f" % (1000 * timings.total / max(timings.calls, 1)),
+                "%.0f" % timings.percentile(0.5),
+                "%.0f" % timings.percentile(0.95),
+                "%.0f" % (1000 * timings.max),
+            )
+            for (service, operation), timings in sorted(
+                self.operations.items(), key=lambda item: -item[1].total
+            )
+        ]
+        header = (
+            "Operation",
+            "Calls",
+            "Errors",
+            "Retries",
+            "Throttled",
+            "Total s",
+            "Mean ms",
+            "p50 ms",
+            "p95 ms",
+            "Max ms",
+        )
+        widths = [max(len(row[i]) for row in [header] + rows) for i in range(10)]
+        return "\n".join(
+            "  ".join(
+                value.ljust(width) if i == 0 else value.rjust(width)
+                for i, (value, width) in enumerate(zip(row, widths))
+            )
+            for row in [header] + rows
+        )
+
+
+@contextlib.contextmanager
+def operation(name):
+    """Times the HTTP requests made in the block under ``name``"""
+    token = current_operation.set(name)
+    try:
+        yield
+    finally:
+        current_operation.reset(token)
+
+
+def register(session):
+    """Times the AWS calls of clients the boto3 session creates afterwards"""
+    if recorder is not None:
+        for event_name, handler in recorder.handlers():
+            session.events.register(event_name, handler)
+
+
+def enable():
+    """
+    Starts recording call timings. AWS calls are timed for the PooledSessions made
+    afterwards, and HTTP requests for every TimedSession.
+    """
+    global recorder
+
+    if recorder is None:
+        recorder = CallTimings()
+    return recorder
+
+
+def disable():
+    global recorder
+    recorder = None
+
+
+def report(path=None):
+    """Prints the recorded timings, or writes them to ``path`` as JSON"""
+    if recorder is None:
+        return
+    if path:
+        with open(path, "w") as timings_file:
+            json.dump(recorder.to_dict(), timings_file, indent=2)
+    elif recorder.operations:
+        click.echo("\nCall timings:\n%s" % recorder.table(), err=True)
+    else:
+        click.echo("\nNo remote calls were made", err=True)
@@ -103,6 +103,19 @@ LAYER_INSTALL_KEYS = [
     "aws_permissions_check",
     "functions",
     "excludes",
+    "function_tags",
+    "function_tag_mode",
+    "function_patterns",
+    "exclude_patterns",
+    "runtimes",
+    "architectures",
+    "shard",
+    "use_inventory",
+    "inventory_max_age",
+    "inventory",
+    "journal_path",
+    "resume",
+    "journal",
     "layer_arn",
     "upgrade",
     "apm",
@@ -123,6 +136,19 @@ LAYER_INSTALL_KEYS = [
     "slim",
     "extension_logs_enabled",
     "app_name",
+    "layer_cache_ttl",
+    "refresh_layer_cache",
+    "max_concurrency",
+    "rate_limit",
+    "waves",
+    "wave_soak",
+    "wave_max_failure_rate",
+    "scheduler",
+    "summary",
+    "plan_out",
+    "plan",
+    "role_policies",
+    "resource_tags",
 ]
 
 LAYER_UNINSTALL_KEYS = [
@@ -133,6 +159,40 @@ LAYER_UNINSTALL_KEYS = [
     "aws_permissions_check",
     "functions",
     "excludes",
+    "function_tags",
+    "function_tag_mode",
+    "function_patterns",
+    "exclude_patterns",
+    "runtimes",
+    "architectures",
+    "shard",
+    "use_inventory",
+    "inventory_max_age",
+    "inventory",
+    "journal_path",
+    "resume",
+    "journal",
+    "max_concurrency",
+    "rate_limit",
+    "scheduler",
+    "summary",
+    "plan_out",
+    "plan",
+    "role_policies",
+]
+
+LAYER_APPLY_KEYS = [
+    "session",
+    "verbose",
+    "aws_profile",
+    "aws_region",
+    "plan_file",
+    "max_concurrency",
+    "rate_limit",
+    "scheduler",
+    "summary",
+    "role_policies",
+    "resource_tags",
 ]
 
 SUBSCRIPTION_INSTALL_KEYS = [
@@ -143,8 +203,25 @@ SUBSCRIPTION_INSTALL_KEYS = [
     "functions",
     "stackname",
     "excludes",
+    "function_tags",
+    "function_tag_mode",
+    "function_patterns",
+    "exclude_patterns",
+    "runtimes",
+    "architectures",
+    "shard",
+    "use_inventory",
+    "inventory_max_age",
+    "inventory",
+    "journal_path",
+    "resume",
+    "journal",
     "filter_pattern",
     "otel",
+    "destination_arn",
+    "account_policy",
+    "all_log_groups",
+    "log_groups",
 ]
 
 ALERTS_MIGRATE_KEYS = [
@@ -167,7 +244,22 @@ SUBSCRIPTION_UNINSTALL_KEYS = [
     "aws_permissions_check",
     "functions",
     "excludes",
+    "function_tags",
+    "function_tag_mode",
+    "function_patterns",
+    "exclude_patterns",
+    "runtimes",
+    "architectures",
+    "shard",
+    "use_inventory",
+    "inventory_max_age",
+    "inventory",
+    "journal_path",
+    "resume",
+    "journal",
     "otel",
+    "account_policy",
+    "log_groups",
 ]
 
 
@@ -184,6 +276,7 @@ OtelIngestionUpdate = namedtuple("OtelIngestionUpdate", OTEL_INGESTION_UPDATE_KE
 
 LayerInstall = namedtuple("LayerInstall", LAYER_INSTALL_KEYS)
 LayerUninstall = namedtuple("LayerUninstall", LAYER_UNINSTALL_KEYS)
+LayerApply = namedtuple("LayerApply", LAYER_APPLY_KEYS)
 
 AlertsMigrate = namedtuple("AlertsMigrate", ALERTS_MIGRATE_KEYS)
 
@@ -1,10 +1,26 @@
 # -*- coding: utf-8 -*-
 
+import contextvars
+import fnmatch
+import functools
+import hashlib
+import os
+import re
 import sys
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
 
 import boto3
 import botocore
 import click
+import requests
+
+from botocore.config import Config
+
+from newrelic_lambda_cli import timings
+from newrelic_lambda_cli.cliutils import current_region, failure
 
 NR_DOCS_ACT_LINKING_URL = "https://docs.newrelic.com/docs/serverless-function-monitoring/aws-lambda-monitoring/enable-lambda-monitoring/account-linking/#manually-configuring-the-license-key-secret"
 NEW_RELIC_ARN_PREFIX_TEMPLATE = "arn:aws:lambda:%s:451483290750"
@@ -98,6 +114,123 @@ RUNTIME_CONFIG = {
 }
 
 
+# Matches the ThreadPoolExecutor default so every worker can hold a connection
+DEFAULT_MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+class PooledSession(object):
+    """
+    Wraps a boto3 session so that a single, thread-safe client per AWS service is
+    shared by every caller instead of being constructed on each call.
+
+    Attribute access not handled here (``region_name``, ``profile_name``, etc.) is
+    delegated to the wrapped session.
+    """
+
+    def __init__(self, session, max_pool_connections=DEFAULT_MAX_WORKERS):
+        self._session = session
+        timings.register(session)
+        self._config = Config(max_pool_connections=max_pool_connections)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def client(self, service_name, **kwargs):
+        # Clients built with custom arguments are not shared
+        if kwargs:
+            with self._lock:
+                return self._session.client(service_name, **kwargs)
+        client = self._clients.get(service_name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(service_name)
+                if client is None:
+                    client = self._session.client(service_name, config=self._config)
+                    self._clients[service_name] = client
+        return client
+
+
+class TimedSession(requests.Session):
+    """
+    A requests session whose requests are timed under ``service`` while timings are
+    enabled, named after the current ``timings.operation`` or else the method and path
+    """
+
+    def __init__(self, service):
+        super(TimedSession, self).__init__()
+        self.service = service
+
+    def request(self, method, url, *args, **kwargs):
+        if timings.recorder is None:
+            return super(TimedSession, self).request(method, url, *args, **kwargs)
+        name = timings.current_operation.get() or "%s %s" % (method, urlparse(url).path)
+        return timings.recorder.time(
+            self.service,
+            name,
+            super(TimedSession, self).request,
+            method,
+            url,
+            *args,
+            **kwargs,
+        )
+
+
+class RunCache(object):
+    """
+    A thread-safe memo for lookups that only need to happen once per run, such as
+    stack outputs or API credentials shared by every function being updated.
+
+    Every result is cached, including empty ones, so a missing resource is looked up
+    once rather than once per function. Concurrent lookups of the same key wait for
+    a single in-flight call; exceptions are shared with waiters but not cached.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self._entries = {}
+
+    def invalidate(self, key):
+        """Forgets the value for key, e.g. after the resource it describes changed"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get(self, key, fetch, *args, **kwargs):
+        """Returns the cached value for key, calling ``fetch(*args, **kwargs)`` once"""
+        with self._lock:
+            future = self._entries.get(key)
+            if future is None:
+                future = self._entries[key] = Future()
+                self.misses += 1
+                owner = True
+            else:
+                self.hits += 1
+                owner = False
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = fetch(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                if self._entries.get(key) is future:
+                    del self._entries[key]
+            future.set_exception(e)
+            raise
+        future.set_result(value)
+        return value
+
+
 def catch_boto_errors(func):
     def _boto_error_wrapper(*args, **kwargs):
         try:
@@ -114,19 +247,63 @@ def catch_boto_errors(func):
     return _boto_error_wrapper
 
 
-def get_arn_prefix(region):
-    return NEW_RELIC_ARN_PREFIX_TEMPLATE % (get_region(region),)
+def get_arn_prefix(region, profile=None):
+    return NEW_RELIC_ARN_PREFIX_TEMPLATE % (get_region(region, profile),)
+
+
+def get_region(region, profile=None):
+    if region:
+        return region
+    return _get_default_region(profile)
 
 
+@functools.lru_cache(maxsize=None)
 @catch_boto_errors
-def get_region(region):
+def _get_default_region(profile):
+    # Building a session reads the AWS config files, so only do it once per profile
     boto_kwargs = {}
-    if region:
-        boto_kwargs["region_name"] = region
+    if profile:
+        boto_kwargs["profile_name"] = profile
     session = boto3.session.Session(**boto_kwargs)
     return session.region_name
 
 
+@functools.lru_cache(maxsize=None)
+def new_relic_layer_matcher(region, profile=None):
+    """
+    Returns a predicate that tells whether a layer ARN is a New Relic layer in the
+    given region, compiled once per region and profile
+
+    :param region: The AWS region, or None to use the session's default region
+    :param profile: The AWS profile used to resolve the default region
+    """
+    pattern = re.compile(re.escape(get_arn_prefix(region, profile)))
+    return lambda arn: pattern.match(arn) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def compile_name_patterns(patterns):
+    """
+    Compiles function name patterns into a single regex, or returns None if there
+    are none. Patterns are globs unless prefixed with ``re:``, and must match the
+    whole name.
+
+    :param patterns: A tuple of glob or ``re:`` patterns
+    """
+    if not patterns:
+        return None
+    return re.compile(
+        "|".join(
+            (
+                "(?:%s)\\Z" % pattern[3:]
+                if pattern.startswith("re:")
+                else fnmatch.translate(pattern)
+            )
+            for pattern in patterns
+        )
+    )
+
+
 @catch_boto_errors
 def get_lambda_client(session):
     return session.client("lambda")
@@ -137,6 +314,80 @@ def all_lambda_regions():
     return boto3.Session().get_available_regions("lambda")
 
 
+def enabled_regions(session):
+    """
+    Returns the regions enabled in the session's account, leaving out the opt-in
+    regions it hasn't opted in to
+    """
+    res = session.client("ec2").describe_regions(
+        Filters=[
+            {"Name": "opt-in-status", "Values": ["opt-in-not-required", "opted-in"]}
+        ]
+    )
+    return sorted(region["RegionName"] for region in res.get("Regions", []))
+
+
+def resolve_regions(regions, aws_profile=None):
+    """
+    Expands the values of a repeatable --aws-region option into a list of regions,
+    where 'all' selects every Lambda region enabled in the account and no value means
+    the session default
+    """
+    if not regions:
+        return [None]
+    if "all" in regions:
+        session = boto3.Session(profile_name=aws_profile)
+        if not session.region_name:
+            session = boto3.Session(profile_name=aws_profile, region_name="us-east-1")
+        try:
+            enabled = set(enabled_regions(session))
+        except (
+            botocore.exceptions.BotoCoreError,
+            botocore.exceptions.ClientError,
+        ) as e:
+            raise click.UsageError(
+                "Could not list the regions enabled in the account: %s" % e
+            )
+        return [region for region in all_lambda_regions() if region in enabled]
+    return unique(regions)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    A thread pool that runs each task in a copy of the submitting thread's context,
+    so that workers of a region keep prefixing their messages with it
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _run_in_region(func, region):
+    current_region.set(region)
+    try:
+        return func(region)
+    except click.exceptions.Exit:
+        # The failure was already reported
+        return False
+    except click.ClickException as e:
+        failure(e.format_message())
+    except Exception as e:
+        failure("%s: %s" % (type(e).__name__, e))
+    return False
+
+
+def run_in_regions(regions, func):
+    """
+    Calls ``func(region)`` for each region concurrently, returning the results. With
+    several regions, messages are prefixed with their region and an error in one
+    region is reported as its failure rather than stopping the others.
+    """
+    if len(regions) == 1:
+        return [func(regions[0])]
+    with ContextThreadPoolExecutor(max_workers=len(regions)) as executor:
+        return list(executor.map(functools.partial(_run_in_region, func), regions))
+
+
 def is_valid_handler(runtime, handler):
     runtime_handler = RUNTIME_CONFIG.get(runtime, {}).get("Handler", None)
     if (
@@ -169,6 +420,52 @@ def validate_aws_profile(ctx, param, value):
         return value
 
 
+def validate_name_patterns(ctx, param, value):
+    """A click callback to validate function name patterns"""
+    try:
+        compile_name_patterns(value)
+    except re.error as e:
+        raise click.BadParameter("Invalid pattern: %s" % e, ctx=ctx, param=param)
+    else:
+        return value
+
+
+def parse_shard(ctx, param, value):
+    """A click callback to parse a shard such as ``2/8`` into ``(2, 8)``"""
+    if value is None:
+        return None
+    index, sep, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise click.BadParameter("Expected <index>/<count>, got '%s'" % value)
+    if not sep or not 1 <= index <= count:
+        raise click.BadParameter(
+            "The shard index must be between 1 and the shard count, got '%s'" % value
+        )
+    return index, count
+
+
+def function_name(function):
+    """Returns the name of a function given by name, ARN or partial ARN"""
+    parts = function.split(":")
+    return parts[parts.index("function") + 1] if "function" in parts[:-1] else parts[0]
+
+
+def in_shard(function, shard):
+    """
+    Tells whether a function belongs to a shard. Functions are bucketed by a hash of
+    their name, so a function given by ARN lands in the same shard as by name, and
+    adding functions never moves others between shards.
+
+    :param function: A function name, ARN or partial ARN
+    :param shard: An ``(index, count)`` tuple, ``index`` starting at 1
+    """
+    index, count = shard
+    digest = hashlib.sha1(function_name(function).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count == index - 1
+
+
 def unique(seq):
     """Returns unique values in a sequence while preserving order"""
     seen = set()
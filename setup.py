@@ -21,7 +21,6 @@ setup(
         "colorama",
         "gql>=2,<3",
         "requests<3",
-        "tabulate",
     ],
     setup_requires=["pytest-runner"],
     entry_points={
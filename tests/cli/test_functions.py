@@ -0,0 +1,127 @@
+import json
+
+from unittest.mock import patch
+
+from click import UsageError
+
+from newrelic_lambda_cli.cli import cli, register_groups
+from newrelic_lambda_cli.cli.functions import format_table
+
+FUNCTIONS = [
+    {
+        "FunctionName": "foo",
+        "FunctionArn": "arn:aws:lambda:us-east-1:123456789:function:foo",
+        "Runtime": "python3.12",
+        "x-new-relic-enabled": True,
+        "x-aws-region": "us-east-1",
+    },
+    {
+        "FunctionName": "bar",
+        "FunctionArn": "arn:aws:lambda:us-east-1:123456789:function:bar",
+        "Runtime": "nodejs20.x",
+        "x-new-relic-enabled": False,
+        "x-aws-region": "us-east-1",
+    },
+]
+
+
+def _list(cli_runner, *args):
+    register_groups(cli)
+    with patch(
+        "newrelic_lambda_cli.functions.list_functions_in_regions",
+        return_value=iter(FUNCTIONS),
+    ):
+        return cli_runner.invoke(
+            cli, ["functions", "list", "--aws-region", "us-east-1", *args]
+        )
+
+
+def test_functions_list_table(aws_credentials, cli_runner):
+    result = _list(cli_runner)
+
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == [
+        "Function Name  Runtime     Installed",
+        "-------------  ----------  ---------",
+        "foo            python3.12  Yes",
+        "bar            nodejs20.x  No",
+    ]
+
+
+def test_format_table_sizes_columns_from_sample():
+    funcs = [
+        {"FunctionName": "a-much-longer-function-name", "Runtime": "go1.x"},
+        {"FunctionName": "short", "Runtime": "provided.al2023"},
+        {"FunctionName": "longer-than-the-sampled-rows-function", "Runtime": "java21"},
+    ]
+    columns = [("Function Name", "FunctionName"), ("Runtime", "Runtime")]
+
+    assert list(format_table(funcs, columns, sample=2)) == [
+        "Function Name                Runtime",
+        "---------------------------  ---------------",
+        "a-much-longer-function-name  go1.x",
+        "short                        provided.al2023",
+        "longer-than-the-sampled-rows-function  java21",
+    ]
+
+
+def test_functions_list_text(aws_credentials, cli_runner):
+    result = _list(cli_runner, "--output", "text")
+
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == [
+        "Function Name\tRuntime\tInstalled",
+        "foo\tpython3.12\tYes",
+        "bar\tnodejs20.x\tNo",
+    ]
+
+
+def test_functions_list_csv(aws_credentials, cli_runner):
+    result = _list(cli_runner, "--output", "csv")
+
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == [
+        "Function Name,Runtime,Installed",
+        "foo,python3.12,Yes",
+        "bar,nodejs20.x,No",
+    ]
+
+
+def test_functions_list_jsonl(aws_credentials, cli_runner):
+    result = _list(cli_runner, "--output", "jsonl")
+
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line) for line in result.output.splitlines()] == [
+        {
+            "FunctionName": "foo",
+            "FunctionArn": "arn:aws:lambda:us-east-1:123456789:function:foo",
+            "Runtime": "python3.12",
+            "Installed": True,
+        },
+        {
+            "FunctionName": "bar",
+            "FunctionArn": "arn:aws:lambda:us-east-1:123456789:function:bar",
+            "Runtime": "nodejs20.x",
+            "Installed": False,
+        },
+    ]
+
+
+def test_functions_list_region_failure(aws_credentials, cli_runner):
+    def _list_functions(session, filter=None):
+        if session.region_name == "us-west-2":
+            raise UsageError("Access denied")
+        return iter([dict(FUNCTIONS[0])])
+
+    register_groups(cli)
+    with patch(
+        "newrelic_lambda_cli.functions.list_functions", side_effect=_list_functions
+    ):
+        result = cli_runner.invoke(
+            cli,
+            ["functions", "list", "-r", "us-east-1", "-r", "us-west-2", "-o", "csv"],
+        )
+
+    assert result.exit_code == 1
+    assert "foo,python3.12,Yes,us-east-1" in result.stdout
+    assert "us-west-2: Access denied" in result.stderr
@@ -1,7 +1,11 @@
+import json
+
 import pytest
 from click.testing import CliRunner
 from moto import mock_aws
+from unittest.mock import patch
 
+from newrelic_lambda_cli import layers
 from newrelic_lambda_cli.cli import cli, register_groups
 
 
@@ -167,3 +171,292 @@ def test_layers_uninstall(aws_credentials, cli_runner):
     assert result2.exit_code == 1
     assert result2.stdout == ""
     assert "Could not find function: foobar" in result2.stderr
+
+
+@mock_aws
+def test_layers_install_multiple_regions(aws_credentials, cli_runner):
+    """
+    Assert that 'newrelic-lambda layers install' runs in every region passed with
+    --aws-region and reports the outcome per region
+    """
+    register_groups(cli)
+
+    result = cli_runner.invoke(
+        cli,
+        [
+            "layers",
+            "install",
+            "--no-aws-permissions-check",
+            "--function",
+            "foobar",
+            "--nr-account-id",
+            "12345678",
+            "--aws-region",
+            "us-east-1",
+            "--aws-region",
+            "us-west-2",
+        ],
+        env={
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_SECURITY_TOKEN": "testing",
+            "AWS_SESSION_TOKEN": "testing",
+        },
+    )
+
+    assert result.exit_code == 1
+    assert result.stderr.count("Could not find function: foobar") == 2
+    assert "us-east-1: Install Incomplete" in result.stderr
+    assert "us-west-2: Install Incomplete" in result.stderr
+
+
+def test_layers_apply_empty_plan(aws_credentials, cli_runner, tmp_path):
+    register_groups(cli)
+    plan = tmp_path / "plan.json"
+    plan.write_text('{"version": 1, "changes": []}')
+
+    result = cli_runner.invoke(cli, ["layers", "apply", str(plan)])
+
+    assert result.exit_code == 0, result.stderr
+    assert "Nothing to apply" in result.stdout
+
+
+def test_layers_uninstall_requires_function_selection(aws_credentials, cli_runner):
+    register_groups(cli)
+
+    result = cli_runner.invoke(
+        cli, ["layers", "uninstall", "--aws-region", "us-east-1"]
+    )
+    assert result.exit_code == 2
+    assert "Provide at least one --function, --function-tag or --function-pattern" in (
+        result.stderr
+    )
+
+    result = cli_runner.invoke(
+        cli, ["layers", "uninstall", "--function-tag", "team", "-r", "us-east-1"]
+    )
+    assert result.exit_code == 2
+    assert "Expected key=value, got 'team'" in result.stderr
+
+
+@mock_aws
+def test_layers_uninstall_resume(aws_credentials, cli_runner, tmp_path):
+    """
+    Assert that 'newrelic-lambda layers uninstall --resume' skips the functions that
+    finished in the journal and journals the rest
+    """
+    register_groups(cli)
+
+    journal = tmp_path / "journal.jsonl"
+    journal.write_text(
+        json.dumps(
+            {
+                "Command": "layers uninstall",
+                "Region": "us-east-1",
+                "Function": "foobar",
+                "Outcome": "updated",
+            }
+        )
+        + "\n"
+    )
+
+    result = cli_runner.invoke(
+        cli,
+        [
+            "layers",
+            "uninstall",
+            "--no-aws-permissions-check",
+            "--function",
+            "foobar",
+            "--function",
+            "barbaz",
+            "--aws-region",
+            "us-east-1",
+            "--resume",
+            str(journal),
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert "Skipping 1 function(s) that finished in" in result.stdout
+    assert "Could not find function: barbaz" in result.stderr
+    assert "foobar" not in result.stderr
+
+    entries = [json.loads(line) for line in journal.read_text().splitlines()]
+    assert [(e["Function"], e["Outcome"]) for e in entries] == [
+        ("foobar", "updated"),
+        ("barbaz", "failed"),
+    ]
+
+    # Entries are keyed by the resolved region, so a run in the profile's region
+    # resumes them too
+    config = tmp_path / "config"
+    config.write_text("[default]\nregion = us-east-1\n")
+    result = cli_runner.invoke(
+        cli,
+        [
+            "layers",
+            "uninstall",
+            "--no-aws-permissions-check",
+            "--function",
+            "foobar",
+            "--function",
+            "barbaz",
+            "--resume",
+            str(journal),
+        ],
+        env={"AWS_CONFIG_FILE": str(config), "AWS_DEFAULT_REGION": None},
+    )
+
+    assert result.exit_code == 1
+    assert "Skipping 1 function(s) that finished in" in result.stdout
+    entries = [json.loads(line) for line in journal.read_text().splitlines()]
+    assert entries[-1]["Function"] == "barbaz"
+    assert entries[-1]["Region"] == "us-east-1"
+
+
+@mock_aws
+def test_layers_install_waves(aws_credentials, cli_runner):
+    """
+    Assert that 'newrelic-lambda layers install --waves' updates functions in waves
+    and halts the rollout when a wave fails
+    """
+    register_groups(cli)
+
+    functions = ["fn-%d" % i for i in range(10)]
+    args = [
+        "layers",
+        "install",
+        "--no-aws-permissions-check",
+        "--function",
+        "all",
+        "--nr-account-id",
+        "12345678",
+        "--aws-region",
+        "us-east-1",
+        "--waves",
+        "10%,50%",
+        "--wave-soak",
+        "0",
+    ]
+
+    with patch(
+        "newrelic_lambda_cli.cli.layers.get_aliased_functions", return_value=functions
+    ), patch("newrelic_lambda_cli.cli.layers.layers.install") as mock_install:
+        mock_install.return_value = True
+        result = cli_runner.invoke(cli, args)
+
+        assert result.exit_code == 0, result.stderr
+        assert mock_install.call_count == 10
+
+        # The canary fails, so no other function is updated
+        mock_install.reset_mock()
+        mock_install.return_value = False
+        result = cli_runner.invoke(cli, args)
+
+        assert result.exit_code == 1
+        assert mock_install.call_count == 1
+        assert "Halting rollout after wave 1 of 3, 9 function(s) not updated" in (
+            result.stderr
+        )
+
+
+@mock_aws
+def test_layers_install_waves_soak(aws_credentials, cli_runner):
+    """
+    Assert that 'newrelic-lambda layers install --waves' only soaks after waves
+    that updated functions
+    """
+    register_groups(cli)
+
+    args = [
+        "layers",
+        "install",
+        "--no-aws-permissions-check",
+        "--function",
+        "all",
+        "--nr-account-id",
+        "12345678",
+        "--aws-region",
+        "us-east-1",
+        "--waves",
+        "1,2",
+        "--wave-soak",
+        "30",
+    ]
+
+    def _update(input, function, config=None):
+        input.summary.record("updated")
+        return True
+
+    with patch(
+        "newrelic_lambda_cli.cli.layers.get_aliased_functions",
+        return_value=["fn-%d" % i for i in range(4)],
+    ), patch("newrelic_lambda_cli.cli.layers.layers.install") as mock_install, patch(
+        "newrelic_lambda_cli.cli.layers.time.sleep"
+    ) as mock_sleep:
+        # Every function is already up to date
+        mock_install.return_value = True
+        result = cli_runner.invoke(cli, args)
+        assert result.exit_code == 0, result.stderr
+        mock_sleep.assert_not_called()
+
+        mock_install.side_effect = _update
+        result = cli_runner.invoke(cli, args)
+        assert result.exit_code == 0, result.stderr
+        assert mock_sleep.call_count == 2
+
+
+@mock_aws
+def test_layers_uninstall_updates_roles_once(aws_credentials, cli_runner):
+    """
+    Assert that 'newrelic-lambda layers uninstall' decides which execution roles to
+    detach the policy from once, after every region is done
+    """
+    register_groups(cli)
+
+    def _uninstall(input, function, config=None):
+        layers._detach_role_policy(
+            input,
+            "arn:aws:iam::123456789:role/shared",
+            "policy",
+            "%s:%s" % (input.aws_region, function),
+        )
+        return True
+
+    def _update_role_policies(input):
+        # Every region is done by now
+        assert mock_uninstall.call_count == 2
+        return True
+
+    with patch(
+        "newrelic_lambda_cli.cli.layers.layers.uninstall"
+    ) as mock_uninstall, patch(
+        "newrelic_lambda_cli.cli.layers.layers.update_role_policies",
+        side_effect=_update_role_policies,
+    ) as mock_update:
+        mock_uninstall.side_effect = _uninstall
+        result = cli_runner.invoke(
+            cli,
+            [
+                "layers",
+                "uninstall",
+                "--no-aws-permissions-check",
+                "--function",
+                "foobar",
+                "--aws-region",
+                "us-east-1",
+                "--aws-region",
+                "us-west-2",
+            ],
+        )
+
+    assert result.exit_code == 0, result.stderr
+    mock_update.assert_called_once()
+    role_policies = mock_update.call_args.args[0].role_policies
+    assert role_policies.detach == {
+        ("arn:aws:iam::123456789:role/shared", "policy"): {
+            "us-east-1:foobar",
+            "us-west-2:foobar",
+        }
+    }
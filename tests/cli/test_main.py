@@ -0,0 +1,156 @@
+import json
+import os
+import pstats
+import subprocess
+import sys
+
+import click
+import pytest
+from moto import mock_aws
+
+from newrelic_lambda_cli import timings
+from newrelic_lambda_cli.cli import cli, LAZY_GROUPS, register_groups
+from newrelic_lambda_cli.cli.decorators import RegionChoice
+
+# Generous enough for a slow CI runner, but well under the ~0.5s it took to import
+# every subcommand (and boto3's region data) eagerly
+IMPORT_TIME_BUDGET_US = int(os.environ.get("NEW_RELIC_CLI_IMPORT_BUDGET_US", 250000))
+
+
+def _import_times(code):
+    """Runs ``code`` under ``python -X importtime`` and returns cumulative import times"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_time_budget():
+    times = _import_times("import newrelic_lambda_cli.cli")
+
+    assert times["newrelic_lambda_cli.cli"] < IMPORT_TIME_BUDGET_US
+    for module in ("boto3", "gql", "requests", "tabulate"):
+        assert module not in times
+
+
+def test_cli_imports_only_invoked_group():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys\n"
+            "from newrelic_lambda_cli.cli import cli\n"
+            "cli(['functions', '--help'], standalone_mode=False)\n"
+            "print('\\n'.join(sys.modules))",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    modules = set(result.stdout.splitlines())
+
+    assert "newrelic_lambda_cli.cli.functions" in modules
+    for module in (
+        "gql",
+        "newrelic_lambda_cli.cli.integrations",
+        "newrelic_lambda_cli.cli.layers",
+        "newrelic_lambda_cli.integrations",
+    ):
+        assert module not in modules
+
+
+def test_cli_help_lists_lazy_groups(cli_runner):
+    result = cli_runner.invoke(cli, ["--help"])
+
+    assert result.exit_code == 0, result.output
+    for name, (_, help) in LAZY_GROUPS.items():
+        assert name in result.stdout
+        assert help in result.stdout
+
+
+def test_lazy_group_help_matches_docstrings():
+    register_groups(cli)
+
+    for name, (_, help) in LAZY_GROUPS.items():
+        assert cli.commands[name].help == help
+
+
+def test_region_choice():
+    choice = RegionChoice(extra=("all",))
+
+    assert choice._choices is None
+    assert choice.convert("us-east-1", None, None) == "us-east-1"
+    assert choice.convert("all", None, None) == "all"
+    with pytest.raises(click.BadParameter):
+        choice.convert("us-nowhere-1", None, None)
+
+
+@mock_aws
+def test_cli_timings(aws_credentials, cli_runner, tmp_path):
+    register_groups(cli)
+
+    result = cli_runner.invoke(
+        cli, ["--timings", "functions", "list", "--aws-region", "us-east-1"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "Call timings:" in result.stderr
+    assert "lambda.ListFunctions" in result.stderr
+    assert timings.recorder is None
+
+    path = tmp_path / "timings.json"
+    result = cli_runner.invoke(
+        cli,
+        ["--timings-json", str(path), "functions", "list", "--aws-region", "us-east-1"],
+    )
+
+    assert result.exit_code == 0, result.output
+    operations = json.loads(path.read_text())["Operations"]
+    assert ("lambda", "ListFunctions") in [
+        (operation["Service"], operation["Operation"]) for operation in operations
+    ]
+
+
+@mock_aws
+def test_cli_profile(aws_credentials, cli_runner, tmp_path):
+    register_groups(cli)
+    path = tmp_path / "run.prof"
+
+    result = cli_runner.invoke(
+        cli, ["--profile", str(path), "functions", "list", "--aws-region", "us-east-1"]
+    )
+
+    assert result.exit_code == 0, result.output
+    stats = pstats.Stats(str(path)).stats
+    assert any(name == "list_functions" for (_, _, name) in stats)
+
+
+def test_cli_profile_includes_imports(tmp_path):
+    path = tmp_path / "run.prof"
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from newrelic_lambda_cli.cli import cli\n"
+            "cli(['--profile', %r, 'functions', '--help'], standalone_mode=False)"
+            % str(path),
+        ],
+        capture_output=True,
+        check=True,
+    )
+
+    # The subcommand's module is imported after profiling started
+    stats = pstats.Stats(str(path)).stats
+    assert any(
+        filename.endswith(os.path.join("cli", "functions.py")) and name == "register"
+        for (filename, _, name) in stats
+    )
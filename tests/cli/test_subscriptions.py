@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from moto import mock_aws
 
 from newrelic_lambda_cli.cli import cli, register_groups
@@ -146,5 +148,113 @@ def test_subscriptions_uninstall(aws_credentials, cli_runner):
         },
     )
 
-    assert result2.exit_code == 1
-    assert result2.stdout == ""
+    # Listing the region's log groups takes fewer calls than checking both
+    # functions, and shows neither has a log group to remove a filter from
+    assert result2.exit_code == 0
+    assert "No New Relic subscription filters found for 'foobar'" in result2.output
+    assert "No New Relic subscription filters found for 'barbaz'" in result2.output
+
+
+@mock_aws
+@patch("newrelic_lambda_cli.subscriptions.remove_log_subscription", autospec=True)
+@patch("newrelic_lambda_cli.subscriptions.verify_account_policy", autospec=True)
+@patch("newrelic_lambda_cli.subscriptions.create_account_policy", autospec=True)
+@patch("newrelic_lambda_cli.subscriptions.get_log_destination_arn", autospec=True)
+def test_subscriptions_install_account_policy(
+    mock_get_log_destination_arn,
+    mock_create_account_policy,
+    mock_verify_account_policy,
+    mock_remove_log_subscription,
+    aws_credentials,
+    cli_runner,
+):
+    """
+    Assert that 'newrelic-lambda subscriptions install --account-policy' installs the
+    account policy and then removes the per-function filters it replaces.
+    """
+    register_groups(cli)
+    mock_get_log_destination_arn.return_value = "Destination"
+    mock_create_account_policy.return_value = True
+    mock_verify_account_policy.return_value = True
+    mock_remove_log_subscription.return_value = True
+    args = [
+        "subscriptions",
+        "install",
+        "--no-aws-permissions-check",
+        "--function",
+        "all",
+        "--exclude",
+        "excluded",
+        "--aws-region",
+        "us-east-1",
+        "--account-policy",
+        "--all-log-groups",
+    ]
+
+    with patch(
+        "newrelic_lambda_cli.cli.subscriptions.get_aliased_functions",
+        return_value=["foobar", "barbaz"],
+    ):
+        result = cli_runner.invoke(cli, args)
+
+        assert result.exit_code == 0, result.stderr
+        assert mock_create_account_policy.call_count == 1
+        input = mock_create_account_policy.call_args.args[0]
+        assert input.destination_arn == "Destination"
+        assert input.excludes == ("excluded",)
+        assert sorted(
+            call.args[1] for call in mock_remove_log_subscription.call_args_list
+        ) == ["barbaz", "foobar"]
+
+        # The per-function filters are kept unless the policy is confirmed
+        mock_remove_log_subscription.reset_mock()
+        mock_verify_account_policy.return_value = False
+        result = cli_runner.invoke(cli, args)
+
+        assert result.exit_code == 1
+        mock_remove_log_subscription.assert_not_called()
+
+
+@mock_aws
+@patch("newrelic_lambda_cli.subscriptions.create_account_policy", autospec=True)
+def test_subscriptions_install_account_policy_scope(
+    mock_create_account_policy, aws_credentials, cli_runner
+):
+    """
+    Assert that 'newrelic-lambda subscriptions install --account-policy' requires
+    confirming that every log group is subscribed, and refuses an empty pattern
+    """
+    register_groups(cli)
+    args = [
+        "subscriptions",
+        "install",
+        "--no-aws-permissions-check",
+        "--function",
+        "foobar",
+        "--aws-region",
+        "us-east-1",
+        "--account-policy",
+    ]
+
+    result = cli_runner.invoke(cli, args)
+    assert result.exit_code == 2
+    assert "--all-log-groups" in result.stderr
+
+    result = cli_runner.invoke(cli, args + ["--all-log-groups", "--otel"])
+    assert result.exit_code == 2
+    assert "empty filter pattern" in result.stderr
+
+    # The policy can't leave out the functions these options don't select
+    result = cli_runner.invoke(cli, args + ["--all-log-groups"])
+    assert result.exit_code == 2
+    assert "can't be used with --function other than 'all'" in result.stderr
+
+    args[args.index("foobar")] = "all"
+    result = cli_runner.invoke(
+        cli,
+        args + ["--all-log-groups", "--function-pattern", "api-*", "--shard", "1/2"],
+    )
+    assert result.exit_code == 2
+    assert "can't be used with --function-pattern, --shard" in result.stderr
+
+    mock_create_account_policy.assert_not_called()
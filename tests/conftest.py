@@ -2,10 +2,16 @@ from click.testing import CliRunner
 import os
 import pytest
 
+from newrelic_lambda_cli.api import gql_client_cache, http_sessions, license_key_cache
+from newrelic_lambda_cli.integrations import license_key_outputs_cache
+from newrelic_lambda_cli.inventory import account_id_cache
+from newrelic_lambda_cli.layers import attached_role_policies_cache, layer_index_cache
+from newrelic_lambda_cli.utils import _get_default_region, new_relic_layer_matcher
 from newrelic_lambda_cli.types import (
     INTEGRATION_INSTALL_KEYS,
     INTEGRATION_UNINSTALL_KEYS,
     INTEGRATION_UPDATE_KEYS,
+    LAYER_APPLY_KEYS,
     LAYER_INSTALL_KEYS,
     LAYER_UNINSTALL_KEYS,
     SUBSCRIPTION_INSTALL_KEYS,
@@ -13,6 +19,7 @@ from newrelic_lambda_cli.types import (
     IntegrationInstall,
     IntegrationUninstall,
     IntegrationUpdate,
+    LayerApply,
     LayerInstall,
     LayerUninstall,
     SubscriptionInstall,
@@ -43,6 +50,20 @@ def clear_aws_env(monkeypatch):
     monkeypatch.delenv("AWS_PROFILE", raising=False)
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    layer_index_cache.configure()
+    layer_index_cache.clear()
+    _get_default_region.cache_clear()
+    new_relic_layer_matcher.cache_clear()
+    gql_client_cache.clear()
+    http_sessions.clear()
+    license_key_cache.clear()
+    license_key_outputs_cache.clear()
+    attached_role_policies_cache.clear()
+    account_id_cache.clear()
+
+
 @pytest.fixture(scope="module")
 def cli_runner():
     return CliRunner()
@@ -90,6 +111,11 @@ def layer_uninstall(**kwargs):
     return LayerUninstall(**{key: kwargs.get(key) for key in LAYER_UNINSTALL_KEYS})
 
 
+def layer_apply(**kwargs):
+    assert all(key in LAYER_APPLY_KEYS for key in kwargs)
+    return LayerApply(**{key: kwargs.get(key) for key in LAYER_APPLY_KEYS})
+
+
 def subscription_install(**kwargs):
     assert all(key in SUBSCRIPTION_INSTALL_KEYS for key in kwargs)
     return SubscriptionInstall(
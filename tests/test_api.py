@@ -1,12 +1,14 @@
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from newrelic_lambda_cli.api import (
     create_integration_account,
     enable_lambda_integration,
     NewRelicGQL,
+    retrieve_license_key,
+    validate_gql_credentials,
 )
 
-from .conftest import integration_install
+from .conftest import integration_install, layer_install
 
 
 def test_create_integration_account():
@@ -186,3 +188,23 @@ def test_enable_lambda_integration():
     assert (
         lambda_enabled is True
     ), "Account is linked but didn't have the lambda integration enabled, so it should be configured"
+
+
+def test_validate_gql_credentials_cached():
+    with patch("newrelic_lambda_cli.api.NewRelicGQL") as mock_gql:
+        input = layer_install(nr_account_id=12345, nr_api_key="foo", nr_region="us")
+
+        assert validate_gql_credentials(input) is validate_gql_credentials(input)
+        mock_gql.assert_called_once_with(12345, "foo", "us")
+
+        validate_gql_credentials(input._replace(nr_api_key="bar"))
+        assert mock_gql.call_count == 2
+
+
+def test_retrieve_license_key_cached():
+    gql = NewRelicGQL("123456789", "foobar")
+    gql.query = Mock(return_value={})
+
+    assert retrieve_license_key(gql) is None
+    assert retrieve_license_key(gql) is None
+    gql.query.assert_called_once()
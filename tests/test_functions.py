@@ -1,9 +1,18 @@
+import io
+import zipfile
+
 import boto3
+import pytest
 from unittest import mock
 from moto import mock_aws
 from unittest.mock import MagicMock
 
-from newrelic_lambda_cli.functions import get_aliased_functions, list_functions
+from newrelic_lambda_cli.functions import (
+    get_aliased_functions,
+    get_tagged_functions,
+    list_functions,
+    list_functions_in_regions,
+)
 
 from .conftest import layer_install
 
@@ -75,3 +84,250 @@ def test_list_functions(aws_credentials):
     assert list(list_functions(mock_session)) == [
         {"FunctionName": "foobar", "Layers": [], "x-new-relic-enabled": False}
     ]
+
+
+@mock.patch("newrelic_lambda_cli.functions.list_functions", autospec=True)
+def test_get_aliased_functions_collects_configs(mock_list_functions):
+    mock_list_functions.return_value = [
+        {"FunctionName": "aliased-func", "Runtime": "python3.12"},
+        {"FunctionName": "ignored-func", "Runtime": "python3.12"},
+    ]
+    configs = {}
+    assert get_aliased_functions(
+        layer_install(
+            session=MagicMock(), functions=["foo", "all"], excludes=["ignored-func"]
+        ),
+        configs,
+    ) == ["foo", "aliased-func"]
+    assert configs == {
+        "aliased-func": {
+            "Configuration": {"FunctionName": "aliased-func", "Runtime": "python3.12"}
+        }
+    }
+
+
+def test_list_functions_in_regions(capsys):
+    sessions = []
+    for region in ("us-east-1", "us-west-2"):
+        mock_session = MagicMock()
+        mock_session.region_name = region
+        mock_pager = mock_session.client.return_value.get_paginator.return_value
+        mock_pager.paginate.return_value = [
+            {"Functions": [{"FunctionName": "func-%s" % region, "Layers": []}]}
+        ]
+        sessions.append(mock_session)
+
+    funcs = sorted(
+        list_functions_in_regions(sessions), key=lambda func: func["FunctionName"]
+    )
+    assert funcs == [
+        {
+            "FunctionName": "func-us-east-1",
+            "Layers": [],
+            "x-new-relic-enabled": False,
+            "x-aws-region": "us-east-1",
+        },
+        {
+            "FunctionName": "func-us-west-2",
+            "Layers": [],
+            "x-new-relic-enabled": False,
+            "x-aws-region": "us-west-2",
+        },
+    ]
+
+    # A region that fails is reported, the other regions are still listed
+    sessions[1].client.return_value.get_paginator.side_effect = ValueError("boom")
+    failed = []
+    funcs = list(list_functions_in_regions(sessions, failed=failed))
+    assert [func["FunctionName"] for func in funcs] == ["func-us-east-1"]
+    assert failed == ["us-west-2"]
+    assert "us-west-2: ValueError: boom" in capsys.readouterr().err
+
+
+def _create_tagged_functions(session, functions):
+    role_arn = session.client("iam").create_role(
+        RoleName="lambda-role", AssumeRolePolicyDocument="{}"
+    )["Role"]["Arn"]
+    code = io.BytesIO()
+    with zipfile.ZipFile(code, "w") as zip_file:
+        zip_file.writestr("handler.py", "def handler(event, context): pass")
+    for name, tags in functions.items():
+        session.client("lambda").create_function(
+            FunctionName=name,
+            Runtime="python3.12",
+            Role=role_arn,
+            Handler="handler.handler",
+            Code={"ZipFile": code.getvalue()},
+            Tags=tags,
+        )
+
+
+@mock_aws
+def test_get_tagged_functions(aws_credentials):
+    session = boto3.Session(region_name="us-east-1")
+    _create_tagged_functions(
+        session,
+        {
+            "payments-api": {"team": "payments", "env": "prod"},
+            "payments-worker": {"team": "payments", "env": "dev"},
+            "search-api": {"team": "search", "env": "prod"},
+        },
+    )
+
+    assert get_tagged_functions(session, [("team", "payments")]) == [
+        "payments-api",
+        "payments-worker",
+    ]
+    assert get_tagged_functions(session, [("team", "payments"), ("env", "prod")]) == [
+        "payments-api"
+    ]
+    assert (
+        get_tagged_functions(session, [("team", "payments"), ("team", "search")]) == []
+    )
+    assert sorted(
+        get_tagged_functions(session, [("team", "search"), ("env", "dev")], "or")
+    ) == ["payments-worker", "search-api"]
+
+
+@mock.patch("newrelic_lambda_cli.functions.get_tagged_functions", autospec=True)
+@mock.patch("newrelic_lambda_cli.functions.list_functions", autospec=True)
+def test_get_aliased_functions_with_tags(
+    mock_list_functions, mock_get_tagged_functions
+):
+    mock_get_tagged_functions.return_value = ["tagged-func", "excluded-func"]
+    mock_list_functions.return_value = [
+        {"FunctionName": "tagged-func"},
+        {"FunctionName": "untagged-func"},
+    ]
+    input = layer_install(
+        session=MagicMock(),
+        functions=["foo"],
+        excludes=["excluded-func"],
+        function_tags=(("team", "payments"),),
+        function_tag_mode="and",
+    )
+
+    assert get_aliased_functions(input) == ["foo", "tagged-func"]
+    mock_list_functions.assert_not_called()
+
+    # Tags narrow down the aliases
+    input = input._replace(functions=["installed"])
+    assert get_aliased_functions(input) == ["tagged-func"]
+
+    # Runtimes narrow down the tagged functions by their configuration too
+    mock_get_tagged_functions.return_value = ["tagged-func", "tagged-node-func"]
+    runtimes = {
+        "foo": "python3.12",
+        "tagged-func": "python3.12",
+        "tagged-node-func": "nodejs20.x",
+    }
+    with mock.patch(
+        "newrelic_lambda_cli.functions.get_function",
+        side_effect=lambda session, name: {
+            "Configuration": {"FunctionName": name, "Runtime": runtimes[name]}
+        },
+    ):
+        input = input._replace(functions=["foo"], runtimes=("python3.12",))
+        assert get_aliased_functions(input) == ["foo", "tagged-func"]
+
+
+@mock.patch("newrelic_lambda_cli.functions.list_functions", autospec=True)
+def test_get_aliased_functions_with_patterns(mock_list_functions):
+    mock_list_functions.return_value = [
+        {"FunctionName": "payments-api-prod", "Runtime": "python3.12"},
+        {
+            "FunctionName": "payments-worker-prod",
+            "Runtime": "python3.12",
+            "Architectures": ["arm64"],
+        },
+        {"FunctionName": "payments-api-dev", "Runtime": "python3.12"},
+        {"FunctionName": "payments-legacy-prod", "Runtime": "nodejs18.x"},
+        {"FunctionName": "search-api-prod", "Runtime": "python3.12"},
+    ]
+    input = layer_install(
+        session=MagicMock(),
+        functions=(),
+        excludes=(),
+        function_patterns=("payments-*-prod",),
+    )
+
+    assert get_aliased_functions(input) == [
+        "payments-api-prod",
+        "payments-worker-prod",
+        "payments-legacy-prod",
+    ]
+    mock_list_functions.assert_called_once_with(input.session, "all")
+
+    input = input._replace(exclude_patterns=("re:.*-(worker|legacy)-.*",))
+    assert get_aliased_functions(input) == ["payments-api-prod"]
+
+    input = input._replace(exclude_patterns=(), runtimes=("python3.12",))
+    assert get_aliased_functions(input) == [
+        "payments-api-prod",
+        "payments-worker-prod",
+    ]
+
+    input = input._replace(architectures=("x86_64",))
+    assert get_aliased_functions(input) == ["payments-api-prod"]
+
+
+@mock.patch("newrelic_lambda_cli.functions.list_functions", autospec=True)
+def test_get_aliased_functions_with_shard(mock_list_functions):
+    names = ["function-%d" % i for i in range(100)]
+    mock_list_functions.return_value = [{"FunctionName": name} for name in names]
+
+    shards = [
+        get_aliased_functions(
+            layer_install(
+                session=MagicMock(),
+                functions=["all", "explicit-1", "explicit-2"],
+                excludes=[],
+                shard=(index, 3),
+            )
+        )
+        for index in range(1, 4)
+    ]
+
+    assert sorted(sum(shards, [])) == sorted(names + ["explicit-1", "explicit-2"])
+
+
+@mock.patch("newrelic_lambda_cli.functions.get_function", autospec=True)
+@mock.patch("newrelic_lambda_cli.functions.list_functions", autospec=True)
+def test_get_aliased_functions_filters_narrow_given_functions(
+    mock_list_functions, mock_get_function
+):
+    mock_list_functions.return_value = [
+        {"FunctionName": "my-fn", "Runtime": "python3.12"},
+        {"FunctionName": "other-prod", "Runtime": "python3.12"},
+    ]
+    mock_get_function.side_effect = lambda session, name: {
+        "my-fn": {"Configuration": {"FunctionName": "my-fn", "Runtime": "nodejs20.x"}},
+        "api-prod": {
+            "Configuration": {"FunctionName": "api-prod", "Runtime": "python3.12"}
+        },
+    }.get(name)
+    input = layer_install(
+        session=MagicMock(),
+        functions=["my-fn"],
+        excludes=[],
+        function_patterns=("*-prod",),
+    )
+
+    # Filters never add functions that weren't given
+    assert get_aliased_functions(input) == []
+    input = input._replace(
+        functions=["my-fn", "arn:aws:lambda:us-east-1:123456789012:function:api-prod"]
+    )
+    assert get_aliased_functions(input) == [
+        "arn:aws:lambda:us-east-1:123456789012:function:api-prod"
+    ]
+
+    configs = {}
+    input = input._replace(
+        functions=["my-fn", "api-prod", "missing"],
+        function_patterns=(),
+        runtimes=("python3.12",),
+    )
+    assert get_aliased_functions(input, configs) == ["api-prod", "missing"]
+    assert list(configs) == ["api-prod"]
+    mock_list_functions.assert_not_called()
@@ -313,6 +313,22 @@ def test__get_license_key_outputs():
         )
 
 
+def test__get_license_key_outputs_caches_missing_stack():
+    with patch(
+        "newrelic_lambda_cli.integrations._get_stack_output_value"
+    ) as mock_get_stack_output:
+        mock_get_stack_output.return_value = {}
+        session = MagicMock(region_name="us-east-1", profile_name=None)
+
+        assert _get_license_key_outputs(session) == (None, None, None)
+        assert _get_license_key_outputs(session) == (None, None, None)
+        mock_get_stack_output.assert_called_once()
+
+        other_region = MagicMock(region_name="us-west-2", profile_name=None)
+        _get_license_key_outputs(other_region)
+        assert mock_get_stack_output.call_count == 2
+
+
 def test__get_stack_output_value():
     session = MagicMock()
     with patch.object(session, "client") as mock_client_factory:
@@ -0,0 +1,112 @@
+import io
+import os
+import zipfile
+from unittest.mock import MagicMock, patch
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from newrelic_lambda_cli import functions
+from newrelic_lambda_cli.inventory import FunctionInventory
+
+
+@pytest.fixture
+def new_relic_layer():
+    """Publishes a stand-in New Relic layer in the mocked account"""
+    with mock_aws(), patch(
+        "newrelic_lambda_cli.utils.NEW_RELIC_ARN_PREFIX_TEMPLATE",
+        "arn:aws:lambda:%s:123456789012",
+    ):
+        session = boto3.Session(region_name="us-east-1")
+        yield session.client("lambda").publish_layer_version(
+            LayerName="NewRelicPython312", Content={"ZipFile": b"layer"}
+        )["LayerVersionArn"]
+
+
+def _create_function(session, name, layers=()):
+    iam = session.client("iam")
+    try:
+        role_arn = iam.get_role(RoleName="lambda-role")["Role"]["Arn"]
+    except iam.exceptions.NoSuchEntityException:
+        role_arn = iam.create_role(
+            RoleName="lambda-role", AssumeRolePolicyDocument="{}"
+        )["Role"]["Arn"]
+    code = io.BytesIO()
+    with zipfile.ZipFile(code, "w") as zip_file:
+        zip_file.writestr("handler.py", "def handler(event, context): pass")
+    session.client("lambda").create_function(
+        FunctionName=name,
+        Runtime="python3.12",
+        Role=role_arn,
+        Handler="handler.handler",
+        Code={"ZipFile": code.getvalue()},
+        Layers=list(layers),
+    )
+
+
+def test_inventory_refreshes_incrementally(tmp_path):
+    session = MagicMock()
+    session.region_name = "us-east-1"
+    session.profile_name = None
+    session.client.return_value.get_caller_identity.return_value = {
+        "Account": "123456789012"
+    }
+    listing = [
+        {
+            "FunctionName": name,
+            "RevisionId": "1",
+            "LastModified": "2024-01-01",
+            "x-new-relic-enabled": False,
+        }
+        for name in ("foo", "bar")
+    ]
+    path = str(tmp_path / "inventory.sqlite")
+    inventory = FunctionInventory(path=path)
+
+    with patch("newrelic_lambda_cli.inventory.list_functions") as mock_list_functions:
+        mock_list_functions.return_value = listing
+        assert inventory.refresh(session) == (2, 0)
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        # Nothing changed since the last refresh
+        assert inventory.refresh(session) == (0, 0)
+
+        mock_list_functions.return_value = [dict(listing[0], RevisionId="2")]
+        assert inventory.refresh(session) == (1, 1)
+
+    assert [f["RevisionId"] for f in inventory.list_functions(session)] == ["2"]
+    inventory.close()
+
+
+def test_inventory_list_functions(aws_credentials, new_relic_layer, tmp_path):
+    session = boto3.Session(region_name="us-east-1")
+    _create_function(session, "foo")
+    _create_function(session, "bar", [new_relic_layer])
+    inventory = FunctionInventory(path=str(tmp_path / "inventory.sqlite"))
+
+    with patch(
+        "newrelic_lambda_cli.inventory.list_functions", wraps=functions.list_functions
+    ) as mock_list_functions:
+        assert [f["FunctionName"] for f in inventory.list_functions(session)] == [
+            "bar",
+            "foo",
+        ]
+        assert [
+            f["FunctionName"] for f in inventory.list_functions(session, "installed")
+        ] == ["bar"]
+        assert [
+            f["FunctionName"]
+            for f in inventory.list_functions(session, "not-installed")
+        ] == ["foo"]
+        # Served from the inventory until it is out of date
+        assert mock_list_functions.call_count == 1
+
+        inventory.invalidate(session)
+        list(inventory.list_functions(session))
+        assert mock_list_functions.call_count == 2
+
+        inventory.max_age = 0
+        list(inventory.list_functions(session))
+        assert mock_list_functions.call_count == 3
+
+    inventory.close()
@@ -0,0 +1,147 @@
+import json
+import os
+
+from newrelic_lambda_cli.journal import Journal, open_journal
+
+
+def test_journal_record(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path, "layers install")
+    journal.record("us-east-1", "foo", "updated", "abc123")
+    journal.record("us-east-1", "bar", "failed")
+    journal.close()
+
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    with open(path) as journal_file:
+        entries = [json.loads(line) for line in journal_file]
+    assert [(e["Function"], e["Outcome"]) for e in entries] == [
+        ("foo", "updated"),
+        ("bar", "failed"),
+    ]
+    assert entries[0]["RevisionId"] == "abc123"
+    assert entries[0]["Command"] == "layers install"
+    assert "RevisionId" not in entries[1]
+
+
+def test_journal_read_finished(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    lines = [
+        {
+            "Command": "layers install",
+            "Region": "us-east-1",
+            "Function": "foo",
+            "Outcome": "updated",
+        },
+        {
+            "Command": "layers install",
+            "Region": "us-east-1",
+            "Function": "bar",
+            "Outcome": "skipped",
+        },
+        {
+            "Command": "layers install",
+            "Region": "us-east-1",
+            "Function": "baz",
+            "Outcome": "failed",
+        },
+        {
+            "Command": "layers install",
+            "Region": "us-west-2",
+            "Function": "foo",
+            "Outcome": "failed",
+        },
+        {
+            "Command": "layers install",
+            "Region": "us-west-2",
+            "Function": "foo",
+            "Outcome": "updated",
+        },
+        {
+            "Command": "layers install",
+            "Region": "us-east-1",
+            "Function": "bar",
+            "Outcome": "failed",
+        },
+        {
+            "Command": "layers uninstall",
+            "Region": "us-east-1",
+            "Function": "qux",
+            "Outcome": "updated",
+        },
+        {
+            "Command": "layers install",
+            "Region": "us-east-1",
+            "Function": "quux",
+            "Outcome": "planned",
+        },
+    ]
+    path.write_text(
+        "".join(json.dumps(line) + "\n" for line in lines)
+        # Cut off when the run was interrupted
+        + '{"Command": "layers install", "Region": "us-'
+    )
+
+    assert Journal.read_finished(str(path), "layers install") == {
+        ("us-east-1", "foo"),
+        ("us-west-2", "foo"),
+    }
+
+
+def test_open_journal(tmp_path):
+    assert open_journal("layers install") is None
+
+    path = str(tmp_path / "journal.jsonl")
+    journal = open_journal("layers install", path=path)
+    assert journal.path == path
+    assert journal.finished == set()
+    journal.record("us-east-1", "foo", "updated")
+    journal.record("us-east-1", "bar", "failed")
+    journal.close()
+
+    resumed = open_journal("layers install", resume=path)
+    assert resumed.path == path
+    assert resumed.pending("us-east-1", ["foo", "bar", "baz"]) == ["bar", "baz"]
+    assert resumed.pending("us-west-2", ["foo"]) == ["foo"]
+
+    other = str(tmp_path / "other.jsonl")
+    assert open_journal("layers install", path=other, resume=path).path == other
+
+
+def test_journal_defer(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path, "layers install")
+    journal.defer("us-east-1", "foo", "updated", "abc123")
+    journal.defer("us-west-2", "bar", "skipped")
+    journal.close()
+
+    # Interrupted before the role policies and tags were updated
+    assert Journal.read_finished(path, "layers install") == set()
+
+    journal.complete("us-east-1", True)
+    journal.complete("us-west-2", False)
+    journal.close()
+
+    with open(path) as journal_file:
+        entries = [json.loads(line) for line in journal_file]
+    assert [(e["Region"], e["Function"], e["Outcome"]) for e in entries] == [
+        ("us-east-1", "foo", "pending"),
+        ("us-west-2", "bar", "pending"),
+        ("us-east-1", "foo", "updated"),
+        ("us-west-2", "bar", "failed"),
+    ]
+    assert entries[2]["RevisionId"] == "abc123"
+    assert Journal.read_finished(path, "layers install") == {("us-east-1", "foo")}
+
+
+def test_journal_complete_all(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path, "layers uninstall")
+    journal.defer("us-east-1", "foo", "updated")
+    journal.defer("us-west-2", "bar", "updated")
+    journal.complete_all(True)
+    journal.close()
+
+    assert Journal.read_finished(path, "layers uninstall") == {
+        ("us-east-1", "foo"),
+        ("us-west-2", "bar"),
+    }
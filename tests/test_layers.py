@@ -1,23 +1,42 @@
+import copy
+import json
+import os
+import threading
+import time
+
 import boto3
+from botocore.exceptions import ClientError
 from click import UsageError
+from concurrent.futures import ThreadPoolExecutor
 from moto import mock_aws
 import pytest
+from requests.exceptions import HTTPError
 
 from unittest.mock import ANY, call, MagicMock, patch
 
+from newrelic_lambda_cli.cliutils import UpdateSummary
 from newrelic_lambda_cli.layers import (
+    apply,
+    ChangePlan,
+    LayerIndexCache,
+    ResourceTags,
+    RolePolicyChanges,
     _attach_license_key_policy,
     _detach_license_key_policy,
     _add_new_relic,
+    _changed_fields,
+    _fetch_layers,
     _remove_new_relic,
     index,
     install,
     uninstall,
     layer_selection,
+    update_resource_tags,
+    update_role_policies,
 )
 from newrelic_lambda_cli.utils import get_arn_prefix
 
-from .conftest import layer_install, layer_uninstall
+from .conftest import layer_apply, layer_install, layer_uninstall
 
 
 @mock_aws
@@ -2195,3 +2214,576 @@ def test_app_name_removed_on_uninstall(aws_credentials, mock_function_config):
     )
 
     assert "NEW_RELIC_APP_NAME" not in update_kwargs["Environment"]["Variables"]
+
+
+def test_layer_index_cache_hits_and_misses():
+    cache = LayerIndexCache()
+    fetch = MagicMock(return_value=[{"LayerName": "NewRelicPython312"}])
+
+    assert cache.get("us-east-1", "python3.12", fetch) == fetch.return_value
+    assert cache.get("us-east-1", "python3.12", fetch) == fetch.return_value
+    assert cache.get("us-west-2", "python3.12", fetch) == fetch.return_value
+
+    assert fetch.call_count == 2
+    assert cache.hits == 1
+    assert cache.misses == 2
+
+
+def test_layer_index_cache_single_flight():
+    cache = LayerIndexCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def _slow_fetch(region, runtime):
+        started.set()
+        release.wait(5)
+        return [{"LayerName": "NewRelicNodeJS20X"}]
+
+    fetch = MagicMock(side_effect=_slow_fetch)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(cache.get, "us-east-1", "nodejs20.x", fetch)
+            for _ in range(4)
+        ]
+        started.wait(5)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert fetch.call_count == 1
+    assert all(result == [{"LayerName": "NewRelicNodeJS20X"}] for result in results)
+    assert cache.misses == 1
+    assert cache.hits == 3
+
+
+def test_layer_index_cache_persistence(tmp_path):
+    path = str(tmp_path / "layer-cache.json")
+    fetch = MagicMock(return_value=[{"LayerName": "NewRelicPython312"}])
+
+    cache = LayerIndexCache(path=path, ttl=60)
+    cache.get("us-east-1", "python3.12", fetch)
+    assert os.path.isfile(path)
+
+    cache = LayerIndexCache(path=path, ttl=60)
+    assert cache.get("us-east-1", "python3.12", fetch) == fetch.return_value
+    assert fetch.call_count == 1
+
+    with patch("newrelic_lambda_cli.layers.time.time", return_value=time.time() + 120):
+        cache = LayerIndexCache(path=path, ttl=60)
+        cache.get("us-east-1", "python3.12", fetch)
+    assert fetch.call_count == 2
+
+    cache.configure(path=path, ttl=60, refresh=True)
+    cache.get("us-east-1", "python3.12", fetch)
+    assert fetch.call_count == 3
+
+
+def test_layer_index_cache_persists_non_empty_entries(tmp_path):
+    path = tmp_path / "layer-cache.json"
+    path.write_text(
+        json.dumps(
+            {"us-west-2/python3.12": {"fetched_at": time.time(), "layers": ["x"]}}
+        )
+    )
+
+    cache = LayerIndexCache(path=str(path), ttl=60)
+    assert cache.get("us-east-1", "python3.12", MagicMock(return_value=[])) == []
+    cache.get("us-east-1", "nodejs20.x", MagicMock(return_value=["y"]))
+
+    # Refreshing one key keeps the others, and empty results aren't written
+    entries = json.loads(path.read_text())
+    assert sorted(entries) == ["us-east-1/nodejs20.x", "us-west-2/python3.12"]
+
+    with pytest.raises(ValueError):
+        cache.get("eu-west-1", "python3.12", MagicMock(side_effect=ValueError))
+    assert "eu-west-1/python3.12" not in json.loads(path.read_text())
+
+
+def test_fetch_layers_raises_for_status():
+    with patch("newrelic_lambda_cli.layers.layer_index_session.get") as mock_get:
+        mock_get.return_value.raise_for_status.side_effect = HTTPError("503")
+        with pytest.raises(HTTPError):
+            _fetch_layers("us-east-1", "python3.12")
+        mock_get.return_value.json.assert_not_called()
+
+
+def test_index_filters_cached_layers_by_architecture():
+    layers_response = [
+        {
+            "LayerName": "NewRelicPython312",
+            "LatestMatchingVersion": {"CompatibleArchitectures": ["x86_64"]},
+        },
+        {
+            "LayerName": "NewRelicPython312ARM64",
+            "LatestMatchingVersion": {"CompatibleArchitectures": ["arm64"]},
+        },
+    ]
+    with patch(
+        "newrelic_lambda_cli.layers._fetch_layers", return_value=layers_response
+    ) as mock_fetch_layers:
+        assert index("us-east-1", "python3.12", "x86_64") == layers_response[:1]
+        assert index("us-east-1", "python3.12", "arm64") == layers_response[1:]
+        mock_fetch_layers.assert_called_once_with("us-east-1", "python3.12")
+
+
+def test_install_with_listed_config(aws_credentials, mock_function_config):
+    mock_session = MagicMock()
+    mock_session.region_name = "us-east-1"
+    mock_client = mock_session.client.return_value
+
+    config = mock_function_config("python3.12")
+    config["Configuration"]["RevisionId"] = "listed-revision"
+
+    with patch(
+        "newrelic_lambda_cli.layers._get_license_key_outputs"
+    ) as mock_get_license_key_outputs, patch(
+        "newrelic_lambda_cli.layers.index"
+    ) as mock_index:
+        mock_get_license_key_outputs.return_value = ("license_arn", "12345", "policy")
+        mock_index.return_value = [
+            {
+                "LatestMatchingVersion": {
+                    "LayerVersionArn": "arn:aws:lambda:us-east-1:451483290750:layer:NewRelicPython312:1"  # noqa
+                }
+            }
+        ]
+        assert (
+            install(
+                layer_install(nr_account_id=12345, session=mock_session),
+                "aws-python3-dev-hello",
+                config,
+            )
+            is True
+        )
+
+        mock_client.get_function.assert_not_called()
+        assert (
+            mock_client.update_function_configuration.call_args.kwargs["RevisionId"]
+            == "listed-revision"
+        )
+
+        # A stale listing falls back to a fresh get_function
+        mock_client.update_function_configuration.reset_mock()
+        mock_client.update_function_configuration.side_effect = [
+            ClientError(
+                {"Error": {"Code": "PreconditionFailedException"}},
+                "UpdateFunctionConfiguration",
+            ),
+            {},
+        ]
+        mock_client.get_function.return_value = mock_function_config("python3.12")
+        config = mock_function_config("python3.12")
+        config["Configuration"]["RevisionId"] = "stale-revision"
+        assert (
+            install(
+                layer_install(nr_account_id=12345, session=mock_session),
+                "aws-python3-dev-hello",
+                config,
+            )
+            is True
+        )
+        mock_client.get_function.assert_called_once_with(
+            FunctionName="aws-python3-dev-hello"
+        )
+        assert mock_client.update_function_configuration.call_count == 2
+        assert (
+            "RevisionId"
+            not in mock_client.update_function_configuration.call_args.kwargs
+        )
+
+
+def test_install_skips_unchanged_function(aws_credentials, mock_function_config):
+    mock_session = MagicMock()
+    mock_session.region_name = "us-east-1"
+    mock_client = mock_session.client.return_value
+    summary = UpdateSummary()
+
+    with patch(
+        "newrelic_lambda_cli.layers._get_license_key_outputs"
+    ) as mock_get_license_key_outputs, patch(
+        "newrelic_lambda_cli.layers.index"
+    ) as mock_index:
+        mock_get_license_key_outputs.return_value = ("license_arn", "12345", "policy")
+        mock_index.return_value = [
+            {
+                "LatestMatchingVersion": {
+                    "LayerVersionArn": "arn:aws:lambda:us-east-1:451483290750:layer:NewRelicPython312:1"  # noqa
+                }
+            }
+        ]
+        input = layer_install(
+            nr_account_id=12345, session=mock_session, upgrade=True, summary=summary
+        )
+
+        assert install(
+            input, "aws-python3-dev-hello", mock_function_config("python3.12")
+        )
+        update_kwargs = mock_client.update_function_configuration.call_args.kwargs
+
+        # The same install against the configuration it produced is a no-op
+        mock_client.update_function_configuration.reset_mock()
+        config = mock_function_config("python3.12")
+        config["Configuration"].update(
+            Layers=[{"Arn": arn} for arn in update_kwargs["Layers"]],
+            Handler=update_kwargs["Handler"],
+            Environment={"Variables": dict(update_kwargs["Environment"]["Variables"])},
+        )
+        assert install(input, "aws-python3-dev-hello", config)
+        mock_client.update_function_configuration.assert_not_called()
+
+    assert summary.counts == {"planned": 0, "updated": 1, "skipped": 1, "failed": 0}
+    assert str(summary) == "1 updated, 1 up to date, 0 failed"
+
+
+def test_install_unchanged_function_runs_follow_ups(
+    aws_credentials, mock_function_config
+):
+    mock_session = MagicMock()
+    mock_session.region_name = "us-east-1"
+    mock_client = mock_session.client.return_value
+    summary = UpdateSummary()
+
+    with patch(
+        "newrelic_lambda_cli.layers._get_license_key_outputs"
+    ) as mock_get_license_key_outputs, patch(
+        "newrelic_lambda_cli.layers.index"
+    ) as mock_index, patch(
+        "newrelic_lambda_cli.layers._attach_license_key_policy"
+    ) as mock_attach:
+        mock_get_license_key_outputs.return_value = ("license_arn", "12345", "policy")
+        mock_index.return_value = [
+            {
+                "LatestMatchingVersion": {
+                    "LayerVersionArn": "arn:aws:lambda:us-east-1:451483290750:layer:NewRelicPython312:1"  # noqa
+                }
+            }
+        ]
+        input = layer_install(
+            nr_account_id=12345,
+            session=mock_session,
+            upgrade=True,
+            enable_extension=True,
+            apm=True,
+            summary=summary,
+        )
+
+        config = mock_function_config("python3.12")
+        config["Configuration"]["Role"] = "arn:aws:iam::123456789012:role/foo"
+        assert install(input, "aws-python3-dev-hello", copy.deepcopy(config))
+        update_kwargs = mock_client.update_function_configuration.call_args.kwargs
+
+        mock_client.reset_mock()
+        mock_attach.reset_mock()
+        config["Configuration"].update(
+            Layers=[{"Arn": arn} for arn in update_kwargs["Layers"]],
+            Handler=update_kwargs["Handler"],
+            Environment={"Variables": dict(update_kwargs["Environment"]["Variables"])},
+        )
+        assert install(input, "aws-python3-dev-hello", config)
+
+        # Only the update call is skipped
+        mock_client.update_function_configuration.assert_not_called()
+        mock_client.tag_resource.assert_called_once_with(
+            Resource=config["Configuration"]["FunctionArn"],
+            Tags={"NR.Apm.Lambda.Mode": "true"},
+        )
+        mock_attach.assert_called_once_with(
+            mock_session, config["Configuration"]["Role"], "policy"
+        )
+
+    assert summary.counts == {"planned": 0, "updated": 1, "skipped": 1, "failed": 0}
+
+
+def test_uninstall_unchanged_function_detaches_policy(
+    aws_credentials, mock_function_config
+):
+    mock_session = MagicMock()
+    mock_session.region_name = "us-east-1"
+    mock_client = mock_session.client.return_value
+    config = mock_function_config("python3.12")
+    config["Configuration"].update(
+        Handler="newrelic_lambda_wrapper.handler",
+        Environment={"Variables": {}},
+        Layers=[],
+        Role="arn:aws:iam::123456789012:role/foo",
+    )
+
+    with patch(
+        "newrelic_lambda_cli.layers._get_license_key_outputs"
+    ) as mock_get_license_key_outputs, patch(
+        "newrelic_lambda_cli.layers._detach_license_key_policy"
+    ) as mock_detach:
+        mock_get_license_key_outputs.return_value = ("license_arn", "12345", "policy")
+        assert uninstall(layer_uninstall(session=mock_session), "foo", config)
+
+        mock_client.update_function_configuration.assert_not_called()
+        mock_detach.assert_called_once_with(
+            mock_session, config["Configuration"]["Role"], "policy"
+        )
+
+
+def test_uninstall_confirms_inventory_config_before_skipping(
+    aws_credentials, mock_function_config
+):
+    mock_session = MagicMock()
+    mock_session.region_name = "us-east-1"
+    mock_client = mock_session.client.return_value
+    config = mock_function_config("python3.12")
+    config["Configuration"].update(
+        Handler="newrelic_lambda_wrapper.handler",
+        Environment={"Variables": {}},
+        Layers=[],
+        RevisionId="1",
+    )
+    input = layer_uninstall(session=mock_session, inventory=MagicMock())
+
+    with patch(
+        "newrelic_lambda_cli.layers._get_license_key_outputs",
+        return_value=(None, None, None),
+    ):
+        # The function wasn't redeployed since the inventory listed it
+        mock_client.get_function.return_value = copy.deepcopy(config)
+        assert uninstall(input, "foo", copy.deepcopy(config))
+        mock_client.get_function.assert_called_once()
+        mock_client.update_function_configuration.assert_not_called()
+
+        # It was, so its current configuration is used instead
+        current = copy.deepcopy(config)
+        current["Configuration"].update(
+            Environment={"Variables": {"NEW_RELIC_ACCOUNT_ID": "12345"}},
+            RevisionId="2",
+        )
+        mock_client.get_function.return_value = current
+        assert uninstall(input, "foo", copy.deepcopy(config))
+        mock_client.update_function_configuration.assert_called_once()
+
+
+def test_changed_fields():
+    snapshot = {
+        "Layers": ["layer-arn"],
+        "Handler": "handler",
+        "Environment": {"FOO": "bar"},
+    }
+
+    assert _changed_fields(snapshot, {"FunctionName": "foo"}) == []
+    assert (
+        _changed_fields(
+            snapshot,
+            {
+                "Layers": ["layer-arn"],
+                "Handler": "handler",
+                "Environment": {"Variables": {"FOO": "bar"}},
+            },
+        )
+        == []
+    )
+    assert _changed_fields(
+        snapshot,
+        {
+            "Layers": ["other-arn", "layer-arn"],
+            "Handler": "other",
+            "Environment": {"Variables": {"FOO": "baz"}},
+        },
+    ) == ["Layers", "Handler", "Environment"]
+
+
+def test_plan_and_apply_install(aws_credentials, mock_function_config, tmp_path):
+    mock_session = MagicMock()
+    mock_session.region_name = "us-east-1"
+    mock_client = mock_session.client.return_value
+    plan = ChangePlan()
+
+    config = mock_function_config("python3.12")
+    config["Configuration"]["RevisionId"] = "planned-revision"
+    config["Configuration"]["Role"] = "arn:aws:iam::123456789:role/FooBar"
+
+    with patch(
+        "newrelic_lambda_cli.layers._get_license_key_outputs"
+    ) as mock_get_license_key_outputs, patch(
+        "newrelic_lambda_cli.layers.index"
+    ) as mock_index:
+        mock_get_license_key_outputs.return_value = ("license_arn", "12345", "policy")
+        mock_index.return_value = [
+            {
+                "LatestMatchingVersion": {
+                    "LayerVersionArn": "arn:aws:lambda:us-east-1:451483290750:layer:NewRelicPython312:1"  # noqa
+                }
+            }
+        ]
+        input = layer_install(
+            nr_account_id=12345,
+            session=mock_session,
+            enable_extension=True,
+            apm=True,
+            plan=plan,
+        )
+        assert install(input, "aws-python3-dev-hello", config) is True
+
+    mock_client.update_function_configuration.assert_not_called()
+    mock_client.tag_resource.assert_not_called()
+
+    path = str(tmp_path / "plan.json")
+    plan.write(path)
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    (change,) = ChangePlan.read(path).changes
+    assert change["Action"] == "install"
+    assert change["RevisionId"] == "planned-revision"
+    assert change["Changes"] == ["Layers", "Handler", "Environment"]
+    assert change["AttachPolicy"] == "policy"
+
+    input = layer_apply(session=mock_session)
+    with patch(
+        "newrelic_lambda_cli.layers._attach_license_key_policy"
+    ) as mock_attach_policy:
+        assert apply(input, change) is True
+        mock_attach_policy.assert_called_once_with(
+            mock_session, "arn:aws:iam::123456789:role/FooBar", "policy"
+        )
+    mock_client.update_function_configuration.assert_called_once_with(
+        RevisionId="planned-revision", **change["Update"]
+    )
+    mock_client.tag_resource.assert_called_once_with(
+        Resource=change["FunctionArn"], Tags={"NR.Apm.Lambda.Mode": "true"}
+    )
+
+    # A function that changed after the plan was made is left alone
+    mock_client.update_function_configuration.side_effect = ClientError(
+        {"Error": {"Code": "PreconditionFailedException"}},
+        "UpdateFunctionConfiguration",
+    )
+    with patch("newrelic_lambda_cli.layers.failure") as mock_failure:
+        assert apply(input, change) is False
+        assert "changed after the plan was made" in mock_failure.call_args.args[0]
+    mock_client.get_function.assert_not_called()
+
+
+def test_change_plan_read_rejects_unknown_version(tmp_path):
+    path = tmp_path / "plan.json"
+    path.write_text('{"version": 99, "changes": []}')
+
+    with pytest.raises(UsageError):
+        ChangePlan.read(str(path))
+
+
+POLICY_DOCUMENT = json.dumps(
+    {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Action": "secretsmanager:GetSecretValue",
+                "Resource": "*",
+            }
+        ],
+    }
+)
+
+
+@mock_aws
+def test_update_role_policies_once_per_role(aws_credentials):
+    session = boto3.Session(region_name="us-east-1")
+    iam = session.client("iam")
+    policy_arn = iam.create_policy(
+        PolicyName="LicenseKey", PolicyDocument=POLICY_DOCUMENT
+    )["Policy"]["Arn"]
+    role_arns = {
+        name: iam.create_role(RoleName=name, AssumeRolePolicyDocument="{}")["Role"][
+            "Arn"
+        ]
+        for name in ("Attached", "Detached")
+    }
+    iam.attach_role_policy(RoleName="Attached", PolicyArn=policy_arn)
+
+    role_policies = RolePolicyChanges()
+    for i in range(10):
+        role_policies.add_attach(role_arns["Attached"], policy_arn)
+        role_policies.add_attach(role_arns["Detached"], policy_arn)
+    input = layer_install(session=session, role_policies=role_policies)
+
+    with patch(
+        "newrelic_lambda_cli.layers._attach_license_key_policy",
+        wraps=_attach_license_key_policy,
+    ) as mock_attach:
+        assert update_role_policies(input) is True
+        mock_attach.assert_called_once_with(session, role_arns["Detached"], policy_arn)
+
+    for name in ("Attached", "Detached"):
+        attached = iam.list_attached_role_policies(RoleName=name)["AttachedPolicies"]
+        assert [policy["PolicyArn"] for policy in attached] == [policy_arn]
+
+
+@mock_aws
+def test_update_role_policies_keeps_roles_in_use(aws_credentials):
+    session = boto3.Session(region_name="us-east-1")
+    iam = session.client("iam")
+    policy_arn = iam.create_policy(
+        PolicyName="LicenseKey", PolicyDocument=POLICY_DOCUMENT
+    )["Policy"]["Arn"]
+    role_arns = {}
+    for name in ("Shared", "Unused"):
+        role_arns[name] = iam.create_role(RoleName=name, AssumeRolePolicyDocument="{}")[
+            "Role"
+        ]["Arn"]
+        iam.attach_role_policy(RoleName=name, PolicyArn=policy_arn)
+
+    role_policies = RolePolicyChanges()
+    role_policies.add_detach(role_arns["Shared"], policy_arn, "uninstalled-1")
+    role_policies.add_detach(role_arns["Unused"], policy_arn, "uninstalled-2")
+    input = layer_uninstall(session=session, role_policies=role_policies)
+
+    # IAM roles are global, so a function in another region keeps its role's policy
+    functions = {
+        "us-east-1": [{"FunctionArn": "uninstalled-2", "Role": role_arns["Unused"]}],
+        "us-west-2": [
+            {"FunctionArn": "still-instrumented", "Role": role_arns["Shared"]}
+        ],
+    }
+    with patch("newrelic_lambda_cli.layers.list_functions") as mock_list_functions:
+        mock_list_functions.side_effect = lambda session, filter: functions.get(
+            session.region_name, []
+        )
+        assert update_role_policies(input) is True
+        mock_list_functions.assert_any_call(session, "installed")
+        regions = {c.args[0].region_name for c in mock_list_functions.call_args_list}
+        assert {"us-east-1", "us-west-2"} <= regions
+
+    assert iam.list_attached_role_policies(RoleName="Shared")["AttachedPolicies"]
+    assert not iam.list_attached_role_policies(RoleName="Unused")["AttachedPolicies"]
+
+
+def test_update_resource_tags_in_batches():
+    mock_session = MagicMock()
+    mock_client = mock_session.client.return_value
+    mock_client.tag_resources.side_effect = [
+        {"FailedResourcesMap": {}},
+        {
+            "FailedResourcesMap": {
+                "function-25": {"ErrorCode": "InternalServiceException"}
+            }
+        },
+        {"FailedResourcesMap": {}},
+    ]
+
+    resource_tags = ResourceTags()
+    for i in range(45):
+        resource_tags.add("function-%02d" % i, {"NR.Apm.Lambda.Mode": "true"})
+    input = layer_install(
+        session=mock_session, max_concurrency=1, resource_tags=resource_tags
+    )
+
+    with patch("newrelic_lambda_cli.layers.failure") as mock_failure:
+        assert update_resource_tags(input) is False
+        mock_failure.assert_called_once_with(
+            "Failed to add APM tag to 'function-25': InternalServiceException"
+        )
+
+    mock_session.client.assert_called_with("resourcegroupstaggingapi")
+    assert [
+        len(c.kwargs["ResourceARNList"])
+        for c in mock_client.tag_resources.call_args_list
+    ] == [20, 20, 5]
+    assert all(
+        c.kwargs["Tags"] == {"NR.Apm.Lambda.Mode": "true"}
+        for c in mock_client.tag_resources.call_args_list
+    )
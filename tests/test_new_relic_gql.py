@@ -1,6 +1,11 @@
+import json
+import pytest
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import Mock, MagicMock, patch
 
-from newrelic_lambda_cli.api import NewRelicGQL
+from newrelic_lambda_cli.api import GQL_URLS, NewRelicGQL
 
 
 @patch("newrelic_lambda_cli.api.failure")
@@ -16,3 +21,51 @@ def test_link_account_with_errors(failure):
         "Error while linking account with New Relic:\nFoo Bar"
     )
     assert account == None
+
+
+@pytest.fixture
+def graphql_server():
+    """A local stub NerdGraph endpoint that records the requests it receives"""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            requests.append((self.client_address, body["query"]))
+            response = json.dumps(
+                {"data": {"actor": {"apiAccess": {"keySearch": {"keys": []}}}}}
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = "http://127.0.0.1:%d/graphql" % server.server_address[1]
+    try:
+        with patch.dict(GQL_URLS, {"us": url}):
+            yield requests
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_new_relic_gql_skips_schema_introspection(graphql_server):
+    gql = NewRelicGQL("123456789", "foobar")
+    assert graphql_server == []
+
+    gql.get_license_key()
+    NewRelicGQL("123456789", "foobar").get_license_key()
+
+    assert len(graphql_server) == 2
+    assert all("__schema" not in query for _, query in graphql_server)
+    # Both clients share one kept-alive connection to the endpoint
+    assert len({address for address, _ in graphql_server}) == 1
@@ -1,6 +1,6 @@
 from click import UsageError
-from pytest import raises
-from unittest.mock import ANY, call, MagicMock
+from pytest import mark, raises
+from unittest.mock import ANY, call, MagicMock, patch
 
 from newrelic_lambda_cli.permissions import (
     check_permissions,
@@ -226,3 +226,56 @@ def test_ensure_subscription_uninstall_permissions():
             ),
         ],
     )
+
+
+@mark.parametrize(
+    "ensure,make_input",
+    [
+        (ensure_layer_install_permissions, layer_install),
+        (ensure_layer_uninstall_permissions, layer_uninstall),
+        (ensure_subscription_install_permissions, subscription_install),
+        (ensure_subscription_uninstall_permissions, subscription_uninstall),
+    ],
+)
+def test_ensure_permissions_for_function_tags(ensure, make_input):
+    with patch(
+        "newrelic_lambda_cli.permissions.check_permissions", return_value=[]
+    ) as mock_check_permissions:
+        ensure(make_input(session=MagicMock()))
+        assert "tag:GetResources" not in mock_check_permissions.call_args[1]["actions"]
+
+        ensure(make_input(session=MagicMock(), function_tags=[("team", "a")]))
+        assert "tag:GetResources" in mock_check_permissions.call_args[1]["actions"]
+
+
+def test_ensure_layer_install_permissions_for_options():
+    with patch(
+        "newrelic_lambda_cli.permissions.check_permissions", return_value=[]
+    ) as mock_check_permissions:
+        ensure_layer_install_permissions(
+            layer_install(session=MagicMock(), apm=True, enable_extension=True)
+        )
+        actions = mock_check_permissions.call_args[1]["actions"]
+
+    assert "iam:ListAttachedRolePolicies" in actions
+    assert "tag:TagResources" in actions
+
+
+@mark.parametrize("policy_arn", [None, "arn:aws:iam::123456789:policy/ViewSecret"])
+def test_ensure_layer_uninstall_permissions_for_policy(policy_arn):
+    with patch(
+        "newrelic_lambda_cli.integrations._get_license_key_outputs",
+        return_value=(None, None, policy_arn),
+    ), patch(
+        "newrelic_lambda_cli.permissions.check_permissions", return_value=[]
+    ) as mock_check_permissions:
+        ensure_layer_uninstall_permissions(layer_uninstall(session=MagicMock()))
+        actions = mock_check_permissions.call_args[1]["actions"]
+
+    # Only needed to detach the license key policy
+    for action in (
+        "ec2:DescribeRegions",
+        "iam:ListAttachedRolePolicies",
+        "lambda:ListFunctions",
+    ):
+        assert (action in actions) is bool(policy_arn)
@@ -0,0 +1,58 @@
+import json
+import pstats
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from newrelic_lambda_cli import profiling
+
+
+def _worker(_):
+    started = time.perf_counter()
+    while time.perf_counter() - started < 0.03:
+        pass
+
+
+def _run_workers():
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="worker") as executor:
+        list(executor.map(_worker, range(4)))
+
+
+def test_deterministic_profiler_includes_worker_threads(tmp_path):
+    path = str(tmp_path / "run.prof")
+    profiler = profiling.start(path)
+    assert isinstance(profiler, profiling.DeterministicProfiler)
+    _run_workers()
+    profiler.stop(path)
+
+    stats = pstats.Stats(path).stats
+    calls = {name: stat[1] for (_, _, name), stat in stats.items() if name == "_worker"}
+    assert calls == {"_worker": 4}
+
+
+def test_sampling_profiler_writes_speedscope(tmp_path):
+    path = str(tmp_path / "run.speedscope.json")
+    profiler = profiling.start(path)
+    assert isinstance(profiler, profiling.SamplingProfiler)
+    _run_workers()
+    profiler.stop(path)
+
+    with open(path) as profile_file:
+        profile = json.load(profile_file)
+
+    assert profile["$schema"] == profiling.SPEEDSCOPE_SCHEMA
+    frames = profile["shared"]["frames"]
+    threads = {thread["name"]: thread for thread in profile["profiles"]}
+    assert "MainThread" in threads
+    assert "newrelic-lambda-profiler" not in threads
+
+    workers = [thread for name, thread in threads.items() if name.startswith("worker")]
+    assert workers
+    for thread in workers:
+        assert thread["type"] == "sampled"
+        assert len(thread["samples"]) == len(thread["weights"])
+    assert any(
+        frames[stack[-1]]["name"] == "_worker"
+        for thread in workers
+        for stack in thread["samples"]
+    )
@@ -0,0 +1,100 @@
+import pytest
+
+from botocore.exceptions import ClientError
+from unittest.mock import MagicMock, patch
+
+from newrelic_lambda_cli.scheduler import AdaptiveScheduler, parse_waves, split_waves
+
+
+def _client_error(code):
+    return ClientError({"Error": {"Code": code}}, "UpdateFunctionConfiguration")
+
+
+@patch("newrelic_lambda_cli.scheduler.time.sleep")
+def test_scheduler_retries_throttled_calls(mock_sleep):
+    scheduler = AdaptiveScheduler(max_concurrency=8)
+    func = MagicMock(
+        side_effect=[
+            _client_error("TooManyRequestsException"),
+            _client_error("ResourceConflictException"),
+            {"FunctionName": "foobar"},
+        ]
+    )
+
+    assert scheduler.call(func, FunctionName="foobar") == {"FunctionName": "foobar"}
+    assert func.call_count == 3
+    assert mock_sleep.call_count == 2
+    assert scheduler.calls == 3
+    assert scheduler.throttles == 1
+    assert scheduler.retries == 2
+    assert scheduler.limit < 8
+
+
+@patch("newrelic_lambda_cli.scheduler.time.sleep")
+def test_scheduler_gives_up(mock_sleep):
+    scheduler = AdaptiveScheduler(max_concurrency=2, max_attempts=3)
+    func = MagicMock(side_effect=_client_error("TooManyRequestsException"))
+
+    with pytest.raises(ClientError):
+        scheduler.call(func)
+    assert func.call_count == 3
+
+    func = MagicMock(side_effect=_client_error("AccessDeniedException"))
+    with pytest.raises(ClientError):
+        scheduler.call(func)
+    assert func.call_count == 1
+    assert scheduler.limit >= 1
+
+
+def test_scheduler_additive_increase():
+    scheduler = AdaptiveScheduler(max_concurrency=4)
+    scheduler.limit = 1.0
+
+    for _ in range(3):
+        scheduler.call(MagicMock(return_value={}))
+    assert 2.0 < scheduler.limit <= 4.0
+
+    for _ in range(50):
+        scheduler.call(MagicMock(return_value={}))
+    assert scheduler.limit == 4.0
+
+    # Retries, e.g. of connection errors, aren't throttling
+    scheduler.call(MagicMock(return_value={"ResponseMetadata": {"RetryAttempts": 2}}))
+    assert scheduler.limit == 4.0
+    assert scheduler.throttles == 0
+
+
+@patch("newrelic_lambda_cli.scheduler.time.sleep")
+def test_scheduler_rate_limit(mock_sleep):
+    scheduler = AdaptiveScheduler(max_concurrency=4, rate_limit=10)
+
+    for _ in range(3):
+        scheduler.call(MagicMock(return_value={}))
+
+    delays = [c.args[0] for c in mock_sleep.call_args_list]
+    assert len(delays) == 2
+    assert all(0 < delay <= 0.2 for delay in delays)
+    assert "3 API calls" in scheduler.summary()
+
+
+def test_parse_waves():
+    assert parse_waves("1%,10%,50%,100%") == (0.01, 0.1, 0.5, 1.0)
+    assert parse_waves("5, 25") == (0.05, 0.25, 1.0)
+
+    for value in ("10%,5%", "0%", "150%", "ten%"):
+        with pytest.raises(ValueError):
+            parse_waves(value)
+
+
+def test_split_waves():
+    waves = (0.01, 0.1, 0.5, 1.0)
+    functions = ["fn-%04d" % i for i in range(1000)]
+
+    batches = split_waves(reversed(functions), waves)
+    assert [len(batch) for batch in batches] == [10, 90, 400, 500]
+    assert batches[0] == functions[:10]
+    assert sum(batches, []) == functions
+
+    # Each wave takes at least one function until none remain
+    assert split_waves(["c", "a", "b"], waves) == [["a"], ["b"], ["c"]]
+    assert split_waves([], waves) == []
@@ -1,9 +1,19 @@
+import json
 from unittest.mock import MagicMock, patch
 
+import boto3
+import botocore
+from moto import mock_aws
+
 from newrelic_lambda_cli.subscriptions import (
     _get_log_group_name,
+    create_account_policy,
     create_log_subscription,
     create_otel_log_subscription,
+    get_log_destination_arn,
+    get_log_group_index,
+    remove_account_policy,
+    verify_account_policy,
     remove_log_subscription,
     remove_otel_log_subscription,
     _create_subscription_filter,
@@ -68,8 +78,9 @@ def test_create_log_subscription(
     )
 
     assert create_log_subscription(subscription_install(), "FooBarBaz") is True
-    mock_remove_subscription_filter.assert_called_once_with(
-        None, "FooBarBaz", "NewRelicLogStreaming"
+    mock_remove_subscription_filter.assert_not_called()
+    mock_create_subscription_filter.assert_called_with(
+        None, "FooBarBaz", "FooBarBaz", None, "NewRelicLogStreaming"
     )
 
 
@@ -135,8 +146,9 @@ def test_create_otel_log_subscription(
     )
 
     assert create_otel_log_subscription(subscription_install(), "FooBarBaz") is True
-    mock_remove_subscription_filter.assert_called_once_with(
-        None, "FooBarBaz", "NewRelicOtelLogStreaming"
+    mock_remove_subscription_filter.assert_not_called()
+    mock_create_subscription_filter.assert_called_with(
+        None, "FooBarBaz", "FooBarBaz", None, "NewRelicOtelLogStreaming"
     )
 
 
@@ -198,3 +210,165 @@ def test__remove_subscription_filter(aws_credentials):
         _remove_subscription_filter(mock_session, "foobar", "NewRelicLogIngestion")
         is True
     )
+
+
+@patch("newrelic_lambda_cli.subscriptions._create_subscription_filter", autospec=True)
+@patch("newrelic_lambda_cli.subscriptions._get_subscription_filters", autospec=True)
+@patch(
+    "newrelic_lambda_cli.subscriptions.get_newrelic_log_ingestion_function",
+    autospec=True,
+)
+@patch("newrelic_lambda_cli.subscriptions.get_function", autospec=True)
+def test_create_log_subscription_with_resolved_destination(
+    mock_get_function,
+    mock_get_newrelic_log_ingestion_function,
+    mock_get_subscription_filters,
+    mock_create_subscription_filter,
+):
+    mock_get_function.return_value = {"Configuration": {"FunctionArn": "Legacy"}}
+    mock_get_newrelic_log_ingestion_function.return_value = {
+        "Configuration": {"FunctionArn": "Destination"}
+    }
+    mock_get_subscription_filters.return_value = []
+    mock_create_subscription_filter.return_value = True
+
+    input = subscription_install(stackname="NewRelicLogIngestion")
+    with patch("newrelic_lambda_cli.subscriptions.warning") as mock_warning:
+        destination_arn = get_log_destination_arn(input)
+        assert destination_arn == "Destination"
+        mock_warning.assert_called_once()
+
+    input = input._replace(destination_arn=destination_arn)
+    assert create_log_subscription(input, "foo") is True
+    assert create_log_subscription(input, "bar") is True
+
+    mock_get_function.assert_called_once_with(None, "newrelic-log-ingestion")
+    mock_get_newrelic_log_ingestion_function.assert_called_once_with(
+        None, "NewRelicLogIngestion"
+    )
+    mock_create_subscription_filter.assert_called_with(None, "bar", "Destination", None)
+
+
+def test_create_account_policy():
+    mock_session = MagicMock()
+    input = subscription_install(
+        session=mock_session,
+        destination_arn="arn:aws:lambda:us-east-1:123456789:function:ingestion",
+        excludes=("foo", "ingestion"),
+        filter_pattern="",
+    )
+
+    assert create_account_policy(input) is True
+    kwargs = mock_session.client.return_value.put_account_policy.call_args.kwargs
+    assert kwargs["policyName"] == "NewRelicLogStreaming"
+    assert kwargs["policyType"] == "SUBSCRIPTION_FILTER_POLICY"
+    assert json.loads(kwargs["policyDocument"]) == {
+        "DestinationArn": "arn:aws:lambda:us-east-1:123456789:function:ingestion",
+        "FilterPattern": "",
+    }
+    assert kwargs["selectionCriteria"] == (
+        'LogGroupName NOT IN ["/aws/lambda/ingestion", "/aws/lambda/foo"]'
+    )
+
+    mock_session.client.return_value.put_account_policy.side_effect = (
+        botocore.exceptions.ClientError(
+            {"Error": {"Code": "LimitExceededException"}}, "PutAccountPolicy"
+        )
+    )
+    assert create_account_policy(input) is False
+
+    # CloudWatch Logs limits the size of the exclusion list
+    mock_session.client.return_value.put_account_policy.reset_mock()
+    input = input._replace(excludes=["function-%05d" % i for i in range(2000)])
+    assert create_account_policy(input) is False
+    mock_session.client.return_value.put_account_policy.assert_not_called()
+
+
+def test_verify_account_policy():
+    mock_session = MagicMock()
+    input = subscription_install(
+        session=mock_session,
+        destination_arn="Destination",
+        filter_pattern="?REPORT",
+    )
+    describe = mock_session.client.return_value.describe_account_policies
+    describe.return_value = {
+        "accountPolicies": [
+            {
+                "policyName": "NewRelicLogStreaming",
+                "policyDocument": json.dumps(
+                    {"DestinationArn": "Destination", "FilterPattern": "?REPORT"}
+                ),
+            }
+        ]
+    }
+
+    assert verify_account_policy(input) is True
+    describe.assert_called_once_with(
+        policyType="SUBSCRIPTION_FILTER_POLICY", policyName="NewRelicLogStreaming"
+    )
+
+    assert verify_account_policy(input._replace(destination_arn="Other")) is False
+
+    describe.return_value = {"accountPolicies": []}
+    assert verify_account_policy(input) is False
+
+
+def test_remove_account_policy():
+    mock_session = MagicMock()
+    input = subscription_uninstall(session=mock_session, otel=True)
+
+    assert remove_account_policy(input) is True
+    mock_session.client.return_value.delete_account_policy.assert_called_once_with(
+        policyName="NewRelicOtelLogStreaming",
+        policyType="SUBSCRIPTION_FILTER_POLICY",
+    )
+
+    mock_session.client.return_value.delete_account_policy.side_effect = (
+        botocore.exceptions.ClientError(
+            {"Error": {"Code": "ResourceNotFoundException"}}, "DeleteAccountPolicy"
+        )
+    )
+    assert remove_account_policy(input) is True
+
+
+@mock_aws
+def test_get_log_group_index(aws_credentials):
+    session = boto3.Session(region_name="us-east-1")
+    logs = session.client("logs")
+    for name in ("/aws/lambda/foo", "/aws/lambda/bar", "/ecs/baz"):
+        logs.create_log_group(logGroupName=name)
+
+    assert get_log_group_index(session) == {"/aws/lambda/foo", "/aws/lambda/bar"}
+
+
+@mock_aws
+def test_get_log_group_index_max_calls(aws_credentials):
+    session = boto3.Session(region_name="us-east-1")
+    logs = session.client("logs")
+    names = {"/aws/lambda/func-%d" % i for i in range(51)}
+    for name in names:
+        logs.create_log_group(logGroupName=name)
+
+    # 51 log groups take two pages
+    assert get_log_group_index(session, max_calls=1) is None
+    assert get_log_group_index(session, max_calls=2) == names
+
+
+@patch("newrelic_lambda_cli.subscriptions._create_subscription_filter", autospec=True)
+@patch("newrelic_lambda_cli.subscriptions._get_subscription_filters", autospec=True)
+def test_subscriptions_skip_functions_without_log_group(
+    mock_get_subscription_filters, mock_create_subscription_filter
+):
+    log_groups = {"/aws/lambda/foo"}
+
+    input = subscription_install(destination_arn="Destination", log_groups=log_groups)
+    assert create_log_subscription(input, "bar") is False
+    assert create_otel_log_subscription(input, "bar") is False
+
+    input = subscription_uninstall(log_groups=log_groups)
+    assert remove_log_subscription(input, "bar") is True
+    assert remove_otel_log_subscription(input, "bar") is True
+
+    mock_get_subscription_filters.assert_not_called()
+    mock_create_subscription_filter.assert_not_called()
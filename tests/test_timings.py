@@ -0,0 +1,92 @@
+import boto3
+import pytest
+from moto import mock_aws
+from unittest.mock import MagicMock, patch
+
+from newrelic_lambda_cli import timings
+from newrelic_lambda_cli.timings import CallTimings
+from newrelic_lambda_cli.utils import PooledSession, TimedSession
+
+
+@pytest.fixture
+def recorder():
+    yield timings.enable()
+    timings.disable()
+
+
+@mock_aws
+def test_timings_botocore_calls(aws_credentials, recorder):
+    client = PooledSession(boto3.Session(region_name="us-east-1")).client("lambda")
+    client.list_functions()
+    client.list_functions()
+    with pytest.raises(client.exceptions.ResourceNotFoundException):
+        client.get_function(FunctionName="missing")
+
+    list_functions = recorder.operations[("lambda", "ListFunctions")]
+    assert list_functions.calls == 2
+    assert list_functions.errors == 0
+    assert sum(list_functions.histogram) == 2
+    assert recorder.operations[("lambda", "GetFunction")].errors == 1
+
+    table = recorder.table().splitlines()
+    assert table[0].split()[:5] == [
+        "Operation",
+        "Calls",
+        "Errors",
+        "Retries",
+        "Throttled",
+    ]
+    assert len(table) == 3
+
+    operations = recorder.to_dict()["Operations"]
+    assert [(o["Service"], o["Operation"], o["Calls"]) for o in operations] == [
+        ("lambda", "GetFunction", 1),
+        ("lambda", "ListFunctions", 2),
+    ]
+
+
+@mock_aws
+def test_timings_only_pooled_sessions(aws_credentials, recorder):
+    # Handlers are registered per session rather than for every botocore session
+    boto3.Session(region_name="us-east-1").client("lambda").list_functions()
+    assert recorder.operations == {}
+
+
+def test_timings_disable():
+    recorder = timings.enable()
+    assert timings.enable() is recorder
+
+    timings.disable()
+    assert timings.recorder is None
+
+    session = MagicMock()
+    PooledSession(session)
+    session.events.register.assert_not_called()
+
+
+def test_timed_session(recorder):
+    session = TimedSession("nerdgraph")
+    with patch("requests.Session.request", return_value=MagicMock(status_code=200)):
+        with timings.operation("get_license_key"):
+            session.post("https://api.newrelic.com/graphql")
+        session.get("https://us-east-1.layers.newrelic-external.com/get-layers")
+
+    assert sorted(recorder.operations) == [
+        ("nerdgraph", "GET /get-layers"),
+        ("nerdgraph", "get_license_key"),
+    ]
+
+
+def test_timings_time():
+    recorder = CallTimings()
+
+    assert recorder.time("http", "get", lambda: "ok") == "ok"
+    recorder.time("http", "get", MagicMock(return_value=MagicMock(status_code=429)))
+
+    error = Exception("Too Many Requests")
+    error.code = 429
+    with pytest.raises(Exception):
+        recorder.time("http", "get", MagicMock(side_effect=error))
+
+    get = recorder.operations[("http", "get")]
+    assert (get.calls, get.errors, get.throttles) == (3, 2, 2)
@@ -1,13 +1,31 @@
 import pytest
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
 
 from botocore.exceptions import BotoCoreError, NoCredentialsError, NoRegionError
 from click.exceptions import BadParameter, UsageError
 
+from newrelic_lambda_cli.cliutils import failure, success
 from newrelic_lambda_cli.utils import (
+    compile_name_patterns,
+    ContextThreadPoolExecutor,
     error,
+    get_arn_prefix,
+    get_region,
+    in_shard,
     is_valid_handler,
+    new_relic_layer_matcher,
     parse_arn,
+    parse_shard,
+    PooledSession,
+    resolve_regions,
+    run_in_regions,
+    RunCache,
     validate_aws_profile,
+    validate_name_patterns,
     catch_boto_errors,
     supports_lambda_extension,
 )
@@ -106,3 +124,168 @@ def test_supports_lambda_extension():
     assert not any(
         supports_lambda_extension(runtime) for runtime in ("python2.7", "python3.6")
     )
+
+
+def test_pooled_session():
+    mock_session = MagicMock()
+    mock_session.region_name = "us-east-1"
+    session = PooledSession(mock_session, max_pool_connections=8)
+
+    assert session.region_name == "us-east-1"
+    assert session.client("lambda") is session.client("lambda")
+    session.client("iam")
+    assert mock_session.client.call_count == 2
+
+    config = mock_session.client.call_args.kwargs["config"]
+    assert config.max_pool_connections == 8
+
+    session.client("lambda", region_name="us-west-2")
+    assert mock_session.client.call_count == 3
+
+
+def test_resolve_regions():
+    assert resolve_regions(()) == [None]
+    assert resolve_regions(("us-east-1", "us-west-2", "us-east-1")) == [
+        "us-east-1",
+        "us-west-2",
+    ]
+    with patch(
+        "newrelic_lambda_cli.utils.all_lambda_regions",
+        return_value=["af-south-1", "eu-west-1", "us-east-1"],
+    ), patch(
+        "newrelic_lambda_cli.utils.enabled_regions",
+        return_value=["eu-west-1", "us-east-1", "us-west-2"],
+    ):
+        # Opt-in regions the account hasn't enabled are left out
+        assert resolve_regions(("all", "us-east-1")) == ["eu-west-1", "us-east-1"]
+
+
+def test_run_in_regions(capsys):
+    assert run_in_regions([None], lambda region: region) == [None]
+    assert run_in_regions(["us-east-1", "us-west-2"], lambda region: region[:2]) == [
+        "us",
+        "us",
+    ]
+
+    def _run(region):
+        if region == "us-west-2":
+            raise UsageError("Missing permissions")
+        failure("Failed to update foo")
+        with ContextThreadPoolExecutor() as executor:
+            executor.submit(success, "Updated bar").result()
+        return True
+
+    # An error in one region doesn't stop the others
+    assert run_in_regions(["us-east-1", "us-west-2"], _run) == [True, False]
+    out, err = capsys.readouterr()
+    assert "us-east-1: Updated bar" in out
+    assert "us-east-1: Failed to update foo" in err
+    assert "us-west-2: Missing permissions" in err
+
+
+def test_get_region():
+    with patch("newrelic_lambda_cli.utils.boto3") as mock_boto3:
+        mock_boto3.session.Session.return_value.region_name = "eu-west-1"
+
+        assert get_region("us-east-1") == "us-east-1"
+        assert get_arn_prefix("us-east-1") == "arn:aws:lambda:us-east-1:451483290750"
+        mock_boto3.session.Session.assert_not_called()
+
+        assert get_region(None, "region-profile") == "eu-west-1"
+        assert get_region(None, "region-profile") == "eu-west-1"
+        mock_boto3.session.Session.assert_called_once_with(
+            profile_name="region-profile"
+        )
+
+
+def test_new_relic_layer_matcher():
+    is_new_relic_layer = new_relic_layer_matcher("us-east-1")
+
+    assert new_relic_layer_matcher("us-east-1") is is_new_relic_layer
+    assert is_new_relic_layer(
+        "arn:aws:lambda:us-east-1:451483290750:layer:NewRelicPython39:1"
+    )
+    assert not is_new_relic_layer(
+        "arn:aws:lambda:us-west-2:451483290750:layer:NewRelicPython39:1"
+    )
+    assert not is_new_relic_layer("arn:aws:lambda:us-east-1:123456789:layer:Foo:1")
+
+
+def test_run_cache():
+    cache = RunCache()
+    fetch = MagicMock(return_value=None)
+
+    assert cache.get("us-east-1", fetch, "arg") is None
+    assert cache.get("us-east-1", fetch, "arg") is None
+    fetch.assert_called_once_with("arg")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.invalidate("us-east-1")
+    cache.get("us-east-1", fetch, "arg")
+    assert fetch.call_count == 2
+
+    failing = MagicMock(side_effect=[ValueError("boom"), "value"])
+    with pytest.raises(ValueError):
+        cache.get("eu-west-1", failing)
+    assert cache.get("eu-west-1", failing) == "value"
+
+
+def test_run_cache_single_flight():
+    cache = RunCache()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(cache.get, "key", fetch) for _ in range(4)]
+        while cache.misses + cache.hits < 4:
+            time.sleep(0.01)
+        release.set()
+        assert [future.result() for future in futures] == ["value"] * 4
+
+    assert len(calls) == 1
+
+
+def test_compile_name_patterns():
+    assert compile_name_patterns(()) is None
+
+    pattern = compile_name_patterns(("payments-*-prod", "re:search-(api|worker)"))
+    assert pattern is compile_name_patterns(
+        ("payments-*-prod", "re:search-(api|worker)")
+    )
+    assert pattern.match("payments-api-prod")
+    assert pattern.match("search-worker")
+    assert not pattern.match("payments-api-dev")
+    assert not pattern.match("search-worker-dev")
+
+    assert validate_name_patterns(None, None, ("re:foo",)) == ("re:foo",)
+    with pytest.raises(BadParameter):
+        validate_name_patterns(None, None, ("re:foo(",))
+
+
+def test_shards():
+    assert parse_shard(None, None, None) is None
+    assert parse_shard(None, None, "2/8") == (2, 8)
+    for value in ("0/8", "9/8", "2", "a/b"):
+        with pytest.raises(BadParameter):
+            parse_shard(None, None, value)
+
+    functions = ["function-%d" % i for i in range(1000)]
+    shards = [
+        [function for function in functions if in_shard(function, (index, 4))]
+        for index in range(1, 5)
+    ]
+    # Disjoint, covering and roughly even
+    assert sorted(sum(shards, [])) == sorted(functions)
+    assert all(150 < len(shard) < 350 for shard in shards)
+
+    # Names, ARNs and qualified ARNs land in the same shard
+    for index in range(1, 5):
+        assert in_shard("function-1", (index, 4)) == in_shard(
+            "arn:aws:lambda:us-east-1:123456789012:function:function-1:prod",
+            (index, 4),
+        )